@@ -5,6 +5,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, current_user
 from flask_migrate import Migrate     # ← přidáno
 from config import Config
+from app.db_routing import RoutingSession
 
 # cesta k šablonám
 template_path = os.path.abspath(
@@ -20,9 +21,16 @@ app.config.from_object(Config)
 app.json.sort_keys = False
 
 # databáze + migrace
-db = SQLAlchemy(app)
+# RoutingSession posílá čtení reportů na repliku, je-li nastavená
+db = SQLAlchemy(app, session_options={"class_": RoutingSession})
 migrate = Migrate(app, db)            # ← inicializace migrací
 
+# SQLite: WAL a další pragmy při každém připojení (viz app/db_utils.py)
+from app.db_utils import install_sqlite_profile
+with app.app_context():
+    for engine in db.engines.values():
+        install_sqlite_profile(engine, app.config)
+
 # přihlašování
 login = LoginManager(app)
 login.login_view = "login"
@@ -30,23 +38,31 @@ login.login_view = "login"
 # -------------------------------------------------------------
 #  GLOBAL CONTEXT – kolik přeskladnění je na cestě ke mně?
 # -------------------------------------------------------------
-from app.models import Transfer  # (import až po vytvoření db)
+from app.transfers import in_transit_counts  # (import až po vytvoření db)
+from app import user_cache                     # cache pro login.user_loader
 
 @app.context_processor
 def inject_transfers_badge():
     if not current_user.is_authenticated:
         return dict(transfers_na_ceste=0)
 
+    # počty se drží v transfer_counter a v paměti procesu (viz app/transfers.py)
+    counts = in_transit_counts()
     if current_user.role == "admin":
-        cnt = Transfer.query.filter_by(status="v_tranzitu").count()
+        cnt = sum(counts.values())
     else:
-        cnt = Transfer.query.filter_by(
-            status="v_tranzitu",
-            target_sklad=current_user.sklad
-        ).count()
+        cnt = counts.get(current_user.sklad, 0)
 
     return dict(transfers_na_ceste=cnt)
 
+# koncepty ze starých cookie do tabulky draft (viz app/drafts.py)
+from app.drafts import migrate_legacy_drafts
+
+@app.before_request
+def move_legacy_drafts():
+    if current_user.is_authenticated:
+        migrate_legacy_drafts()
+
 # -------------------------------------------------------------
 #  importy rout a modelů
 # -------------------------------------------------------------
@@ -0,0 +1,137 @@
+# app/allocation.py
+#
+# Návrh distribuce zásob z Pardubic do Prahy a Brna.
+#
+# Vstupy se sčítají přímo v SQL (SUM po produkt/velikost/sklad, prodeje
+# z denního souhrnu outbound_daily) a výpočet běží nad NumPy poli
+# indexovanými (produkt, velikost, sklad). Pravidla
+# jsou stejná jako v původní smyčce v distribuce():
+#   - podíl pobočky = její prodej / celkový prodej * dostupné kusy
+#   - custom_round: <= 0 -> 0, < 1 -> 1, jinak zaokrouhlení .5 nahoru
+#   - návrh = max(0, zaokrouhlený podíl - zásoba pobočky)
+#   - součet návrhů nesmí přesáhnout zásobu Pardubic; ubírá se vždy
+#     většímu z návrhů (při shodě Praze)
+
+import numpy as np
+from sqlalchemy import func
+
+from app import db
+from app.models import Product, Stock
+from app.sales_rollup import window_sums
+from app.warehouse_snapshot import UNIVERSAL_SIZE, VELIKOSTI
+
+ZDROJ = "Pardubice"
+SKLADY = ["Pardubice", "Praha", "Brno"]   # pořadí třetí osy polí
+PCE, PRAHA, BRNO = range(3)
+
+
+def _fill(arr, rows, p_index, s_index):
+    w_index = {s: i for i, s in enumerate(SKLADY)}
+    for pid, size, sklad, val in rows:
+        p, s, w = p_index.get(pid), s_index.get(size), w_index.get(sklad)
+        if p is None or s is None or w is None:
+            continue
+        arr[p, s, w] += val or 0
+
+
+def load_stock(produkty, velikosti):
+    p_index = {p.id: i for i, p in enumerate(produkty)}
+    s_index = {v: i for i, v in enumerate(velikosti)}
+    arr = np.zeros((len(produkty), len(velikosti), len(SKLADY)), dtype=np.int64)
+    if not produkty:
+        return arr
+
+    rows = (
+        db.session.query(Stock.product_id, Stock.size, Stock.sklad, func.sum(Stock.quantity))
+        .filter(Stock.product_id.in_(p_index), Stock.sklad.in_(SKLADY))
+        .group_by(Stock.product_id, Stock.size, Stock.sklad)
+        .all()
+    )
+    _fill(arr, rows, p_index, s_index)
+    return arr
+
+
+def load_sales(produkty, velikosti, datum_od, datum_do=None):
+    """Prodeje za okno dnů z denního souhrnu (viz app/sales_rollup.py)."""
+    p_index = {p.id: i for i, p in enumerate(produkty)}
+    s_index = {v: i for i, v in enumerate(velikosti)}
+    arr = np.zeros((len(produkty), len(velikosti), len(SKLADY)), dtype=np.int64)
+    if not produkty:
+        return arr
+
+    rows = window_sums(list(p_index), datum_od, datum_do)
+    _fill(arr, rows, p_index, s_index)
+    return arr
+
+
+def custom_round(val):
+    """Vektorová verze pravidla zaokrouhlení z distribuce()."""
+    trunc = np.trunc(val)
+    rounded = np.where(val - trunc >= 0.5, trunc + 1, trunc)
+    return np.where(val <= 0, 0, np.where(val < 1.0, 1, rounded)).astype(np.int64)
+
+
+def propose(stock, sales):
+    """
+    Vrací (navrh_praha, navrh_brno) jako pole tvaru (produkty, velikosti).
+    """
+    pce_stock = stock[..., PCE]
+    praha_stock, brno_stock = stock[..., PRAHA], stock[..., BRNO]
+    praha_sales, brno_sales = sales[..., PRAHA], sales[..., BRNO]
+
+    total_sales = sales[..., PCE] + praha_sales + brno_sales
+    total_available = (
+        pce_stock
+        + np.where(praha_sales > 0, praha_stock, 0)
+        + np.where(brno_sales > 0, brno_stock, 0)
+    )
+    active = (total_sales > 0) & (total_available > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share_praha = np.where(active, praha_sales / total_sales * total_available, 0.0)
+        share_brno = np.where(active, brno_sales / total_sales * total_available, 0.0)
+
+    praha = np.where(active & (praha_sales > 0), np.maximum(0, custom_round(share_praha) - praha_stock), 0)
+    brno = np.where(active & (brno_sales > 0), np.maximum(0, custom_round(share_brno) - brno_stock), 0)
+
+    # Strop = zásoba Pardubic. Původní smyčka ubírala po 1 ks většímu
+    # návrhu (při shodě Praze); výsledek lze spočítat přímo.
+    over = active & ((praha + brno) > pce_stock)
+    target = np.maximum(pce_stock, 0)
+    excess = praha + brno - target
+    diff = np.abs(praha - brno)
+
+    # a) stačí ubrat jen většímu návrhu
+    only_larger = over & (excess <= diff)
+    praha_a = np.where(praha >= brno, praha - excess, praha)
+    brno_a = np.where(praha >= brno, brno, brno - excess)
+    # b) oba návrhy se vyrovnají a zbytek se dělí (lichý kus dostane Brno)
+    praha_b = target // 2
+    brno_b = target - target // 2
+
+    praha = np.where(only_larger, praha_a, np.where(over, praha_b, praha))
+    brno = np.where(only_larger, brno_a, np.where(over, brno_b, brno))
+    return praha, brno
+
+
+def build_proposal(kategorie, datum_od, datum_do=None):
+    """Řádky pro šablonu distribuce.html (datum_od/do jsou dny okna prodejů)."""
+    produkty = Product.query.filter_by(category=kategorie).order_by(Product.name).all()
+    velikosti = VELIKOSTI.get(kategorie, [UNIVERSAL_SIZE])
+
+    stock = load_stock(produkty, velikosti)
+    sales = load_sales(produkty, velikosti, datum_od, datum_do)
+    praha, brno = propose(stock, sales)
+
+    show = (stock[..., PCE] > 0) | (praha > 0) | (brno > 0)
+    navrh_data = []
+    for p_i, s_i in zip(*np.nonzero(show)):
+        navrh_data.append({
+            'product': produkty[p_i], 'size': velikosti[s_i],
+            'pce_stock': int(stock[p_i, s_i, PCE]), 'pce_sales': int(sales[p_i, s_i, PCE]),
+            'praha_stock': int(stock[p_i, s_i, PRAHA]), 'praha_sales': int(sales[p_i, s_i, PRAHA]),
+            'navrh_praha': int(praha[p_i, s_i]),
+            'brno_stock': int(stock[p_i, s_i, BRNO]), 'brno_sales': int(sales[p_i, s_i, BRNO]),
+            'navrh_brno': int(brno[p_i, s_i]),
+        })
+    return navrh_data
@@ -0,0 +1,65 @@
+# app/db_routing.py
+#
+# Směrování čtecích dotazů reportů na repliku.
+#
+# Je-li nastavená DATABASE_REPLICA_URL (bind "replica", viz config.py),
+# routy označené @read_replica posílají při GET požadavku SELECTy na
+# repliku. Zápisy, flush a vše mimo označené routy jde dál na primární
+# databázi. Bez repliky se nic nemění.
+#
+# Modul se importuje už při vytváření `db` (session_options), proto
+# nesmí importovat nic z balíčku app.
+
+from functools import wraps
+
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql import Select
+
+REPLICA_BIND = "replica"
+_REPLICA_KEY = "use_replica"
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and self.info.get(_REPLICA_KEY)
+            and isinstance(clause, Select)
+            and not self._flushing
+            and not (self.new or self.dirty or self.deleted)
+        ):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(view):
+    """Dotazy GET požadavku na view jdou na repliku (je-li nastavená)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != "GET":
+            return view(*args, **kwargs)
+
+        from app import db
+        db.session.info[_REPLICA_KEY] = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            db.session.info.pop(_REPLICA_KEY, None)
+    return wrapper
+
+
+def pool_stats(engines):
+    """Stav poolů spojení pro každý engine (klíč None = primární)."""
+    stats = {}
+    for key, engine in engines.items():
+        pool = engine.pool
+        info = {"pool": type(pool).__name__, "status": pool.status()}
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            fn = getattr(pool, name, None)
+            if callable(fn):
+                info[name] = fn()
+        stats[key or "primary"] = info
+    return stats
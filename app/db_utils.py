@@ -0,0 +1,87 @@
+# app/db_utils.py
+#
+# Drobné pomocníky nad SQLAlchemy, které se liší podle databáze
+# (SQLite na menších pobočkách, PostgreSQL v produkci).
+#
+# SQLite profil: při každém připojení se nastaví WAL (čtenáři dashboardu
+# nečekají na zapisující), synchronous=NORMAL, mmap, cache a busy_timeout.
+# Zápis, který i tak narazí na zámek ("database is locked"), zopakuje
+# commit_with_retry s krátkým čekáním – jen zápis a commit, ne celou routu
+# (ta už mohla přečíst nahraný soubor nebo přidat flash zprávu).
+
+import random
+import time
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+
+def dialect_insert(model):
+    """INSERT s podporou ON CONFLICT pro aktuální databázi."""
+    if db.engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def sqlite_pragmas(config):
+    """Pragmy SQLite profilu podle konfigurace (SQLITE_*)."""
+    return [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_MB']) * 1024 * 1024}",
+        # záporná hodnota = velikost v KiB, ne počet stránek
+        f"PRAGMA cache_size={-int(config['SQLITE_CACHE_MB']) * 1024}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+    ]
+
+
+def install_sqlite_profile(engine, config):
+    """Zaregistruje pragmy pro každé nové spojení enginu (jen SQLite)."""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def is_busy_error(exc):
+    """SQLITE_BUSY / SQLITE_LOCKED z ovladače sqlite3."""
+    if not isinstance(exc, OperationalError):
+        return False
+    msg = str(exc.orig).lower()
+    return "database is locked" in msg or "database is busy" in msg or "database table is locked" in msg
+
+
+def commit_with_retry(work):
+    """
+    Provede zápis work() a commit. Při zamčené SQLite databázi se transakce
+    vrátí a work() se spustí znovu (SQLITE_BUSY_RETRIES pokusů, rostoucí
+    čekání). work() jen čte a zapisuje DB – požadavek, soubory a flash
+    zprávy zpracuje volající jednou, mimo ni. Vrací výsledek work().
+    """
+    retries = current_app.config["SQLITE_BUSY_RETRIES"]
+    for attempt in range(retries + 1):
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except OperationalError as e:
+            if attempt == retries or not is_busy_error(e):
+                raise
+            db.session.rollback()
+            current_app.logger.warning(
+                "SQLite zamčená v %s, pokus %d/%d",
+                request.path if has_request_context() else "-", attempt + 1, retries
+            )
+            time.sleep(0.05 * 2 ** attempt * (1 + random.random()))
@@ -0,0 +1,93 @@
+# app/drafts.py
+#
+# Rozpracované koncepty uložené na serveru místo v cookie.
+#
+# Košík přeskladnění a rozpočítaná inventura se dřív držely v podepsané
+# cookie session (session["kosik"], session["inventura_data"]). Inventura
+# celého skladu tak snadno přerostla limit cookie a s každým požadavkem se
+# znovu serializovala a podepisovala. Teď leží v tabulce draft pod klíčem
+# (uživatel, druh) s expirací; v cookie zůstává jen přihlášení. Koncept
+# přežije pád prohlížeče i přechod na jiné zařízení.
+#
+# Druhy: "kosik" a "inventura:<sklad>" (inventura zvlášť pro každý sklad).
+# Commit je na volajícím. Koncepty ze starých cookie přesune jednou
+# migrate_legacy_drafts() v before_request (viz app/__init__.py) – čtení
+# get_draft tak nic nezapisuje a dá se volat uvnitř commit_with_retry.
+
+import json
+from datetime import datetime, timedelta
+
+from flask import current_app, session
+from flask_login import current_user
+
+from app import db
+from app.db_utils import commit_with_retry, dialect_insert
+from app.models import Draft
+
+# původní klíče v cookie – první požadavek je přesune do tabulky
+_LEGACY_KEYS = ("kosik", "inventura_data")
+
+
+def inventura_kind(sklad):
+    return f"inventura:{sklad}"
+
+
+def migrate_legacy_drafts():
+    """
+    Přesune koncepty ze starých klíčů cookie session do tabulky (vlastní
+    transakce). Inventura připadne naposledy zvolenému skladu.
+    """
+    if not any(key in session for key in _LEGACY_KEYS):
+        return
+    drafts = {}
+    if "kosik" in session:
+        drafts["kosik"] = session["kosik"]
+    sklad = session.get("inventura_sklad") or current_user.sklad
+    if "inventura_data" in session and sklad:
+        drafts[inventura_kind(sklad)] = session["inventura_data"]
+
+    def presunout():
+        for kind, data in drafts.items():
+            save_draft(kind, data)
+
+    commit_with_retry(presunout)
+    for key in _LEGACY_KEYS:
+        session.pop(key, None)
+
+
+def get_draft(kind, default=None, user=None):
+    user = user or current_user.username
+    raw = (
+        db.session.query(Draft.data)
+        .filter(Draft.user == user, Draft.kind == kind, Draft.expires_at > datetime.now())
+        .scalar()
+    )
+    return json.loads(raw) if raw is not None else default
+
+
+def save_draft(kind, data, user=None):
+    user = user or current_user.username
+    now = datetime.now()
+    stmt = dialect_insert(Draft).values(
+        user=user, kind=kind, data=json.dumps(data, separators=(",", ":")),
+        updated_at=now, expires_at=now + timedelta(days=current_app.config["DRAFT_TTL_DAYS"]),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Draft.user, Draft.kind],
+        set_={
+            "data": stmt.excluded.data,
+            "updated_at": stmt.excluded.updated_at,
+            "expires_at": stmt.excluded.expires_at,
+        }
+    )
+    db.session.execute(stmt)
+
+
+def delete_draft(kind, user=None):
+    user = user or current_user.username
+    Draft.query.filter_by(user=user, kind=kind).delete(synchronize_session=False)
+
+
+def purge_expired():
+    """Smaže koncepty po expiraci. Vrací počet smazaných."""
+    return Draft.query.filter(Draft.expires_at <= datetime.now()).delete(synchronize_session=False)
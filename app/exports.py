@@ -0,0 +1,129 @@
+# app/exports.py
+#
+# Streamované CSV exporty.
+#
+# Soubor se neskládá v paměti (StringIO + make_response), ale posílá se
+# po řádcích z generátoru: řádky se čtou z DB po dávkách (yield_per, na
+# PostgreSQL přes server-side kurzor) a do odpovědi jdou po kusech o
+# velikosti CHUNK_ROWS. Stahování tak začne hned a paměť zůstává plochá
+# i u exportu milionů pohybů.
+
+import csv
+import io
+from urllib.parse import quote
+
+from flask import Response, stream_with_context
+
+from app.models import History, Product
+from app.warehouse_snapshot import VELIKOSTI, iter_rows
+
+BATCH = 1000        # řádků na jedno načtení z DB
+CHUNK_ROWS = 500    # řádků CSV na jeden kus odpovědi
+
+NADPISY = {"saty": "ŠATY", "boty": "BOTY", "doplnky": "DOPLŇKY", "ostatni": "OSTATNÍ"}
+
+
+def _csv_chunks(rows):
+    """Převede iterátor řádků na kusy textu CSV (oddělovač ';', BOM pro Excel)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=';')
+    buf.write('\ufeff')
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % CHUNK_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def csv_response(rows, filename):
+    """Streamovaná odpověď s CSV; `rows` je generátor řádků (seznamů)."""
+    response = Response(
+        stream_with_context(_csv_chunks(rows)),
+        mimetype="text/csv",
+        headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+            # nginx jinak odpověď bufferuje a stahování nezačne hned
+            "X-Accel-Buffering": "no",
+        },
+    )
+    response.headers["Content-Type"] = "text/csv; charset=utf-8"
+    return response
+
+
+def _streamed(query):
+    return query.execution_options(stream_results=True, yield_per=BATCH)
+
+
+# -------------------------------------------------------------
+#  Inventura skladu
+# -------------------------------------------------------------
+def inventory_rows(sklad):
+    """Řádky inventury skladu ve stejném tvaru jako dřívější CSV export."""
+    aktualni = None
+    for r in iter_rows(sklad, stream=True):
+        cat = r.category
+        velikosti = VELIKOSTI[cat]
+        if cat != aktualni:
+            if aktualni is not None:
+                yield []
+            aktualni = cat
+            yield [f"--- {NADPISY[cat]} ---"]
+            if cat == "saty":
+                yield ["Název", "Barva", "Řešení zad"] + [str(v) for v in velikosti] + ["Celkem"]
+            elif cat == "boty":
+                yield ["Název"] + [str(v) for v in velikosti] + ["Celkem"]
+            elif cat == "doplnky":
+                yield ["Název", "Barva", "Množství"]
+            else:
+                yield ["Název", "Množství"]
+
+        if cat == "saty":
+            row = [r.name, r.color or "-", r.back_solution or "-"]
+        elif cat == "doplnky":
+            row = [r.name, r.color or "-"]
+        else:
+            row = [r.name]
+
+        for v in velikosti:
+            qty = r.qtys[v]
+            row.append(qty if qty > 0 else "")
+        if cat in ["saty", "boty"]:
+            row.append(r.total if r.total > 0 else "")
+        yield row
+
+    if aktualni is not None:
+        yield []
+
+
+# -------------------------------------------------------------
+#  Historie pohybů
+# -------------------------------------------------------------
+def history_rows(query):
+    """
+    Řádky exportu historie. `query` je History.query se stejnými filtry
+    jako stránka /historie (viz routes._history_filters).
+    """
+    rows = _streamed(
+        query.outerjoin(Product, History.product_id == Product.id)
+        .order_by(History.timestamp.desc(), History.id.desc())
+        .with_entities(
+            History.timestamp, History.user, History.sklad,
+            Product.name, Product.color, Product.back_solution, Product.category,
+            History.size, History.change_type, History.amount, History.note,
+        )
+    )
+
+    yield ["Datum", "Uživatel", "Sklad", "Produkt", "Velikost", "Typ změny", "Množství", "Poznámka"]
+    for ts, user, sklad, name, color, back_solution, category, size, change, amount, note in rows:
+        label = "-".join(p for p in (name, color, back_solution) if p) if name else "-"
+        if size is None or category in ["doplnky", "ostatni"]:
+            size_display = "-"
+        else:
+            size_display = size
+        yield [
+            ts.strftime("%d.%m.%Y %H:%M") if ts else "",
+            user, sklad, label, size_display, change, amount, note or "",
+        ]
@@ -0,0 +1,87 @@
+# app/history_facets.py
+#
+# Seznam uživatelů a skladů pro roletky v historii.
+#
+# Dřív se plnil dvěma DISTINCT dotazy přes celou tabulku History při
+# každém zobrazení. Teď se hodnoty udržují v malé tabulce history_facet:
+# při zápisu nového záznamu History se uživatel/sklad vloží, pokud v ní
+# ještě nejsou. Každý worker si pamatuje, co už v tabulce je, takže běžný
+# zápis žádný dotaz navíc nedělá.
+
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.db_utils import dialect_insert
+from app.models import History, HistoryFacet
+
+_PENDING_KEY = "history_facets_pending"
+
+_known = set()
+_known_loaded = False
+_lock = threading.Lock()
+
+
+def _ensure_known():
+    global _known_loaded
+    if _known_loaded:
+        return
+    rows = db.session.query(HistoryFacet.kind, HistoryFacet.value).all()
+    with _lock:
+        _known.update(rows)
+        _known_loaded = True
+
+
+def register_facets(session, pairs):
+    """Zajistí, že dvojice (kind, value) existují v history_facet."""
+    _ensure_known()
+    missing = {p for p in pairs if p[1] and p not in _known}
+    if not missing:
+        return
+    stmt = dialect_insert(HistoryFacet).values(
+        [{"kind": k, "value": v} for k, v in missing]
+    ).on_conflict_do_nothing()
+    session.execute(stmt)
+    session.info.setdefault(_PENDING_KEY, set()).update(missing)
+
+
+def register_history_rows(session, rows):
+    """Pro hromadné inserty do History mimo ORM (seznam slovníků)."""
+    pairs = set()
+    for r in rows:
+        pairs.add(("user", r.get("user")))
+        pairs.add(("sklad", r.get("sklad")))
+    register_facets(session, pairs)
+
+
+def get_facets():
+    rows = db.session.query(HistoryFacet.kind, HistoryFacet.value).all()
+    users = sorted(v for k, v in rows if k == "user")
+    sklady = sorted(v for k, v in rows if k == "sklad")
+    return users, sklady
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_new_history(session, flush_context, instances):
+    pairs = set()
+    for obj in session.new:
+        if isinstance(obj, History):
+            pairs.add(("user", obj.user))
+            pairs.add(("sklad", obj.sklad))
+    if pairs:
+        register_facets(session, pairs)
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_committed(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        with _lock:
+            _known.update(pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_pending(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
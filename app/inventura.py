@@ -0,0 +1,163 @@
+# app/inventura.py
+#
+# Rozpracovaná inventura po buňkách.
+#
+# Koncept inventury (app/drafts.py, druh "inventura:<sklad>") má tvar
+# {"<pid>": {"<velikost>": počet}}. Tablet při počítání neposílá celý
+# formulář se všemi qty_<pid>_<velikost> políčky katalogu, ale jen změněné
+# buňky na /inventura/autosave. Ty se sloučí do konceptu a rozdíl proti
+# Stock se spočítá jen pro ně – práce úměrná počtu změn, ne velikosti
+# katalogu. Stejný výpočet (jen buňky konceptu) používá i náhled.
+#
+# Potvrzení (confirm) načte stav buněk konceptu jedním dotazem, rozdíly
+# spočítá v paměti a zapíše je přes ledger.post_movements – jeden UPSERT
+# do Stock a jeden hromadný INSERT do History. Celá inventura je jeden
+# záznam InventuraBatch; její pohyby nesou poznámku "Inventura č. <id>".
+# Zápis tak roste s počtem rozdílů, ne s velikostí katalogu.
+
+from datetime import datetime
+
+from sqlalchemy import func, tuple_
+
+from app import db
+from app.ledger import post_movements
+from app.models import InventuraBatch, Product, Stock
+from app.warehouse_snapshot import VELIKOSTI
+
+# po kolika buňkách se skládá IN (…) – limit parametrů SQLite
+CHUNK = 400
+
+
+class CellError(ValueError):
+    pass
+
+
+def parse_cells(raw):
+    """
+    Ověří seznam buněk z JSON [{"pid": 1, "size": 34, "qty": 4}, …].
+    qty null = buňka se vymaže z konceptu. Vrací [(pid, size, qty|None)].
+    """
+    if not isinstance(raw, list):
+        raise CellError("Očekávám seznam buněk.")
+    cells = []
+    for cell in raw:
+        try:
+            pid = int(cell["pid"])
+            size = int(cell["size"])
+            qty = cell.get("qty")
+            qty = None if qty in (None, "") else int(qty)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise CellError(f"Neplatná buňka: {cell!r}")
+        if qty is not None and qty < 0:
+            raise CellError(f"Záporný počet u produktu {pid}, velikost {size}.")
+        cells.append((pid, size, qty))
+    return cells
+
+
+def merge_cells(inv, cells):
+    """Sloučí změněné buňky do konceptu (na místě) a vrátí ho."""
+    for pid, size, qty in cells:
+        sizes = inv.setdefault(str(pid), {})
+        if qty is None:
+            sizes.pop(str(size), None)
+            if not sizes:
+                inv.pop(str(pid))
+        else:
+            sizes[str(size)] = qty
+    return inv
+
+
+def _chunks(items):
+    items = list(items)
+    for i in range(0, len(items), CHUNK):
+        yield items[i:i + CHUNK]
+
+
+def _cell_states(sklad, inv):
+    """
+    [(produkt, velikost, staré, nové)] pro buňky konceptu v jeho pořadí.
+    Neznámé produkty a velikosti mimo kategorii se přeskočí.
+    """
+    pairs = [(int(pid), int(size)) for pid, sizes in inv.items() for size in sizes]
+    if not pairs:
+        return []
+
+    products = {}
+    for chunk in _chunks({pid for pid, _ in pairs}):
+        for p in Product.query.filter(Product.id.in_(chunk)):
+            products[p.id] = p
+
+    stock = {}
+    for chunk in _chunks(pairs):
+        rows = (
+            db.session.query(Stock.product_id, Stock.size, func.sum(Stock.quantity))
+            .filter(Stock.sklad == sklad, tuple_(Stock.product_id, Stock.size).in_(chunk))
+            .group_by(Stock.product_id, Stock.size)
+        )
+        for pid, size, qty in rows:
+            stock[(pid, size)] = qty or 0
+
+    states = []
+    for pid_str, sizes in inv.items():
+        prod = products.get(int(pid_str))
+        if prod is None or prod.category not in VELIKOSTI:
+            continue
+        for size_str, new_qty in sizes.items():
+            size = int(size_str)
+            if size in VELIKOSTI[prod.category]:
+                states.append((prod, size, stock.get((prod.id, size), 0), new_qty))
+    return states
+
+
+def cell_diffs(sklad, inv):
+    """
+    Rozdíly konceptu proti Stock – jen pro buňky v konceptu, v jeho pořadí.
+    Vrací seznam {"pid", "size", "label", "old", "new", "delta"} pro
+    nenulové rozdíly (size je pro doplňky a ostatní "-").
+    """
+    return [
+        {
+            "pid": prod.id,
+            "size": "-" if prod.category in ["doplnky", "ostatni"] else size,
+            "label": prod.variant_label,
+            "old": old_qty,
+            "new": new_qty,
+            "delta": new_qty - old_qty,
+        }
+        for prod, size, old_qty, new_qty in _cell_states(sklad, inv)
+        if new_qty != old_qty
+    ]
+
+
+def confirm(sklad, inv, user):
+    """
+    Zapíše koncept inventury do skladu jako jednu dávku. Vrací InventuraBatch.
+    Rozdíly se do Stock promítnou relativně (quantity + rozdíl) jako každý
+    jiný pohyb v deníku. Commit je na volajícím.
+    """
+    states = _cell_states(sklad, inv)
+    now = datetime.now()
+    batch = InventuraBatch(sklad=sklad, user=user, created_at=now, cells=len(states))
+    db.session.add(batch)
+    db.session.flush()
+
+    note = f"Inventura č. {batch.id}"
+    movements = [
+        {
+            "user": user,
+            "sklad": sklad,
+            "product_id": prod.id,
+            "size": size,
+            "amount": new_qty - old_qty,
+            "change_type": "inventura",
+            "timestamp": now,
+            "note": note,
+        }
+        for prod, size, old_qty, new_qty in states
+        if new_qty != old_qty
+    ]
+    post_movements(movements)
+
+    batch.changes = len(movements)
+    batch.delta_sum = sum(m["amount"] for m in movements)
+    return batch
@@ -0,0 +1,316 @@
+# app/ledger.py
+#
+# Skladový deník (ledger).
+#
+# Zdrojem pravdy o pohybech je append-only tabulka History – každý pohyb
+# zásoby se do ní zapisuje jako řádek se změnou množství (amount).
+# Tabulka Stock je jen materializovaný stav: pohyb se do ní promítne
+# relativním UPDATE (quantity = quantity + :n) bez předchozího čtení, takže
+# dva souběžné zápisy na stejnou položku se nepřepisují.
+#
+# Odpis s kontrolou zásoby (check_stock=True – výdej, přeskladnění) je
+# podmíněný UPDATE ... SET quantity = quantity - :n WHERE ... AND
+# quantity >= :n. Kontrola a odpis jsou jeden příkaz, takže dva prodavači
+# neprodají poslední kus oba; kdo přijde druhý, dostane InsufficientStock.
+# Hromadný odpis (post_movements, přeskladnění) je totéž pro všechny
+# položky najednou: jeden UPDATE stock … FROM (odběry) WHERE quantity >=
+# odběr; nesedí-li počet odepsaných řádků, některá položka nestačila.
+#
+# Periodické snímky (StockSnapshot, viz `python manage.py stock-snapshot`)
+# umožňují dotaz na stav k libovolnému datu: vezme se nejbližší snímek
+# (nebo aktuální Stock) a dopočítají se pohyby z deníku mezi ním a datem.
+
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import Integer, String, column, func, insert, select, update, values
+
+from app import db
+from app.db_utils import dialect_insert
+from app.history_facets import register_history_rows
+from app.sales_rollup import record_outbound
+from app.models import History, Product, Stock, StockSnapshot
+from app.stock_cache import SKLADY, StockMatrix, record_stock_change
+
+
+class InsufficientStock(ValueError):
+    """Podmíněný odpis nenašel dost kusů (nebo řádek Stock vůbec)."""
+
+    def __init__(self, sklad, product_id, size, qty):
+        super().__init__(f"Nedostatek zásoby: produkt {product_id}, vel. {size}, sklad {sklad}")
+        self.sklad = sklad
+        self.product_id = product_id
+        self.size = size
+        self.qty = qty
+
+
+def withdraw(sklad, product_id, size, qty):
+    """
+    Atomicky odepíše qty kusů, jen pokud jich je na skladě dost.
+    Jinak vyhodí InsufficientStock; transakci vrací volající.
+    """
+    res = db.session.execute(
+        update(Stock)
+        .where(
+            Stock.product_id == product_id,
+            Stock.sklad == sklad,
+            Stock.size == size,
+            Stock.quantity >= qty,
+        )
+        .values(quantity=Stock.quantity - qty)
+        .execution_options(synchronize_session=False)
+    )
+    if res.rowcount != 1:
+        raise InsufficientStock(sklad, product_id, size, qty)
+
+
+def _needs_table(needs):
+    """Odběry [(sklad, product_id, size, qty)] jako tabulka v pro UPDATE … FROM."""
+    if db.engine.dialect.name == "postgresql":
+        return values(
+            column("sklad", String), column("product_id", Integer),
+            column("size", Integer), column("need", Integer),
+            name="v"
+        ).data(needs)
+    # SQLite neumí (VALUES …) AS v (sloupce) – řádky jdou jedním JSON parametrem
+    rows = func.json_each(json.dumps(needs)).table_valued("value")
+    return select(*[
+        func.json_extract(rows.c.value, f"$[{i}]").label(name)
+        for i, name in enumerate(("sklad", "product_id", "size", "need"))
+    ]).subquery("v")
+
+
+def withdraw_many(needs):
+    """
+    Atomicky odepíše {(sklad, product_id, size): qty} jedním příkazem –
+    řádek Stock se změní, jen pokud má quantity >= qty. Když některá
+    položka nestačí, vyhodí InsufficientStock (pro první z nich); část už
+    odepsaná zůstane v transakci, kterou vrací volající.
+    """
+    if not needs:
+        return
+    v = _needs_table([(sklad, pid, size, qty) for (sklad, pid, size), qty in needs.items()])
+    updated = db.session.execute(
+        update(Stock)
+        .where(
+            Stock.sklad == v.c.sklad,
+            Stock.product_id == v.c.product_id,
+            Stock.size == v.c.size,
+            Stock.quantity >= v.c.need,
+        )
+        .values(quantity=Stock.quantity - v.c.need)
+        .returning(Stock.sklad, Stock.product_id, Stock.size)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if len(updated) != len(needs):
+        odepsano = {tuple(row) for row in updated}
+        for key, qty in needs.items():
+            if key not in odepsano:
+                raise InsufficientStock(*key, qty)
+
+
+def post_movement(user, sklad, product_id, size, amount, change_type, timestamp=None, note=None,
+                  check_stock=False):
+    """
+    Zapíše pohyb do deníku a promítne ho do Stock v aktuální transakci.
+    check_stock=True: záporný pohyb projde jen při dostatku zásoby
+    (jinak InsufficientStock). Commit je na volajícím.
+    """
+    timestamp = timestamp or datetime.now()
+    if check_stock and amount < 0:
+        withdraw(sklad, product_id, size, -amount)
+    else:
+        _apply_to_stock(sklad, product_id, size, amount)
+    db.session.add(History(
+        user=user,
+        sklad=sklad,
+        product_id=product_id,
+        size=size,
+        change_type=change_type,
+        amount=amount,
+        timestamp=timestamp,
+        note=note
+    ))
+    record_stock_change(sklad, product_id, size, delta=amount)
+
+
+def post_movements(movements, check_stock=False):
+    """
+    Hromadná varianta post_movement pro seznam slovníků s klíči
+    user, sklad, product_id, size, amount, change_type (+ timestamp, note).
+
+    Stock se upraví jedním UPSERT příkazem (změny na stejnou položku se
+    sečtou předem), History jedním hromadným INSERT. S check_stock=True se
+    záporné součty odepisují jedním podmíněným UPDATE (withdraw_many).
+    Commit je na volajícím.
+    """
+    if not movements:
+        return
+
+    now = datetime.now()
+    history_rows = []
+    deltas = defaultdict(int)
+    for m in movements:
+        history_rows.append({
+            "user": m["user"],
+            "sklad": m["sklad"],
+            "product_id": m["product_id"],
+            "size": m["size"],
+            "change_type": m["change_type"],
+            "amount": m["amount"],
+            "timestamp": m.get("timestamp") or now,
+            "note": m.get("note"),
+        })
+        deltas[(m["sklad"], m["product_id"], m["size"])] += m["amount"]
+
+    upsert, needs = {}, {}
+    for key, delta in deltas.items():
+        if check_stock and delta < 0:
+            needs[key] = -delta
+        else:
+            upsert[key] = delta
+    withdraw_many(needs)
+
+    if upsert:
+        stmt = dialect_insert(Stock).values([
+            {"product_id": pid, "sklad": sklad, "size": size, "quantity": delta}
+            for (sklad, pid, size), delta in upsert.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Stock.product_id, Stock.sklad, Stock.size],
+            set_={"quantity": func.coalesce(Stock.quantity, 0) + stmt.excluded.quantity}
+        )
+        db.session.execute(stmt)
+
+    db.session.execute(insert(History), history_rows)
+    register_history_rows(db.session, history_rows)
+    record_outbound(db.session, history_rows)
+
+    for (sklad, pid, size), delta in deltas.items():
+        record_stock_change(sklad, pid, size, delta=delta)
+
+
+def _apply_to_stock(sklad, product_id, size, amount):
+    stmt = dialect_insert(Stock).values(
+        product_id=product_id, sklad=sklad, size=size, quantity=amount
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Stock.product_id, Stock.sklad, Stock.size],
+        set_={"quantity": func.coalesce(Stock.quantity, 0) + stmt.excluded.quantity}
+    )
+    db.session.execute(stmt)
+
+
+# -------------------------------------------------------------
+#  Snímky
+# -------------------------------------------------------------
+def take_snapshot(taken_at=None):
+    """Uloží aktuální stav Stock jako snímek. Vrací počet řádků."""
+    taken_at = taken_at or datetime.now()
+    rows = (
+        db.session.query(Stock.product_id, Stock.sklad, Stock.size, Stock.quantity)
+        .filter(Stock.size.isnot(None), Stock.quantity != 0)
+        .all()
+    )
+    db.session.bulk_insert_mappings(StockSnapshot, [
+        {"taken_at": taken_at, "product_id": pid, "sklad": sklad, "size": size, "quantity": qty}
+        for pid, sklad, size, qty in rows
+    ])
+    return len(rows)
+
+
+def _ledger_sums(sklady, od=None, do=None):
+    q = (
+        db.session.query(History.sklad, History.product_id, History.size, func.sum(History.amount))
+        .filter(History.sklad.in_(sklady), History.product_id.isnot(None))
+    )
+    if od is not None:
+        q = q.filter(History.timestamp > od)
+    if do is not None:
+        q = q.filter(History.timestamp <= do)
+    return q.group_by(History.sklad, History.product_id, History.size).all()
+
+
+def _last_snapshot_time(before):
+    return (
+        db.session.query(func.max(StockSnapshot.taken_at))
+        .filter(StockSnapshot.taken_at <= before)
+        .scalar()
+    )
+
+
+def stock_at(sklad, at):
+    """
+    Stav skladu (nebo "Celkem") k okamžiku `at` jako StockMatrix.
+
+    Od posledního snímku před `at` se pohyby přičítají dopředu; pokud je
+    aktuální stav blíž, odečítají se pohyby od `at` do teď.
+    """
+    sklady = SKLADY if sklad == "Celkem" else [sklad]
+    now = datetime.now()
+    snap_at = _last_snapshot_time(at)
+
+    result = StockMatrix(version=at)
+    qty = defaultdict(lambda: defaultdict(int))
+
+    if snap_at is not None and (at - snap_at) <= (now - at):
+        base = (
+            db.session.query(StockSnapshot.product_id, StockSnapshot.size, StockSnapshot.quantity)
+            .filter(StockSnapshot.taken_at == snap_at, StockSnapshot.sklad.in_(sklady))
+            .all()
+        )
+        for pid, size, q in base:
+            qty[pid][size] += q
+        for _, pid, size, delta in _ledger_sums(sklady, od=snap_at, do=at):
+            qty[pid][size] += delta or 0
+    else:
+        base = (
+            db.session.query(Stock.product_id, Stock.size, Stock.quantity)
+            .filter(Stock.sklad.in_(sklady), Stock.size.isnot(None))
+            .all()
+        )
+        for pid, size, q in base:
+            qty[pid][size] += q or 0
+        for _, pid, size, delta in _ledger_sums(sklady, od=at):
+            qty[pid][size] -= delta or 0
+
+    for pid, sizes in qty.items():
+        result.qty[pid] = dict(sizes)
+    return result
+
+
+def verify_against_snapshot():
+    """
+    Porovná Stock s posledním snímkem + pohyby z deníku od něj.
+    Vrací seznam (sklad, product_id, size, ocekavano, skutecnost).
+    """
+    snap_at = _last_snapshot_time(datetime.now())
+    if snap_at is None:
+        return []
+
+    expected = defaultdict(int)
+    for pid, sklad, size, q in (
+        db.session.query(StockSnapshot.product_id, StockSnapshot.sklad, StockSnapshot.size, StockSnapshot.quantity)
+        .filter(
+            StockSnapshot.taken_at == snap_at,
+            # smazané produkty mají smazaný i deník
+            StockSnapshot.product_id.in_(db.session.query(Product.id))
+        )
+    ):
+        expected[(sklad, pid, size)] += q
+    for sklad, pid, size, delta in _ledger_sums(SKLADY, od=snap_at):
+        expected[(sklad, pid, size)] += delta or 0
+
+    actual = defaultdict(int)
+    for pid, sklad, size, q in (
+        db.session.query(Stock.product_id, Stock.sklad, Stock.size, Stock.quantity)
+        .filter(Stock.size.isnot(None))
+    ):
+        actual[(sklad, pid, size)] += q or 0
+
+    drift = []
+    for key in set(expected) | set(actual):
+        if expected[key] != actual[key]:
+            drift.append((*key, expected[key], actual[key]))
+    return sorted(drift, key=lambda d: (d[0], d[1], d[2]))
@@ -3,6 +3,7 @@ from flask_login import UserMixin
 from app import login
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import DDL, event
 from sqlalchemy.orm import backref
 
 class User(UserMixin, db.Model):
@@ -21,7 +22,9 @@ class User(UserMixin, db.Model):
 
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    # krátkodobý cache v procesu (viz app/user_cache.py)
+    from app.user_cache import get_user
+    return get_user(int(id))
 
 
 class Product(db.Model):
@@ -30,6 +33,15 @@ class Product(db.Model):
     category      = db.Column(db.String(20), nullable=False, default="saty")
     color         = db.Column(db.String(32), nullable=True)
     back_solution = db.Column(db.String(64), nullable=True)
+    # název, barva a záda bez diakritiky, malými písmeny (viz app/product_search.py)
+    search_text   = db.Column(db.String(200), nullable=True)
+
+    __table_args__ = (
+        db.Index(
+            "ix_product_search_trgm", "search_text",
+            postgresql_using="gin", postgresql_ops={"search_text": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
 
     # vztah na Stock, potlačí SAWarning ohledně "stocks" a "product"
     stock = db.relationship(
@@ -49,6 +61,29 @@ class Product(db.Model):
         return "-".join(parts)
 
 
+# Index vyhledávání pro databáze zakládané přes create_all (migrace
+# c19a7e5d3b42 zakládá totéž): pg_trgm pro GIN index výše, na SQLite FTS5
+# tabulka product_fts nad search_text udržovaná triggery.
+PRODUCT_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+    "search_text, content='product', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+    "INSERT INTO product_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF search_text ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO product_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+]
+
+event.listen(
+    Product.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+for _ddl in PRODUCT_FTS_DDL:
+    event.listen(Product.__table__, "after_create", DDL(_ddl).execute_if(dialect="sqlite"))
+
+
 class Stock(db.Model):
     id         = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
@@ -58,7 +93,11 @@ class Stock(db.Model):
     note       = db.Column(db.Text, nullable=True)
 
     # TOTO JE KLÍČOVÝ ŘÁDEK, KTERÝ PŘIDÁVÁ POJISTKU PROTI DUPLICITÁM
-    __table_args__ = (db.UniqueConstraint('product_id', 'sklad', 'size', name='_product_sklad_size_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'sklad', 'size', name='_product_sklad_size_uc'),
+        # načtení celého skladu (dashboard, exporty, inventura) jen z indexu
+        db.Index("ix_stock_sklad_product_size", "sklad", "product_id", "size", "quantity"),
+    )
 
     # vztah na Product, potlačí SAWarning ohledně "product_vztah"
     product = db.relationship(
@@ -69,6 +108,15 @@ class Stock(db.Model):
 
 
 class History(db.Model):
+    # indexy pro filtry v historie() a okno prodejů v distribuce()
+    __table_args__ = (
+        db.Index("ix_history_timestamp_id", "timestamp", "id"),
+        db.Index("ix_history_user_timestamp", "user", "timestamp"),
+        db.Index("ix_history_sklad_timestamp", "sklad", "timestamp"),
+        db.Index("ix_history_product_timestamp", "product_id", "timestamp"),
+        db.Index("ix_history_outbound", "timestamp", "change_type", "product_id", "size", "sklad", "amount"),
+    )
+
     id          = db.Column(db.Integer, primary_key=True)
     user        = db.Column(db.String(50))
     sklad       = db.Column(db.String(50))
@@ -81,6 +129,13 @@ class History(db.Model):
 
 
 class Sales(db.Model):
+    # seznam let pro výběr v přehledech (SELECT DISTINCT year);
+    # jeden řádek na uživatele a měsíc – zápis je UPSERT (viz app/reports.py)
+    __table_args__ = (
+        db.Index("ix_sales_year", "year"),
+        db.Index("ux_sales_user_year_month", "user", "year", "month", unique=True),
+    )
+
     id     = db.Column(db.Integer, primary_key=True)
     user   = db.Column(db.String(64), nullable=False)
     year   = db.Column(db.Integer, nullable=False)
@@ -90,6 +145,11 @@ class Sales(db.Model):
 
 
 class Overtime(db.Model):
+    __table_args__ = (
+        db.Index("ix_overtime_year", "year"),
+        db.Index("ux_overtime_user_year_month", "user", "year", "month", unique=True),
+    )
+
     id      = db.Column(db.Integer, primary_key=True)
     user    = db.Column(db.String(50), nullable=False)
     year    = db.Column(db.Integer, nullable=False)
@@ -100,6 +160,10 @@ class Overtime(db.Model):
 
 class Transfer(db.Model):
     __tablename__ = "transfer"
+    # badge "na cestě" v každé šabloně a seznam přeskladnění
+    __table_args__ = (
+        db.Index("ix_transfer_status_target", "status", "target_sklad"),
+    )
 
     id            = db.Column(db.Integer, primary_key=True)
     source_sklad  = db.Column(db.String(50), nullable=False)
@@ -120,6 +184,10 @@ class Transfer(db.Model):
 
 class TransferItem(db.Model):
     __tablename__ = "transfer_item"
+    __table_args__ = (
+        db.Index("ix_transfer_item_transfer", "transfer_id"),
+        db.Index("ix_transfer_item_product", "product_id"),
+    )
 
     id          = db.Column(db.Integer, primary_key=True)
     transfer_id = db.Column(
@@ -130,3 +198,138 @@ class TransferItem(db.Model):
     product_id  = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
     size        = db.Column(db.Integer, nullable=True)
     quantity    = db.Column(db.Integer, nullable=False)
+
+
+class StockVersion(db.Model):
+    __tablename__ = "stock_version"
+
+    # verze zásob skladu – zvyšuje se po commitu každého zápisu do Stock (viz stock_cache)
+    sklad   = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UserVersion(db.Model):
+    __tablename__ = "user_version"
+
+    # verze uživatele – zvyšuje se po commitu každé změny nebo smazání
+    # uživatele; podle ní procesy poznají zastaralou kopii (viz user_cache)
+    user_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class HistoryFacet(db.Model):
+    __tablename__ = "history_facet"
+
+    # hodnoty pro roletky v historii – kind je "user" nebo "sklad"
+    kind  = db.Column(db.String(10), primary_key=True)
+    value = db.Column(db.String(64), primary_key=True)
+
+
+class StockSnapshot(db.Model):
+    __tablename__ = "stock_snapshot"
+    __table_args__ = (
+        db.Index("ix_stock_snapshot_taken_sklad", "taken_at", "sklad"),
+    )
+
+    # periodický snímek Stock – základ pro dotazy na stav k datu (viz ledger)
+    id         = db.Column(db.Integer, primary_key=True)
+    taken_at   = db.Column(db.DateTime, nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    sklad      = db.Column(db.String(50), nullable=False)
+    size       = db.Column(db.Integer, nullable=True)
+    quantity   = db.Column(db.Integer, nullable=False)
+
+
+class OutboundDaily(db.Model):
+    __tablename__ = "outbound_daily"
+
+    # denní souhrn výdejů po SKU a skladu (viz app/sales_rollup.py)
+    den        = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    size       = db.Column(db.Integer, primary_key=True)
+    sklad      = db.Column(db.String(50), primary_key=True)
+    vydej      = db.Column(db.Integer, nullable=False, default=0)   # prodej (vyskladnění)
+    presun     = db.Column(db.Integer, nullable=False, default=0)   # odeslané přeskladnění
+
+
+class PdfJob(db.Model):
+    __tablename__ = "pdf_job"
+    __table_args__ = (
+        db.Index("ix_pdf_job_status_created", "status", "created_at"),
+    )
+
+    # úloha generování PDF pro worker (viz app/pdf_jobs.py)
+    id          = db.Column(db.String(32), primary_key=True)      # uuid4 hex
+    kind        = db.Column(db.String(20), nullable=False)        # "inventory" / "transfer"
+    params      = db.Column(db.Text, nullable=False, default="{}")  # JSON
+    status      = db.Column(db.String(10), nullable=False, default="ceka")  # ceka / bezi / hotovo / chyba
+    created_by  = db.Column(db.String(50), nullable=False)
+    created_at  = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    started_at  = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    worker      = db.Column(db.String(64), nullable=True)
+    filename    = db.Column(db.String(120), nullable=True)        # název pro stažení
+    size_bytes  = db.Column(db.Integer, nullable=True)
+    build_ms    = db.Column(db.Integer, nullable=True)            # data + šablona
+    render_ms   = db.Column(db.Integer, nullable=True)            # WeasyPrint
+    error       = db.Column(db.Text, nullable=True)
+
+    @property
+    def queue_ms(self):
+        if not self.started_at:
+            return None
+        return int((self.started_at - self.created_at).total_seconds() * 1000)
+
+
+class TransferCounter(db.Model):
+    __tablename__ = "transfer_counter"
+
+    # počet přeskladnění "v_tranzitu" podle cílového skladu – badge v menu
+    # (udržuje app/transfers.py ve stejné transakci jako změnu statusu)
+    target_sklad = db.Column(db.String(50), primary_key=True)
+    in_transit   = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Draft(db.Model):
+    __tablename__ = "draft"
+    __table_args__ = (
+        db.UniqueConstraint("user", "kind", name="_draft_user_kind_uc"),
+        db.Index("ix_draft_expires", "expires_at"),
+    )
+
+    # rozpracovaný košík / inventura uživatele (viz app/drafts.py)
+    id         = db.Column(db.Integer, primary_key=True)
+    user       = db.Column(db.String(64), nullable=False)
+    kind       = db.Column(db.String(40), nullable=False)     # "kosik", "inventura:<sklad>"
+    data       = db.Column(db.Text, nullable=False)           # JSON
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class InventuraBatch(db.Model):
+    __tablename__ = "inventura_batch"
+    __table_args__ = (
+        db.Index("ix_inventura_batch_sklad_created", "sklad", "created_at"),
+    )
+
+    # jedna potvrzená inventura skladu (viz app/inventura.py); její pohyby
+    # v History mají poznámku "Inventura č. <id>"
+    id         = db.Column(db.Integer, primary_key=True)
+    sklad      = db.Column(db.String(50), nullable=False)
+    user       = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    cells      = db.Column(db.Integer, nullable=False, default=0)   # spočítané buňky
+    changes    = db.Column(db.Integer, nullable=False, default=0)   # buňky s rozdílem
+    delta_sum  = db.Column(db.Integer, nullable=False, default=0)   # součet rozdílů v kusech
+
+
+class ReportCache(db.Model):
+    __tablename__ = "report_cache"
+
+    # zmrazené měsíční součty uzavřeného roku (plní `manage.py report-cache
+    # --build`, viz app/reports.py);
+    # smaže se jen při zápisu prodejů/přesčasů do daného roku
+    modul       = db.Column(db.String(20), primary_key=True)   # "prodeje" / "prescasy"
+    rok         = db.Column(db.Integer, primary_key=True)
+    data        = db.Column(db.Text, nullable=False)           # JSON
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
@@ -0,0 +1,161 @@
+# app/pdf_cache.py
+#
+# Diskový cache hotových PDF.
+#
+# Klíč je otisk (sha256) všeho, na čem obsah dokumentu závisí:
+#   - přeskladnění: id + status (potvrzené přeskladnění se už nemění),
+#   - inventura: sklad + verze zásob skladu (stock_version, viz stock_cache).
+# K tomu se přidá čas poslední úpravy šablony a jejího stylu, takže
+# jejich úprava staré soubory sama zneplatní. Opakované stažení stejného
+# dokumentu je pak jen čtení souboru místo běhu WeasyPrintu.
+#
+# Velikost adresáře hlídá LRU podle mtime (při zásahu se soubor "dotkne")
+# s limitem PDF_CACHE_MAX_MB. Zápis do Stock zvyšuje verzi skladu, po
+# commitu se navíc staré inventury skladu rovnou smažou (drop_inventory).
+
+import glob
+import hashlib
+import os
+import threading
+
+from flask import current_app, has_app_context
+
+from app import db
+from app.models import StockVersion
+from app.pdf_exports import TEMPLATES
+
+# zvýšit při změně tvaru dat předávaných do šablon
+FORMAT = 1
+
+
+class PdfCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _dir(self):
+        path = current_app.config["PDF_CACHE_DIR"]
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _count(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def key(self, kind, scope, *parts):
+        """Název souboru: <druh>_<sklad|id>_<otisk>.pdf (prefix kvůli drop)."""
+        stamp = _template_stamp(kind)
+        raw = "|".join(str(p) for p in (FORMAT, kind, scope, stamp) + parts)
+        digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+        return f"{kind}_{scope}_{digest}.pdf"
+
+    def read(self, key):
+        """Vrací bajty PDF, nebo None."""
+        path = os.path.join(self._dir(), key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)   # LRU – naposledy použitý
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return data
+
+    def put(self, key, data):
+        path = os.path.join(self._dir(), key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._count("stores")
+        self._evict()
+
+    def _evict(self):
+        limit = current_app.config["PDF_CACHE_MAX_MB"] * 1024 * 1024
+        files = []
+        for path in glob.glob(os.path.join(self._dir(), "*.pdf")):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+                self._count("evictions")
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def drop(self, kind, scope):
+        for path in glob.glob(os.path.join(self._dir(), f"{kind}_{scope}_*.pdf")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self._dir(), "*.pdf")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        files = glob.glob(os.path.join(self._dir(), "*.pdf"))
+        size = 0
+        for path in files:
+            try:
+                size += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            return {
+                "hits": self.hits, "misses": self.misses,
+                "stores": self.stores, "evictions": self.evictions,
+                "files": len(files), "bytes": size,
+                "limit_bytes": current_app.config["PDF_CACHE_MAX_MB"] * 1024 * 1024,
+            }
+
+
+def _template_stamp(kind):
+    """Čas úpravy šablony a jejího stylu (static/pdf/<šablona>.css)."""
+    name = TEMPLATES.get(kind)
+    if not name:
+        return 0
+    stamp = []
+    for path in (
+        os.path.join(current_app.template_folder, name),
+        os.path.join(current_app.root_path, "..", "static", "pdf", name.replace(".html", ".css")),
+    ):
+        try:
+            stamp.append(int(os.path.getmtime(path)))
+        except OSError:
+            stamp.append(0)
+    return "-".join(str(t) for t in stamp)
+
+
+pdf_cache = PdfCache()
+
+
+def inventory_key(sklad):
+    version = db.session.query(StockVersion.version).filter_by(sklad=sklad).scalar() or 0
+    return pdf_cache.key("inventory", sklad, version)
+
+
+def transfer_key(transfer):
+    return pdf_cache.key("transfer", transfer.id, transfer.status)
+
+
+def drop_inventory(sklad):
+    """Smaže uložené inventury skladu (volá stock_cache po commitu zápisu)."""
+    if has_app_context():
+        pdf_cache.drop("inventory", sklad)
@@ -0,0 +1,54 @@
+# app/pdf_exports.py
+#
+# Sestavení PDF dokumentů (inventura skladu, dodací list přeskladnění).
+#
+# Funkce vrací HTML a nezávisí na request – volá je worker
+# (app/pdf_jobs.py), který běží mimo webové procesy; PDF z něj vyrobí
+# app/pdf_renderer.py. Oprávnění se ověřují v routách ještě před
+# zařazením úlohy do fronty.
+
+from flask import render_template
+
+from app.models import Product, Transfer, TransferItem
+from app.warehouse_snapshot import UNIVERSAL_SIZE, load_snapshot
+
+# šablona dokumentu podle typu úlohy (styly k ní viz app/pdf_renderer.py)
+TEMPLATES = {
+    "inventory": "export_inventory.html",
+    "transfer": "export_transfer.html",
+}
+
+
+def inventory_html(sklad):
+    snapshot = load_snapshot(sklad)
+    products_by_category = {}
+    for kat, rows in snapshot.by_category.items():
+        if kat in ["doplnky", "ostatni"]:
+            products_by_category[kat] = [
+                {"name": r.name, "color": r.color, "quantity": r.qtys.get(UNIVERSAL_SIZE, 0)}
+                for r in rows
+            ]
+        else:
+            products_by_category[kat] = [
+                {"name": r.name, "color": r.color, "sizes": r.qtys, "back_solution": r.back_solution}
+                for r in rows
+            ]
+
+    return render_template(
+        TEMPLATES["inventory"], sklad=sklad, velikosti=snapshot.velikosti,
+        products_by_category=products_by_category
+    )
+
+
+def transfer_html(transfer_id):
+    transfer = Transfer.query.get(transfer_id)
+    polozky = TransferItem.query.filter_by(transfer_id=transfer_id).all()
+    produkty = {p.id: p for p in Product.query.filter(Product.id.in_({pol.product_id for pol in polozky}))}
+    podrobnosti = []
+    for pol in polozky:
+        prod = produkty[pol.product_id]
+        label = f"{prod.name}-{prod.color or '-'}-{prod.back_solution or '-'}"
+        size_display = "-" if prod.category in ["doplnky", "ostatni"] else (pol.size or "-")
+        podrobnosti.append({"label": label, "size": size_display, "quantity": pol.quantity})
+
+    return render_template(TEMPLATES["transfer"], transfer=transfer, polozky=podrobnosti)
@@ -0,0 +1,252 @@
+# app/pdf_jobs.py
+#
+# Fronta úloh pro generování PDF.
+#
+# WeasyPrint u inventury celého katalogu běží několik sekund a dřív tak
+# dlouho blokoval webový worker. Routy teď jen založí řádek v tabulce
+# pdf_job a přesměrují na stránku úlohy, která se dotazuje na stav;
+# samotné PDF vyrobí samostatný proces `python manage.py worker`.
+#
+# Fronta je obyčejná tabulka ve stejné databázi. Úlohu si worker
+# "zabere" podmíněným UPDATE (status = 'ceka' -> 'bezi'), takže ani při
+# více workerech se jedna úloha nezpracuje dvakrát. Hotové PDF leží
+# v PDF_JOB_DIR pod id úlohy; u úlohy se ukládají časy (čekání ve frontě,
+# sestavení HTML, WeasyPrint) a velikost souboru. Hotová PDF se ukládají
+# i do cache (app/pdf_cache.py); na zásah v cache se úloha vůbec nezakládá.
+#
+# Bez worker procesu (PDF_JOBS_INLINE, výchozí) se úloha zpracuje rovnou
+# v požadavku, který ji založil. Úlohu, kterou do PDF_JOB_QUEUE_TIMEOUT
+# nezačal žádný worker, stránka úlohy ukončí chybou (expire_waiting).
+
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models import PdfJob, Transfer
+from app.pdf_cache import inventory_key, pdf_cache, transfer_key
+from app.pdf_exports import TEMPLATES, inventory_html, transfer_html
+from app.pdf_renderer import render_pdf
+
+CEKA, BEZI, HOTOVO, CHYBA = "ceka", "bezi", "hotovo", "chyba"
+
+# úloha v "bezi" déle než tohle je po pádu workeru – vrátí se do fronty
+STALE_AFTER = timedelta(minutes=10)
+
+
+def _inventory(params):
+    sklad = params["sklad"]
+    # klíč se čte před daty – případný souběžný zápis zvýší verzi a
+    # výsledek se uloží pod starý (už nepoužívaný) klíč
+    key = inventory_key(sklad)
+    return key, lambda: inventory_html(sklad), f"inventura_{sklad}.pdf"
+
+
+def _transfer(params):
+    transfer_id = int(params["transfer_id"])
+    transfer = Transfer.query.get(transfer_id)
+    if transfer is None:
+        raise ValueError(f"Přeskladnění #{transfer_id} neexistuje.")
+    return transfer_key(transfer), lambda: transfer_html(transfer_id), f"preskladneni_{transfer_id}.pdf"
+
+
+HANDLERS = {
+    "inventory": _inventory,
+    "transfer": _transfer,
+}
+
+
+def job_dir():
+    path = current_app.config["PDF_JOB_DIR"]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def job_path(job):
+    return os.path.join(job_dir(), f"{job.id}.pdf")
+
+
+def worker_name(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def cached_pdf(kind, params):
+    """Hotové PDF z cache jako (bajty, název_souboru), jinak None."""
+    key, _, filename = HANDLERS[kind](params)
+    data = pdf_cache.read(key)
+    return (data, filename) if data is not None else None
+
+
+def enqueue(kind, params, user):
+    """Zařadí úlohu do fronty a potvrdí ji (commit). Vrací PdfJob."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Neznámý typ úlohy: {kind}")
+
+    job = PdfJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        params=json.dumps(params),
+        status=CEKA,
+        created_by=user,
+        created_at=datetime.now(),
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    if current_app.config.get("PDF_JOBS_INLINE"):
+        if claim(job.id, "inline"):
+            run_job(job.id)
+    return job
+
+
+def claim(job_id, worker):
+    """Podmíněně přepne úlohu z 'ceka' na 'bezi'. True, pokud ji získal tento worker."""
+    updated = (
+        PdfJob.query
+        .filter(PdfJob.id == job_id, PdfJob.status == CEKA)
+        .update(
+            {"status": BEZI, "worker": worker, "started_at": datetime.now()},
+            synchronize_session=False
+        )
+    )
+    db.session.commit()
+    return updated == 1
+
+
+def claim_next(worker):
+    """Zabere nejstarší čekající úlohu. Vrací její id, nebo None."""
+    kandidati = (
+        db.session.query(PdfJob.id)
+        .filter(PdfJob.status == CEKA)
+        .order_by(PdfJob.created_at, PdfJob.id)
+        .limit(5)
+        .all()
+    )
+    db.session.rollback()   # ukončí čtecí transakci, ať další dotaz vidí čerstvá data
+    for (job_id,) in kandidati:
+        if claim(job_id, worker):
+            return job_id
+    return None
+
+
+def run_job(job_id):
+    """Vygeneruje PDF zabrané úlohy a uloží výsledek. Vrací PdfJob."""
+    job = db.session.get(PdfJob, job_id)
+    try:
+        t0 = time.perf_counter()
+        key, build, filename = HANDLERS[job.kind](json.loads(job.params or "{}"))
+        pdf = pdf_cache.read(key)
+        if pdf is None:
+            html = build()
+            t1 = time.perf_counter()
+            pdf = render_pdf(html, TEMPLATES[job.kind])
+            t2 = time.perf_counter()
+            pdf_cache.put(key, pdf)
+        else:
+            # stejný dokument mezitím vyrobila jiná úloha
+            t1 = t2 = time.perf_counter()
+
+        path = job_path(job)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp, path)
+
+        job.status = HOTOVO
+        job.filename = filename
+        job.size_bytes = len(pdf)
+        job.build_ms = int((t1 - t0) * 1000)
+        job.render_ms = int((t2 - t1) * 1000)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(PdfJob, job_id)
+        job.status = CHYBA
+        job.error = str(e)[:1000] or e.__class__.__name__
+    job.finished_at = datetime.now()
+    db.session.commit()
+    return job
+
+
+def expire_waiting(job):
+    """
+    Čekající úlohu, kterou do PDF_JOB_QUEUE_TIMEOUT sekund nikdo nezabral,
+    podmíněně přepne na 'chyba' (worker neběží). Vrací aktuální PdfJob.
+    """
+    limit = datetime.now() - timedelta(seconds=current_app.config["PDF_JOB_QUEUE_TIMEOUT"])
+    if job.status != CEKA or job.created_at >= limit:
+        return job
+    updated = (
+        PdfJob.query
+        .filter(PdfJob.id == job.id, PdfJob.status == CEKA)
+        .update(
+            {
+                "status": CHYBA, "finished_at": datetime.now(),
+                "error": "Úlohu nezačal zpracovávat žádný worker (python manage.py worker).",
+            },
+            synchronize_session=False
+        )
+    )
+    db.session.commit()
+    if updated:
+        db.session.refresh(job)
+    return job
+
+
+def requeue_stale():
+    """Vrátí do fronty úlohy, které zůstaly viset ve stavu 'bezi'."""
+    count = (
+        PdfJob.query
+        .filter(PdfJob.status == BEZI, PdfJob.started_at < datetime.now() - STALE_AFTER)
+        .update({"status": CEKA, "worker": None, "started_at": None}, synchronize_session=False)
+    )
+    db.session.commit()
+    return count
+
+
+def purge_old(max_age=None):
+    """Smaže dokončené úlohy (a jejich soubory) starší než max_age."""
+    max_age = max_age or timedelta(hours=current_app.config["PDF_JOB_MAX_AGE_HOURS"])
+    stare = (
+        PdfJob.query
+        .filter(PdfJob.status.in_([HOTOVO, CHYBA]), PdfJob.created_at < datetime.now() - max_age)
+        .all()
+    )
+    for job in stare:
+        try:
+            os.remove(job_path(job))
+        except FileNotFoundError:
+            pass
+        db.session.delete(job)
+    db.session.commit()
+    return len(stare)
+
+
+def work(worker, poll=1.0, once=False, on_job=None):
+    """
+    Smyčka workeru: zabírá a zpracovává úlohy, dokud neskončí (once=True
+    skončí při prázdné frontě). on_job(job) se volá po každé úloze.
+    Musí běžet uvnitř request kontextu (šablony používají context processory).
+    """
+    posledni_uklid = 0.0
+    while True:
+        if time.monotonic() - posledni_uklid > 600:
+            requeue_stale()
+            purge_old()
+            posledni_uklid = time.monotonic()
+
+        job_id = claim_next(worker)
+        if job_id is None:
+            if once:
+                return
+            time.sleep(poll)
+            continue
+
+        job = run_job(job_id)
+        if on_job:
+            on_job(job)
+        db.session.remove()
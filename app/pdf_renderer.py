@@ -0,0 +1,96 @@
+# app/pdf_renderer.py
+#
+# Předehřátý renderer WeasyPrintu – jeden na proces.
+#
+# Dřív každé HTML(string=html, base_url=request.host_url).write_pdf()
+# znovu parsovalo styly, znovu načítalo fontconfig a odkazy na obrázky
+# či styly mohlo stahovat HTTP požadavkem zpátky na vlastní server.
+# PdfRenderer drží:
+#   - FontConfiguration načtenou jednou,
+#   - předparsované CSS ze static/pdf/<šablona>.css (export_inventory.css …),
+#   - cache obrázků sdílenou mezi dokumenty,
+#   - url_fetcher, který statické soubory čte z disku a nic jiného nestahuje.
+# Worker (`python manage.py worker`) renderer zahřeje hned při startu.
+
+import mimetypes
+import os
+import threading
+from urllib.parse import unquote, urlparse
+
+from weasyprint import CSS, HTML, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
+
+STATIC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "static"))
+PDF_CSS_DIR = os.path.join(STATIC_DIR, "pdf")
+BASE_URL = f"file://{STATIC_DIR}/"
+
+
+def static_url_fetcher(url, timeout=10, ssl_context=None):
+    """Statické soubory z disku (file:// i /static/… na libovolném hostu), data: URI."""
+    parsed = urlparse(url)
+    if parsed.scheme == "data":
+        return default_url_fetcher(url, timeout, ssl_context)
+
+    path = unquote(parsed.path)
+    if parsed.scheme in ("http", "https", "file") and path.startswith("/static/"):
+        path = os.path.join(STATIC_DIR, path[len("/static/"):])
+    elif parsed.scheme != "file":
+        raise ValueError(f"Externí zdroj se do PDF nestahuje: {url}")
+
+    real = os.path.realpath(path)
+    if not real.startswith(STATIC_DIR + os.sep):
+        raise ValueError(f"Soubor mimo static/: {url}")
+    return {
+        "file_obj": open(real, "rb"),
+        "mime_type": mimetypes.guess_type(real)[0],
+        "redirected_url": f"file://{real}",
+    }
+
+
+class PdfRenderer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.font_config = FontConfiguration()
+        self.image_cache = {}
+        self.stylesheets = {}
+        if os.path.isdir(PDF_CSS_DIR):
+            for name in sorted(os.listdir(PDF_CSS_DIR)):
+                if name.endswith(".css"):
+                    self.stylesheets[f"{name[:-4]}.html"] = [CSS(
+                        filename=os.path.join(PDF_CSS_DIR, name),
+                        url_fetcher=static_url_fetcher,
+                        font_config=self.font_config,
+                    )]
+
+    def render(self, html, template=None):
+        """HTML -> bajty PDF se styly šablony `template` (např. export_inventory.html)."""
+        with self._lock:
+            return HTML(
+                string=html, base_url=BASE_URL, url_fetcher=static_url_fetcher
+            ).write_pdf(
+                stylesheets=self.stylesheets.get(template, []),
+                font_config=self.font_config,
+                cache=self.image_cache,
+            )
+
+    def warm_up(self):
+        """První layout načte fonty a Pango; pak už běží jen vlastní dokumenty."""
+        for template in self.stylesheets or [None]:
+            self.render("<html><body><table><tr><th>Á</th><td>1</td></tr></table></body></html>", template)
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = PdfRenderer()
+    return _renderer
+
+
+def render_pdf(html, template=None):
+    return get_renderer().render(html, template)
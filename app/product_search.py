@@ -0,0 +1,134 @@
+# app/product_search.py
+#
+# Vyhledávání v katalogu produktů (přehled, historie, výběr produktu).
+#
+# Dřív se hledalo Product.name ILIKE '%x%': bez indexu, jen v názvu a s
+# diakritikou ("cerne" nenašlo "černé"). Teď má produkt sloupec search_text
+# – název, barva a řešení zad malými písmeny bez diakritiky. Nastavuje ho
+# before_flush při vložení i úpravě produktu.
+#
+# Hledaný text se normalizuje stejně a rozdělí na slova; produkt musí
+# obsahovat všechna, kdekoli (i uprostřed slova). Nad search_text je index:
+#   - PostgreSQL: GIN trigramový index (pg_trgm), který LIKE '%x%' použije,
+#   - SQLite: FTS5 tabulka product_fts s tokenizerem trigram (triggery viz
+#     models.PRODUCT_FTS_DDL). Slova kratší než 3 znaky trigramy neumí,
+#     ta se dohledají LIKE nad výsledkem z indexu.
+#
+# Výběry produktu ve formulářích (naskladnit, vyskladnit, přeskladnit) si
+# katalog tahají po stránkách přes search_page – HTML stránky tak nezávisí
+# na velikosti katalogu. Výchozí jsou jen produkty, které zvolený sklad má.
+
+import unicodedata
+
+from sqlalchemy import and_, column, event, func, literal_column, select, table, text
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Product, Stock
+
+FTS_TABLE = "product_fts"
+# nejkratší slovo, které umí trigramový index
+MIN_FTS_LEN = 3
+
+
+def normalize(value):
+    """Malá písmena bez diakritiky a bez nadbytečných mezer."""
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(value.lower().split())
+
+
+def search_text_for(product):
+    return normalize(" ".join(
+        part for part in (product.name, product.color, product.back_solution) if part
+    ))
+
+
+def _like(word):
+    escaped = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return Product.search_text.like(f"%{escaped}%", escape="\\")
+
+
+def _fts_match(words):
+    phrase = " ".join('"' + w.replace('"', '""') + '"' for w in words)
+    # parametr bez pevného jména, aby šlo víc podmínek spojit přes OR
+    return Product.id.in_(
+        select(column("rowid")).select_from(table(FTS_TABLE))
+        .where(literal_column(FTS_TABLE).op("MATCH")(phrase))
+    )
+
+
+def search_condition(query):
+    """
+    Podmínka nad Product pro hledaný text, nebo None pro prázdný dotaz.
+    Všechna slova dotazu musí být v názvu, barvě nebo řešení zad.
+    """
+    words = normalize(query).split()
+    if not words:
+        return None
+    if db.engine.dialect.name == "sqlite":
+        long_words = [w for w in words if len(w) >= MIN_FTS_LEN]
+        conditions = [_like(w) for w in words if len(w) < MIN_FTS_LEN]
+        if long_words:
+            conditions.insert(0, _fts_match(long_words))
+    else:
+        conditions = [_like(w) for w in words]
+    return and_(*conditions)
+
+
+def search_page(query, kategorie=None, sklad=None, skladem=False, strana=1, na_stranu=20):
+    """
+    Jedna stránka výběru produktu seřazená podle názvu: (produkty, zasoby, dalsi).
+    zasoby = {product_id: kusů na skladě `sklad`} jen pro produkty stránky;
+    se skladem=True jen produkty, které na skladě `sklad` něco mají.
+    """
+    q = Product.query
+    condition = search_condition(query)
+    if condition is not None:
+        q = q.filter(condition)
+    if kategorie:
+        q = q.filter(Product.category == kategorie)
+    if sklad and skladem:
+        q = q.filter(Product.id.in_(
+            select(Stock.product_id)
+            .where(Stock.sklad == sklad, Stock.size.isnot(None), Stock.quantity > 0)
+        ))
+    produkty = (
+        q.order_by(Product.name, Product.id)
+        .offset((strana - 1) * na_stranu).limit(na_stranu + 1)
+        .all()
+    )
+    dalsi = len(produkty) > na_stranu
+    produkty = produkty[:na_stranu]
+
+    zasoby = {}
+    if sklad and produkty:
+        zasoby = dict(
+            db.session.query(Stock.product_id, func.coalesce(func.sum(Stock.quantity), 0))
+            .filter(
+                Stock.sklad == sklad, Stock.size.isnot(None),
+                Stock.product_id.in_([p.id for p in produkty])
+            )
+            .group_by(Stock.product_id)
+        )
+    return produkty, zasoby, dalsi
+
+
+def reindex():
+    """Přepočítá search_text všech produktů a znovu sestaví index. Vrací počet."""
+    products = Product.query.all()
+    for p in products:
+        p.search_text = search_text_for(p)
+    db.session.flush()
+    if db.engine.dialect.name == "sqlite":
+        db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return len(products)
+
+
+@event.listens_for(Session, "before_flush")
+def _update_search_text(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Product):
+            value = search_text_for(obj)
+            if obj.search_text != value:
+                obj.search_text = value
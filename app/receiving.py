@@ -0,0 +1,218 @@
+# app/receiving.py
+#
+# Hromadný příjem zboží (dodávka od dodavatele).
+#
+# Řádky přijdou buď ze souboru (CSV se středníkem jako náš export, nebo
+# XLSX), nebo z víceřádkového formuláře. Validují se proti Product – načtou
+# se jen produkty, na které řádky odkazují (id, nebo kandidáti na název
+# z indexu vyhledávání) – a dobré řádky se zapíšou přes
+# ledger.post_movements: jeden UPSERT do Stock, jeden hromadný INSERT do
+# History. Commit je na volajícím.
+
+import csv
+import io
+from datetime import datetime
+
+from sqlalchemy import or_
+
+from app.ledger import post_movements
+from app.models import Product
+from app.product_search import normalize, search_condition
+from app.warehouse_snapshot import UNIVERSAL_SIZE, VELIKOSTI
+
+# kolik názvů produktů se dohledává jedním dotazem
+LABEL_CHUNK = 50
+
+# názvy sloupců v souboru (bez diakritiky, malými písmeny)
+_SLOUPCE = {
+    "produkt_id": "product_id", "id": "product_id",
+    "produkt": "produkt", "nazev": "produkt",
+    "velikost": "velikost", "vel": "velikost",
+    "pocet": "pocet", "mnozstvi": "pocet", "ks": "pocet",
+}
+
+
+class DeliveryFileError(ValueError):
+    pass
+
+
+def _rows_to_lines(rows):
+    rows = iter(rows)
+    try:
+        header = next(rows)
+    except StopIteration:
+        raise DeliveryFileError("Soubor je prázdný.")
+
+    mapping = {}
+    for i, name in enumerate(header):
+        key = _SLOUPCE.get(normalize(str(name or "")))
+        if key:
+            mapping[key] = i
+    if "pocet" not in mapping or not ({"product_id", "produkt"} & set(mapping)):
+        raise DeliveryFileError("Soubor musí mít sloupce 'produkt' (nebo 'produkt_id') a 'počet'.")
+
+    lines = []
+    for radek, row in enumerate(rows, start=2):
+        values = {k: (row[i] if i < len(row) else None) for k, i in mapping.items()}
+        if all(v in (None, "") for v in values.values()):
+            continue
+        values["radek"] = radek
+        lines.append(values)
+    return lines
+
+
+def parse_delivery_file(storage):
+    """Načte řádky dodávky z nahraného souboru (werkzeug FileStorage)."""
+    filename = (storage.filename or "").lower()
+    data = storage.read()
+
+    if filename.endswith(".xlsx"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise DeliveryFileError("Import XLSX vyžaduje balíček openpyxl.")
+        wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        return _rows_to_lines(wb.active.iter_rows(values_only=True))
+
+    if filename.endswith(".csv") or filename.endswith(".txt"):
+        try:
+            text = data.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            text = data.decode("cp1250")   # CSV uložené z českého Excelu
+        first = text.split("\n", 1)[0]
+        delimiter = ";" if first.count(";") >= first.count(",") else ","
+        return _rows_to_lines(csv.reader(io.StringIO(text), delimiter=delimiter))
+
+    raise DeliveryFileError("Podporované formáty jsou CSV a XLSX.")
+
+
+def parse_delivery_form(form):
+    """Řádky z víceřádkového formuláře (radek_produkt / radek_velikost / radek_pocet)."""
+    lines = []
+    produkty = form.getlist("radek_produkt")
+    velikosti = form.getlist("radek_velikost")
+    pocty = form.getlist("radek_pocet")
+    for i, (pid, size, qty) in enumerate(zip(produkty, velikosti, pocty), start=1):
+        if not pid or not str(qty).strip():
+            continue
+        lines.append({"radek": i, "product_id": pid, "velikost": size, "pocet": qty})
+    return lines
+
+
+def _to_int(val):
+    if isinstance(val, float) and val.is_integer():
+        return int(val)
+    return int(str(val).strip())
+
+
+def _products_by_id(lines):
+    ids = set()
+    for line in lines:
+        if line.get("product_id") not in (None, ""):
+            try:
+                ids.add(_to_int(line["product_id"]))
+            except ValueError:
+                pass
+    if not ids:
+        return {}
+    return {p.id: p for p in Product.query.filter(Product.id.in_(ids))}
+
+
+def _products_by_label(lines):
+    """
+    {název bez diakritiky: [produkty]} jen pro názvy (variant_label)
+    z řádků. Kandidáty najde index vyhledávání, název se pak porovná přesně.
+    """
+    labels = {
+        normalize(str(line["produkt"])) for line in lines
+        if line.get("product_id") in (None, "") and line.get("produkt")
+    }
+    labels = sorted(label for label in labels if label)
+    by_label = {}
+    for i in range(0, len(labels), LABEL_CHUNK):
+        chunk = labels[i:i + LABEL_CHUNK]
+        conditions = [search_condition(label.replace("-", " ")) for label in chunk]
+        conditions = [c for c in conditions if c is not None]
+        if not conditions:
+            continue
+        for p in Product.query.filter(or_(*conditions)):
+            key = normalize(p.variant_label)
+            if key in chunk:
+                by_label.setdefault(key, []).append(p)
+    return by_label
+
+
+def validate_lines(lines):
+    """
+    Ověří řádky proti katalogu (jen produkty, na které řádky odkazují).
+    Vrací (dobré_řádky, výsledky) – výsledky obsahují i chyby po řádcích.
+    """
+    by_id = _products_by_id(lines)
+    by_label = _products_by_label(lines)
+
+    good, vysledky = [], []
+    for line in lines:
+        res = {"radek": line["radek"], "produkt": "-", "velikost": "-", "pocet": line.get("pocet"), "chyba": None}
+        vysledky.append(res)
+
+        prod = None
+        if line.get("product_id") not in (None, ""):
+            try:
+                prod = by_id.get(_to_int(line["product_id"]))
+            except ValueError:
+                prod = None
+        elif line.get("produkt"):
+            shody = by_label.get(normalize(str(line["produkt"])), [])
+            if len(shody) > 1:
+                res["chyba"] = f"Název odpovídá {len(shody)} produktům – uveďte produkt_id."
+                continue
+            prod = shody[0] if shody else None
+        if not prod:
+            res["chyba"] = "Neznámý produkt."
+            continue
+        res["produkt"] = prod.variant_label
+
+        try:
+            qty = _to_int(line.get("pocet"))
+            if qty <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            res["chyba"] = "Neplatný počet kusů."
+            continue
+
+        if prod.category in ["doplnky", "ostatni"]:
+            size = UNIVERSAL_SIZE
+        else:
+            try:
+                size = _to_int(line.get("velikost"))
+            except (TypeError, ValueError):
+                size = None
+            if size not in VELIKOSTI[prod.category]:
+                res["chyba"] = f"Neplatná velikost '{line.get('velikost') or ''}'."
+                continue
+            res["velikost"] = size
+
+        res["pocet"] = qty
+        good.append({"product_id": prod.id, "size": size, "qty": qty})
+    return good, vysledky
+
+
+def receive_delivery(lines, sklad, user, atomic=False):
+    """
+    Naskladní dodávku. V atomickém režimu se při jakékoli chybě nezapíše
+    nic, jinak se zapíšou dobré řádky a chyby se jen nahlásí.
+    Vrací (počet_naskladněných_řádků, výsledky). Commit je na volajícím.
+    """
+    good, vysledky = validate_lines(lines)
+    if not good or (atomic and any(r["chyba"] for r in vysledky)):
+        return 0, vysledky
+
+    now = datetime.now()
+    post_movements([
+        {
+            "user": user, "sklad": sklad, "product_id": g["product_id"], "size": g["size"],
+            "amount": g["qty"], "change_type": "naskladneni", "timestamp": now,
+        }
+        for g in good
+    ])
+    return len(good), vysledky
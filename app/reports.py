@@ -0,0 +1,224 @@
+# app/reports.py
+#
+# Souhrny prodejů (Sales) a přesčasů (Overtime) po uživatelích.
+#
+# Přehledy stojí na jednom GROUP BY dotazu: součty po (uživatel, měsíc)
+# pro zvolené roky; meziroční porovnání je z nich sečte po rocích. Výsledek
+# je Pivot, ze kterého si měsíční i roční stránka vezmou tabulku
+# {uživatel: {metrika: součet}} včetně řádku "Celkem". Dřív roční přehled
+# přesčasů dělal jeden dotaz na každého uživatele a prodeje tahaly všechny
+# řádky roku jako ORM objekty.
+#
+# Uzavřené roky (před letošním) se už nemění: jejich měsíční součty zmrazí
+# do report_cache `python manage.py report-cache --build` (freeze_closed_years)
+# a přehledy je pak jen čtou. Přehled sám nic neukládá – běží v GET a často
+# nad replikou, jejíž zpožděný výsledek by se zmrazil natrvalo; chybějící
+# rok jen spočítá. Záznam roku smaže invalidate_year(), kterou volá zápis
+# prodejů/přesčasů do daného roku. Roky pro výběr v přehledech jsou
+# SELECT DISTINCT year (index).
+#
+# Zápis měsíce (record_sales, record_overtime) je jeden příkaz INSERT …
+# ON CONFLICT (user, year, month) DO UPDATE SET tries = tries + :n – bez
+# předchozího dotazu, takže dva souběžné zápisy nevytvoří duplicitní řádek.
+
+import json
+from datetime import datetime
+
+from sqlalchemy import func
+
+from app import db
+from app.db_utils import dialect_insert
+from app.models import Overtime, ReportCache, Sales
+
+# modul -> (model, {metrika: sloupec})
+MODULY = {
+    "prodeje": (Sales, {"zkousky": Sales.tries, "prodeje": Sales.sales}),
+    "prescasy": (Overtime, {"classic": Overtime.classic, "deluxe": Overtime.deluxe}),
+}
+
+
+class Pivot:
+    """Součty metrik po (uživatel, období); období je měsíc nebo rok."""
+
+    def __init__(self, metriky):
+        self.metriky = list(metriky)
+        self.cells = {}
+        self.obdobi = set()
+
+    def add(self, user, obdobi, hodnoty):
+        self.cells[(user, obdobi)] = dict(zip(self.metriky, hodnoty))
+        self.obdobi.add(obdobi)
+
+    def _zero(self):
+        return {m: 0 for m in self.metriky}
+
+    def get(self, user, obdobi=None):
+        """Součty uživatele za období, bez období za všechna dohromady."""
+        if obdobi is not None:
+            return dict(self.cells.get((user, obdobi)) or self._zero())
+        soucet = self._zero()
+        for (u, _), hodnoty in self.cells.items():
+            if u == user:
+                for m in self.metriky:
+                    soucet[m] += hodnoty[m]
+        return soucet
+
+    def table(self, users, obdobi=None):
+        """
+        (data, uzivatele) pro šablony: data[jmeno][metrika], poslední řádek
+        "Celkem" sčítá jen zadané uživatele (jako dřív).
+        """
+        data = {jmeno: self.get(jmeno, obdobi) for jmeno in users}
+        data["Celkem"] = {m: sum(data[j][m] for j in users) for m in self.metriky}
+        return data, list(users) + ["Celkem"]
+
+
+def _aktualni_rok():
+    return datetime.now().year
+
+
+def available_years(modul):
+    """Roky se záznamy v modulu (vzestupně), vždy včetně letošního."""
+    model, _ = MODULY[modul]
+    roky = {rok for (rok,) in db.session.query(model.year).distinct()}
+    roky.add(_aktualni_rok())
+    return sorted(roky)
+
+
+def _load_cached(modul, roky):
+    if not roky:
+        return {}
+    _, metriky = MODULY[modul]
+    pivots = {}
+    for rok, data in (
+        db.session.query(ReportCache.rok, ReportCache.data)
+        .filter(ReportCache.modul == modul, ReportCache.rok.in_(roky))
+    ):
+        pivot = Pivot(metriky)
+        for user, mesic, *hodnoty in json.loads(data):
+            pivot.add(user, mesic, hodnoty)
+        pivots[rok] = pivot
+    return pivots
+
+
+def _store_cached(modul, pivots):
+    rows = [
+        {
+            "modul": modul, "rok": rok, "computed_at": datetime.now(),
+            "data": json.dumps(
+                [[user, mesic, *hodnoty.values()] for (user, mesic), hodnoty in pivot.cells.items()],
+                separators=(",", ":")
+            ),
+        }
+        for rok, pivot in pivots.items()
+    ]
+    if rows:
+        db.session.execute(dialect_insert(ReportCache).values(rows).on_conflict_do_nothing())
+
+
+def _compute(modul, roky):
+    """{rok: Pivot} jedním GROUP BY (user, year, month)."""
+    model, metriky = MODULY[modul]
+    pivots = {rok: Pivot(metriky) for rok in roky}
+    if not roky:
+        return pivots
+    rows = (
+        db.session.query(
+            model.year, model.user, model.month,
+            *[func.coalesce(func.sum(col), 0) for col in metriky.values()]
+        )
+        .filter(model.year.in_(roky))
+        .group_by(model.year, model.user, model.month)
+    )
+    for rok, user, mesic, *hodnoty in rows:
+        pivots[rok].add(user, mesic, [int(h) for h in hodnoty])
+    return pivots
+
+
+def monthly_pivots(modul, roky):
+    """
+    {rok: Pivot po (uživatel, měsíc)}. Zmrazené uzavřené roky z report_cache,
+    ostatní jedním GROUP BY (user, year, month). Nic neukládá.
+    """
+    aktualni = _aktualni_rok()
+    pivots = _load_cached(modul, [rok for rok in roky if rok < aktualni])
+    pivots.update(_compute(modul, [rok for rok in roky if rok not in pivots]))
+    return pivots
+
+
+def monthly_pivot(modul, rok):
+    """Součty po (uživatel, měsíc) za rok."""
+    return monthly_pivots(modul, [rok])[rok]
+
+
+def yearly_pivot(modul, od=None, do=None):
+    """Součty po (uživatel, rok), volitelně jen roky od–do."""
+    _, metriky = MODULY[modul]
+    roky = [
+        rok for rok in available_years(modul)
+        if (od is None or rok >= od) and (do is None or rok <= do)
+    ]
+    pivot = Pivot(metriky)
+    for rok, mesicni in monthly_pivots(modul, roky).items():
+        for user in {u for u, _ in mesicni.cells}:
+            pivot.add(user, rok, list(mesicni.get(user).values()))
+    return pivot
+
+
+def freeze_closed_years():
+    """
+    Zmrazí do report_cache uzavřené roky, které tam ještě nejsou (všechny
+    moduly). Volat nad primární databází. Vrací počet zmrazených let.
+    Commit je na volajícím.
+    """
+    aktualni = _aktualni_rok()
+    pocet = 0
+    for modul in MODULY:
+        zmrazene = {
+            rok for (rok,) in
+            db.session.query(ReportCache.rok).filter(ReportCache.modul == modul)
+        }
+        chybi = [
+            rok for rok in available_years(modul)
+            if rok < aktualni and rok not in zmrazene
+        ]
+        _store_cached(modul, _compute(modul, chybi))
+        pocet += len(chybi)
+    return pocet
+
+
+def invalidate_year(modul, rok):
+    """Zápis do roku – zmrazené součty roku se zahodí (v aktuální transakci)."""
+    ReportCache.query.filter_by(modul=modul, rok=rok).delete(synchronize_session=False)
+
+
+def _upsert_month(modul, user, rok, mesic, hodnoty):
+    model, _ = MODULY[modul]
+    stmt = dialect_insert(model).values(user=user, year=rok, month=mesic, **hodnoty)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[model.user, model.year, model.month],
+        set_={
+            col: func.coalesce(getattr(model, col), 0) + getattr(stmt.excluded, col)
+            for col in hodnoty
+        }
+    )
+    db.session.execute(stmt)
+    invalidate_year(modul, rok)
+
+
+def record_sales(user, rok, mesic, zkousky, prodeje):
+    """Přičte zkoušky a prodeje k měsíci uživatele. Commit je na volajícím."""
+    _upsert_month("prodeje", user, rok, mesic, {"tries": zkousky, "sales": prodeje})
+
+
+def record_overtime(user, rok, mesic, classic, deluxe):
+    """Přičte přesčasy k měsíci uživatele. Commit je na volajícím."""
+    _upsert_month("prescasy", user, rok, mesic, {"classic": classic, "deluxe": deluxe})
+
+
+def add_success_rate(data):
+    """Doplní prodejům sloupec "uspesnost" (prodeje / zkoušky)."""
+    for row in data.values():
+        zk, pr = row["zkousky"], row["prodeje"]
+        row["uspesnost"] = f"{(pr / zk * 100):.1f} %" if zk > 0 else "-"
+    return data
@@ -1,28 +1,57 @@
+import os
 from flask_wtf import FlaskForm
 from wtforms import SelectField, IntegerField, SubmitField
 from wtforms.validators import DataRequired, NumberRange
 from flask import (
     render_template, redirect, url_for, flash,
-    request, session, current_app, make_response, send_file
+    request, session, current_app, make_response, send_file, jsonify, abort
 )
 from flask_login import login_user, logout_user, current_user, login_required
 from app import app, db
 from app.models import (
     User, Product, Stock, History,
-    Transfer, TransferItem, Sales, Overtime
+    Transfer, TransferItem, OutboundDaily, PdfJob
 )
 from app.forms import (
     LoginForm, AddProductForm, StockForm,
     NaskladnitForm, VyskladnitForm, UserForm, InventuraForm
 )
+from app.stock_cache import (
+    stock_matrix, record_stock_change, record_product_removed, record_catalog_change
+)
+from app.history_facets import get_facets
+from app.product_search import search_condition, search_page
+from app.ledger import InsufficientStock, post_movement, stock_at
+from app.drafts import delete_draft, get_draft, inventura_kind, save_draft
+from app.inventura import CellError, cell_diffs, merge_cells, parse_cells, confirm as confirm_inventura
+from app.transfers import create_transfer, confirm_transfer, record_in_transit
+from app.allocation import build_proposal
+from app.receiving import (
+    DeliveryFileError, parse_delivery_file, parse_delivery_form, receive_delivery
+)
+from app.db_routing import pool_stats, read_replica
+from app.db_utils import commit_with_retry
+from app.reports import (
+    add_success_rate, available_years, monthly_pivot, record_overtime, record_sales, yearly_pivot
+)
+from app.exports import csv_response, inventory_rows, history_rows
+from app.pdf_jobs import (
+    cached_pdf, enqueue as enqueue_pdf, expire_waiting, job_path as pdf_job_path
+)
+from app.pdf_cache import pdf_cache
+from app.warehouse_snapshot import load_snapshot
 from datetime import datetime, timedelta
-from collections import defaultdict
-from weasyprint import HTML
 from io import BytesIO
-from sqlalchemy import func
+from sqlalchemy import func, tuple_
 
 UNIVERSAL_SIZE = 0
 
+MESICE = [
+    (1, "Leden"), (2, "Únor"), (3, "Březen"), (4, "Duben"),
+    (5, "Květen"), (6, "Červen"), (7, "Červenec"), (8, "Srpen"),
+    (9, "Září"), (10, "Říjen"), (11, "Listopad"), (12, "Prosinec")
+]
+
 def _parse_qty_form(form, zero_empty=False):
     inv = {}
     for key, val in form.items():
@@ -45,6 +74,67 @@ def _parse_qty_form(form, zero_empty=False):
         inv.setdefault(pid, {})[size] = qty
     return inv
 
+def _history_cursor(h):
+    return f"{h.timestamp.isoformat()}_{h.id}"
+
+def _parse_history_cursor(raw):
+    if not raw:
+        return None
+    try:
+        ts, hid = raw.rsplit("_", 1)
+        return (datetime.fromisoformat(ts), int(hid))
+    except ValueError:
+        return None
+
+def _history_filters(args):
+    """
+    History.query s filtry ze stránky /historie (uživatel, sklad, produkt,
+    od/do). Sdílí ji výpis i CSV export. Vrací (query, hodnoty_filtrů).
+    """
+    query = History.query
+    user_filter = args.get("user")
+    sklad_filter = args.get("sklad")
+    od_str = args.get("od")
+    do_str = args.get("do")
+    produkt_filter = args.get("produkt", "").strip()
+
+    # Filtry
+    if user_filter and user_filter != "Všichni":
+        query = query.filter_by(user=user_filter)
+    if sklad_filter and sklad_filter != "Všechny":
+        query = query.filter_by(sklad=sklad_filter)
+
+    hledani = search_condition(produkt_filter)
+    if hledani is not None:
+        query = query.filter(History.product_id.in_(
+            db.session.query(Product.id).filter(hledani)
+        ))
+
+    if od_str:
+        try:
+            od_date = datetime.strptime(od_str, "%d.%m.%Y")
+            query = query.filter(History.timestamp >= od_date)
+        except ValueError:
+            pass 
+    else:
+        dva_mesice_zpet = datetime.now() - timedelta(days=60)
+        dva_mesice_zpet = dva_mesice_zpet.replace(hour=0, minute=0, second=0, microsecond=0)
+        query = query.filter(History.timestamp >= dva_mesice_zpet)
+
+    if do_str:
+        try:
+            do_date = datetime.strptime(do_str, "%d.%m.%Y")
+            do_date = do_date.replace(hour=23, minute=59, second=59)
+            query = query.filter(History.timestamp <= do_date)
+        except ValueError:
+            pass
+
+    filtry = {
+        "user": user_filter, "sklad": sklad_filter,
+        "od": od_str, "do": do_str, "produkt": produkt_filter,
+    }
+    return query, filtry
+
 @app.route("/", methods=["GET", "POST"])
 def login():
     if current_user.is_authenticated:
@@ -67,32 +157,29 @@ def dashboard():
     hledat = request.args.get("hledat", "").strip().lower()
     active_tab = request.args.get("tab", "saty")
 
+    # název, barva i záda, bez ohledu na diakritiku (viz app/product_search.py)
     produkty_q = Product.query
-    if hledat:
-        produkty_q = produkty_q.filter(Product.name.ilike(f"%{hledat}%"))
+    hledani = search_condition(hledat)
+    if hledani is not None:
+        produkty_q = produkty_q.filter(hledani)
     produkty = produkty_q.order_by(Product.name).all()
 
     velikosti_saty = list(range(32, 56, 2))
     velikosti_boty = list(range(36, 43))
 
-    stock_rows = (
-        db.session.query(
-            Stock.product_id,
-            Stock.size,
-            func.sum(Stock.quantity).label("qty")
-        )
-        .filter(
-            (Stock.sklad == selected_sklad)
-            if selected_sklad != "Celkem"
-            else True
-        )
-        .group_by(Stock.product_id, Stock.size)
-        .having(func.sum(Stock.quantity) > 0)
-        .all()
-    )
-    qty_map = defaultdict(dict)
-    for pid, size, qty in stock_rows:
-        qty_map[pid][size] = qty
+    # matice zásob skladu z paměti (viz app/stock_cache.py)
+    matice = stock_matrix.get(selected_sklad)
+    poznamky = matice.notes
+
+    # stav k datu – dopočítá se ze snímku a deníku pohybů (viz app/ledger.py)
+    ke_dni = request.args.get("ke_dni", "").strip()
+    if ke_dni:
+        try:
+            k_datu = datetime.strptime(ke_dni, "%d.%m.%Y").replace(hour=23, minute=59, second=59)
+            matice = stock_at(selected_sklad, k_datu)
+        except ValueError:
+            flash("Neplatné datum, použijte formát dd.mm.rrrr.", "warning")
+            ke_dni = ""
 
     tabulka_saty = []
     tabulka_boty = []
@@ -105,25 +192,28 @@ def dashboard():
             "name": p.name,
             "color": p.color,
             "back_solution": p.back_solution,
-            "sizes": qty_map.get(p.id, {})
+            "sizes": matice.sizes_for(p.id)
         }
         if p.category == "saty":
             tabulka_saty.append(base)
         elif p.category == "boty":
             tabulka_boty.append(base)
         elif p.category == "doplnky":
-            base["sizes"][UNIVERSAL_SIZE] = qty_map.get(p.id, {}).get(UNIVERSAL_SIZE, 0)
+            base["sizes"][UNIVERSAL_SIZE] = base["sizes"].get(UNIVERSAL_SIZE, 0)
             tabulka_doplnky.append(base)
         elif p.category == "ostatni":
-            base["sizes"][UNIVERSAL_SIZE] = qty_map.get(p.id, {}).get(UNIVERSAL_SIZE, 0)
+            base["sizes"][UNIVERSAL_SIZE] = base["sizes"].get(UNIVERSAL_SIZE, 0)
             tabulka_ostatni.append(base)
 
-    all_stock_records = Stock.query.filter(Stock.sklad == selected_sklad).all()
-    stocks = {
-        (stock.product_id, stock.size, stock.sklad): stock
-        for stock in all_stock_records
-    }
-    
+    # poznámky k produktům (řádek Stock bez velikosti)
+    stocks = {}
+    if selected_sklad != "Celkem":
+        for p in produkty:
+            stocks[(p.id, None, selected_sklad)] = {
+                "name": p.name,
+                "note": poznamky.get((p.id, None), "")
+            }
+
     saty_grand_total = sum(sum(p['sizes'].values()) for p in tabulka_saty)
     boty_grand_total = sum(sum(p['sizes'].values()) for p in tabulka_boty)
     doplnky_grand_total = sum(p['sizes'].get(UNIVERSAL_SIZE, 0) for p in tabulka_doplnky)
@@ -134,6 +224,7 @@ def dashboard():
         sklady=sklady,
         selected_sklad=selected_sklad,
         hledat=hledat,
+        ke_dni=ke_dni,
         active_tab=active_tab,
         velikosti_saty=velikosti_saty,
         velikosti_boty=velikosti_boty,
@@ -190,6 +281,7 @@ def produkty():
                 db.session.add(Stock(product_id=produkt.id, sklad=sklad, size=size, quantity=0))
             db.session.add(Stock(product_id=produkt.id, sklad=sklad, size=None, quantity=0))
 
+        record_catalog_change()
         db.session.commit()
         flash("Produkt byl přidán.")
         return redirect(url_for("produkty", kategorie=vybrana_kategorie))
@@ -215,6 +307,7 @@ def edit_product(product_id):
             produkt.color = form.color.data
         if produkt.category == "saty":
             produkt.back_solution = form.back_solution.data
+        record_catalog_change()
         db.session.commit()
         flash("Produkt upraven.")
         return redirect(url_for("produkty", kategorie=produkt.category))
@@ -252,7 +345,9 @@ def delete_product(product_id):
 
     try:
         Stock.query.filter_by(product_id=product_id).delete()
+        record_product_removed(product_id)
         History.query.filter_by(product_id=product_id).delete()
+        OutboundDaily.query.filter_by(product_id=product_id).delete()
         TransferItem.query.filter_by(product_id=product_id).delete()
         db.session.delete(produkt)
         db.session.commit()
@@ -263,57 +358,94 @@ def delete_product(product_id):
 
     return redirect(url_for("produkty", kategorie=kategorie))
 
+@app.route("/produkty/hledat", methods=["GET"])
+@login_required
+def produkty_hledat():
+    """
+    Výběr produktu pro formuláře (JSON), po stránkách:
+    ?q=&kategorie=&sklad=&skladem=1&strana=1&na_stranu=20
+    Se skladem (výchozí) jen produkty, které má sklad na skladě.
+    """
+    kategorie = request.args.get("kategorie") or None
+    sklad = request.args.get("sklad") or None
+    if sklad and sklad not in ["Praha", "Brno", "Pardubice", "Ostrava"]:
+        return jsonify({"error": "Neznámý sklad."}), 400
+    skladem = request.args.get("skladem", "1") == "1"
+    try:
+        strana = max(1, int(request.args.get("strana", 1)))
+        na_stranu = max(1, min(int(request.args.get("na_stranu", 20)), 50))
+    except ValueError:
+        return jsonify({"error": "Neplatná stránka."}), 400
+
+    produkty, zasoby, dalsi = search_page(
+        request.args.get("q", ""), kategorie=kategorie, sklad=sklad,
+        skladem=skladem, strana=strana, na_stranu=na_stranu
+    )
+    return jsonify(
+        produkty=[
+            {
+                "id": p.id, "label": p.variant_label, "name": p.name,
+                "color": p.color, "back_solution": p.back_solution,
+                "kategorie": p.category,
+                "skladem": int(zasoby.get(p.id, 0)) if sklad else None,
+            }
+            for p in produkty
+        ],
+        strana=strana,
+        dalsi=dalsi,
+    )
+
 @app.route("/historie", methods=["GET", "POST"])
 @login_required
+@read_replica
 def historie():
-    query = History.query
-    user_filter = request.args.get("user")
-    sklad_filter = request.args.get("sklad")
-    od_str = request.args.get("od")
-    do_str = request.args.get("do")
-    produkt_filter = request.args.get("produkt", "").strip()
-
-    # Filtry
-    if user_filter and user_filter != "Všichni":
-        query = query.filter_by(user=user_filter)
-    if sklad_filter and sklad_filter != "Všechny":
-        query = query.filter_by(sklad=sklad_filter)
-
-    if produkt_filter:
-        query = query.join(Product, History.product_id == Product.id).filter(
-            Product.name.ilike(f"%{produkt_filter}%")
+    query, filtry = _history_filters(request.args)
+    user_filter = filtry["user"]
+    sklad_filter = filtry["sklad"]
+    od_str = filtry["od"]
+    do_str = filtry["do"]
+    produkt_filter = filtry["produkt"]
+
+    # === STRÁNKOVÁNÍ (kurzor podle timestamp + id) ===
+    # Místo OFFSET se pokračuje od posledního zobrazeného záznamu, takže
+    # stránka 500 stojí stejně jako stránka 1.
+    per_page = 50
+    kurzor = _parse_history_cursor(request.args.get("kurzor"))
+    smer = request.args.get("smer", "starsi")
+    klic = tuple_(History.timestamp, History.id)
+
+    if kurzor and smer == "novejsi":
+        rows = (
+            query.filter(klic > kurzor)
+            .order_by(History.timestamp.asc(), History.id.asc())
+            .limit(per_page + 1).all()
         )
-
-    if od_str:
-        try:
-            od_date = datetime.strptime(od_str, "%d.%m.%Y")
-            query = query.filter(History.timestamp >= od_date)
-        except ValueError:
-            pass 
+        ma_dalsi = len(rows) > per_page
+        zaznamy_raw = list(reversed(rows[:per_page]))
+        has_prev, has_next = ma_dalsi, True
     else:
-        dva_mesice_zpet = datetime.now() - timedelta(days=60)
-        dva_mesice_zpet = dva_mesice_zpet.replace(hour=0, minute=0, second=0, microsecond=0)
-        query = query.filter(History.timestamp >= dva_mesice_zpet)
-
-    if do_str:
-        try:
-            do_date = datetime.strptime(do_str, "%d.%m.%Y")
-            do_date = do_date.replace(hour=23, minute=59, second=59)
-            query = query.filter(History.timestamp <= do_date)
-        except ValueError:
-            pass
+        starsi_q = query.filter(klic < kurzor) if kurzor else query
+        rows = (
+            starsi_q.order_by(History.timestamp.desc(), History.id.desc())
+            .limit(per_page + 1).all()
+        )
+        zaznamy_raw = rows[:per_page]
+        has_prev, has_next = kurzor is not None, len(rows) > per_page
+
+    pagination = {
+        "has_prev": has_prev and bool(zaznamy_raw),
+        "has_next": has_next and bool(zaznamy_raw),
+        "prev_cursor": _history_cursor(zaznamy_raw[0]) if zaznamy_raw else None,
+        "next_cursor": _history_cursor(zaznamy_raw[-1]) if zaznamy_raw else None,
+        # celkový počet jen na vyžádání – COUNT přes velkou historii není zadarmo
+        "total": query.count() if request.args.get("pocet") else None,
+    }
 
-    # === STRÁNKOVÁNÍ (Pagination) ===
-    page = request.args.get('page', 1, type=int) # Vezme číslo stránky z URL (výchozí 1)
-    per_page = 50  # Načte maximálně 50 záznamů najednou
-    
-    # Použijeme .paginate() místo .all()
-    pagination = query.order_by(History.timestamp.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    produkt_ids = {h.product_id for h in zaznamy_raw if h.product_id is not None}
+    produkty_cache = (
+        {p.id: p for p in Product.query.filter(Product.id.in_(produkt_ids))}
+        if produkt_ids else {}
     )
-    zaznamy_raw = pagination.items # Toto je těch 50 konkrétních záznamů
-
-    produkty_cache = {p.id: p for p in Product.query.all()}
     
     zaznamy = []
     for h in zaznamy_raw:
@@ -338,14 +470,15 @@ def historie():
             "note":      h.note or "-"
         })
 
-    # Tyhle hodnoty pro roletky sbíráme odděleně, nezávisle na stránkování
-    users = ["Všichni"] + sorted({h.user for h in History.query.distinct(History.user) if h.user})
-    sklady = ["Všechny"] + sorted({h.sklad for h in History.query.distinct(History.sklad) if h.sklad})
+    # Hodnoty pro roletky z malé udržované tabulky (viz app/history_facets.py)
+    facet_users, facet_sklady = get_facets()
+    users = ["Všichni"] + facet_users
+    sklady = ["Všechny"] + facet_sklady
 
     return render_template(
         "historie.html",
         zaznamy=zaznamy,
-        pagination=pagination,       # Nová proměnná pro stránkování (tlačítka dole)
+        pagination=pagination,       # kurzory pro tlačítka Novější / Starší
         users=users,
         sklady=sklady,
         selected_user=user_filter or "Všichni",
@@ -376,10 +509,7 @@ def naskladnit():
         form.sklad.choices = [(current_user.sklad, current_user.sklad)]
         form.sklad.data = current_user.sklad
 
-    produkty = Product.query.filter_by(category=vybrana_kategorie).order_by(Product.name).all()
-    produkty_dict = {p.id: p for p in produkty}
-    form.product_id.choices = [(p.id, p.variant_label) for p in produkty]
-
+    # produkt se vybírá našeptávačem (/produkty/hledat)
     form.size.coerce = str
     if vybrana_kategorie == "saty":
         form.size.choices = [(str(v), str(v)) for v in range(32, 56, 2)]
@@ -396,7 +526,7 @@ def naskladnit():
 
         try:
             pid = int(form.product_id.data)
-            prod = produkty_dict[pid]
+            prod = Product.query.filter_by(id=pid, category=vybrana_kategorie).one()
         except:
             flash("Neplatný produkt.", "danger")
             return redirect(url_for("naskladnit", kategorie=vybrana_kategorie))
@@ -414,21 +544,62 @@ def naskladnit():
             flash("Zadejte platné nenegativní množství.", "danger")
             return redirect(url_for("naskladnit", kategorie=vybrana_kategorie))
 
-        stock = Stock.query.filter_by(product_id=prod.id, sklad=selected_sklad, size=size).first()
+        commit_with_retry(lambda: post_movement(
+            current_user.username, selected_sklad, prod.id, size, qty, "naskladneni"
+        ))
 
-        if stock:
-            stock.quantity += qty
-        else:
-            stock = Stock(product_id=prod.id, sklad=selected_sklad, size=size, quantity=qty)
-            db.session.add(stock)
+        flash(f"Naskladněno {qty} ks {prod.variant_label} do {selected_sklad}.", "success")
+        return redirect(url_for("naskladnit", kategorie=vybrana_kategorie))
 
-        db.session.add(History(user=current_user.username, sklad=selected_sklad, product_id=prod.id, size=size, change_type="naskladneni", amount=qty, timestamp=datetime.now()))
-        db.session.commit()
+    return render_template("naskladnit.html", form=form, vybrana_kategorie=vybrana_kategorie)
 
-        flash(f"Naskladněno {qty} ks {prod.variant_label} do {selected_sklad}.", "success")
+@app.route("/naskladnit/hromadne", methods=["POST"])
+@login_required
+def naskladnit_hromadne():
+    vybrana_kategorie = request.form.get("kategorie", "saty")
+
+    # MAX MÁ PŘÍSTUP K VÝBĚRU SKLADU
+    if current_user.role in ["admin", "Max"]:
+        sklad = request.form.get("sklad") or current_user.sklad or "Praha"
+    else:
+        sklad = current_user.sklad
+    if sklad not in ["Praha", "Pardubice", "Brno", "Ostrava"]:
+        flash("Neplatný sklad.", "danger")
         return redirect(url_for("naskladnit", kategorie=vybrana_kategorie))
 
-    return render_template("naskladnit.html", form=form, vybrana_kategorie=vybrana_kategorie, produkty_dict=produkty_dict)
+    atomicky = request.form.get("atomicky") == "on"
+    soubor = request.files.get("soubor")
+
+    try:
+        if soubor and soubor.filename:
+            lines = parse_delivery_file(soubor)
+        else:
+            lines = parse_delivery_form(request.form)
+    except DeliveryFileError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("naskladnit", kategorie=vybrana_kategorie))
+
+    if not lines:
+        flash("Dodávka neobsahuje žádné řádky.", "warning")
+        return redirect(url_for("naskladnit", kategorie=vybrana_kategorie))
+
+    pocet, vysledky = commit_with_retry(
+        lambda: receive_delivery(lines, sklad, current_user.username, atomic=atomicky)
+    )
+    chyby = [r for r in vysledky if r["chyba"]]
+
+    if pocet:
+        flash(f"Naskladněno {pocet} řádků dodávky do {sklad}.", "success")
+    if chyby:
+        flash(
+            f"{len(chyby)} řádků obsahuje chybu" + (" – nic nebylo naskladněno." if atomicky else " a bylo přeskočeno."),
+            "danger" if atomicky else "warning"
+        )
+
+    return render_template(
+        "naskladnit_hromadne.html", sklad=sklad, vysledky=vysledky,
+        chyby=chyby, vybrana_kategorie=vybrana_kategorie
+    )
 
 @app.route("/vyskladnit", methods=["GET", "POST"])
 @login_required
@@ -450,10 +621,7 @@ def vyskladnit():
         form.sklad.choices = [(current_user.sklad, current_user.sklad)]
         form.sklad.data = current_user.sklad
 
-    produkty = Product.query.filter_by(category=vybrana_kategorie).order_by(Product.name).all()
-    produkty_dict = {p.id: p for p in produkty}
-    form.product_id.choices = [(p.id, p.variant_label) for p in produkty]
-
+    # produkt se vybírá našeptávačem (/produkty/hledat)
     form.size.coerce = str
     if vybrana_kategorie == "saty":
         form.size.choices = [(str(v), str(v)) for v in range(32, 56, 2)]
@@ -470,7 +638,7 @@ def vyskladnit():
 
         try:
             pid = int(form.product_id.data)
-            prod = produkty_dict[pid]
+            prod = Product.query.filter_by(id=pid, category=vybrana_kategorie).one()
         except:
             flash("Neplatný produkt.", "danger")
             return redirect(url_for("vyskladnit", kategorie=vybrana_kategorie))
@@ -488,21 +656,22 @@ def vyskladnit():
             flash("Zadejte platné nenegativní množství.", "danger")
             return redirect(url_for("vyskladnit", kategorie=vybrana_kategorie))
 
-        stock = Stock.query.filter_by(product_id=prod.id, sklad=selected_sklad, size=size).first()
-
-        size_display = "-" if vybrana_kategorie in ["doplnky", "ostatni"] else size
-        if not stock or stock.quantity < qty:
+        # kontrola zásoby a odpis v jednom podmíněném UPDATE (viz ledger.withdraw)
+        try:
+            commit_with_retry(lambda: post_movement(
+                current_user.username, selected_sklad, prod.id, size, -qty, "vyskladneni",
+                check_stock=True
+            ))
+        except InsufficientStock:
+            db.session.rollback()
+            size_display = "-" if vybrana_kategorie in ["doplnky", "ostatni"] else size
             flash(f"Nedostatek zásoby: {prod.variant_label}, vel. {size_display}", "danger")
             return redirect(url_for("vyskladnit", kategorie=vybrana_kategorie))
 
-        stock.quantity -= qty
-        db.session.add(History(user=current_user.username, sklad=selected_sklad, product_id=prod.id, size=size, change_type="vyskladneni", amount=-qty, timestamp=datetime.now()))
-        db.session.commit()
-
         flash(f"Vyskladněno {qty} ks {prod.variant_label} ze {selected_sklad}.", "success")
         return redirect(url_for("vyskladnit", kategorie=vybrana_kategorie))
 
-    return render_template("vyskladnit.html", form=form, vybrana_kategorie=vybrana_kategorie, produkty_dict=produkty_dict)
+    return render_template("vyskladnit.html", form=form, vybrana_kategorie=vybrana_kategorie)
 
 
 @app.route("/uzivatele", methods=["GET", "POST"])
@@ -593,26 +762,29 @@ def poznamka(product_id, sklad):
             flash("Neplatná velikost v požadavku.", "danger")
             return redirect(url_for("dashboard", sklad=sklad, tab=tab) + f"#{tab}")
             
-    stock = Stock.query.filter_by(product_id=product_id, sklad=sklad, size=size).first()
-
-    if not stock:
-        stock = Stock(product_id=product_id, sklad=sklad, size=size, quantity=0)
-        db.session.add(stock)
-
-    stock.note = note_text
-
-    history = History(
-        user=current_user.username,
-        sklad=sklad,
-        product_id=product_id,
-        size=size,
-        change_type="poznamka",
-        amount=0,
-        timestamp=datetime.now(),
-        note=note_text
-    )
-    db.session.add(history)
-    db.session.commit()
+    def ulozit_poznamku():
+        stock = Stock.query.filter_by(product_id=product_id, sklad=sklad, size=size).first()
+
+        if not stock:
+            stock = Stock(product_id=product_id, sklad=sklad, size=size, quantity=0)
+            db.session.add(stock)
+
+        stock.note = note_text
+        record_stock_change(sklad, product_id, size, note=note_text)
+
+        history = History(
+            user=current_user.username,
+            sklad=sklad,
+            product_id=product_id,
+            size=size,
+            change_type="poznamka",
+            amount=0,
+            timestamp=datetime.now(),
+            note=note_text
+        )
+        db.session.add(history)
+
+    commit_with_retry(ulozit_poznamku)
 
     flash("Poznámka byla uložena.", "success")
     return redirect(url_for("dashboard", sklad=sklad, tab=tab) + f"#{tab}")
@@ -624,45 +796,22 @@ def prodeje():
     aktualni_datum = datetime.now()
     vybrany_rok = request.args.get("rok", aktualni_datum.year, type=int)
     mesic = request.args.get("mesic")
-    dostupne_roky = [2025, 2026]
-
-    mesice = [
-        (1, "Leden"), (2, "Únor"), (3, "Březen"), (4, "Duben"),
-        (5, "Květen"), (6, "Červen"), (7, "Červenec"), (8, "Srpen"),
-        (9, "Září"), (10, "Říjen"), (11, "Listopad"), (12, "Prosinec"),
-        ("rocni_prehled", "Roční přehled")
-    ]
+    dostupne_roky = available_years("prodeje")
+
+    mesice = MESICE + [("rocni_prehled", "Roční přehled")]
     nazvy_mesicu = {str(m[0]): m[1] for m in mesice}
 
     uzivatele = User.query.filter(User.role != "admin").order_by(User.username).all()
     jmena_uzivatelu = [u.username for u in uzivatele]
 
-    data = defaultdict(lambda: {"zkousky": 0, "prodeje": 0})
-
-    if mesic == "rocni_prehled":
-        zaznamy = Sales.query.filter_by(year=vybrany_rok).all()
-        for z in zaznamy:
-            data[z.user]["zkousky"] += z.tries
-            data[z.user]["prodeje"] += z.sales
-    else:
-        mesic_int = int(mesic) if mesic else aktualni_datum.month
-        zaznamy = Sales.query.filter_by(year=vybrany_rok, month=mesic_int).all()
-        for z in zaznamy:
-            data[z.user]["zkousky"] = z.tries
-            data[z.user]["prodeje"] = z.sales
-        mesic = mesic_int
-
-    for jmeno in jmena_uzivatelu:
-        zk = data[jmeno]["zkousky"]
-        pr = data[jmeno]["prodeje"]
-        data[jmeno]["uspesnost"] = f"{(pr / zk * 100):.1f} %" if zk > 0 else "-"
-
-    celkem_zkousky = sum(data[j]["zkousky"] for j in jmena_uzivatelu)
-    celkem_prodeje = sum(data[j]["prodeje"] for j in jmena_uzivatelu)
-    celkem_uspesnost = f"{(celkem_prodeje / celkem_zkousky * 100):.1f} %" if celkem_zkousky > 0 else "-"
-
-    data["Celkem"] = {"zkousky": celkem_zkousky, "prodeje": celkem_prodeje, "uspesnost": celkem_uspesnost}
-    jmena_uzivatelu.append("Celkem")
+    # součty po uživatelích a měsících jedním dotazem (viz app/reports.py)
+    pivot = monthly_pivot("prodeje", vybrany_rok)
+    if mesic != "rocni_prehled":
+        mesic = int(mesic) if mesic else aktualni_datum.month
+    data, jmena_uzivatelu = pivot.table(
+        jmena_uzivatelu, None if mesic == "rocni_prehled" else mesic
+    )
+    add_success_rate(data)
 
     return render_template(
         "prodeje.html", mesice=mesice, vybrany_mesic=mesic, 
@@ -673,12 +822,7 @@ def prodeje():
 @app.route("/prodeje/zapsat", methods=["GET", "POST"])
 @login_required
 def zapsat_prodej():
-    mesice = [
-        (1, "Leden"), (2, "Únor"), (3, "Březen"), (4, "Duben"),
-        (5, "Květen"), (6, "Červen"), (7, "Červenec"), (8, "Srpen"),
-        (9, "Září"), (10, "Říjen"), (11, "Listopad"), (12, "Prosinec")
-    ]
-    nazvy_mesicu = {m[0]: m[1] for m in mesice}
+    nazvy_mesicu = dict(MESICE)
 
     if request.method == "POST":
         try:
@@ -703,57 +847,44 @@ def zapsat_prodej():
                 except (ValueError, TypeError):
                     pass
 
-        zaznam = Sales.query.filter_by(user=username, year=rok, month=mesic).first()
-        if not zaznam:
-            zaznam = Sales(user=username, year=rok, month=mesic, tries=0, sales=0)
-            db.session.add(zaznam)
-
-        zaznam.tries += zkusky
-        zaznam.sales += prodeje
-        timestamp = datetime.now()
+        def zapsat():
+            # jeden UPSERT na (uživatel, rok, měsíc) – bez dotazu předem
+            record_sales(username, rok, mesic, zkusky, prodeje)
+            timestamp = datetime.now()
 
-        if zkusky != 0:
-            db.session.add(History(user=current_user.username, sklad="Prodeje", product_id=None, size=None, change_type="zkoušky", amount=zkusky, timestamp=timestamp, note=f"{username} – {nazvy_mesicu[mesic]} {rok}"))
-        if prodeje != 0:
-            db.session.add(History(user=current_user.username, sklad="Prodeje", product_id=None, size=None, change_type="prodej", amount=prodeje, timestamp=timestamp, note=f"{username} – {nazvy_mesicu[mesic]} {rok}"))
+            if zkusky != 0:
+                db.session.add(History(user=current_user.username, sklad="Prodeje", product_id=None, size=None, change_type="zkoušky", amount=zkusky, timestamp=timestamp, note=f"{username} – {nazvy_mesicu[mesic]} {rok}"))
+            if prodeje != 0:
+                db.session.add(History(user=current_user.username, sklad="Prodeje", product_id=None, size=None, change_type="prodej", amount=prodeje, timestamp=timestamp, note=f"{username} – {nazvy_mesicu[mesic]} {rok}"))
 
-        db.session.commit()
+        commit_with_retry(zapsat)
         flash("Prodej byl zapsán.")
         return redirect(url_for("prodeje", mesic=mesic))
 
     uzivatele = User.query.filter(User.role != "admin").order_by(User.username).all()
-    return render_template("zapsat_prodej.html", uzivatele=uzivatele, current_month=datetime.now().month, mesice=mesice)
+    return render_template("zapsat_prodej.html", uzivatele=uzivatele, current_month=datetime.now().month, mesice=MESICE)
 
 
 @app.route("/prodeje/rocni")
 @login_required
+@read_replica
 def prodeje_rocni():
     aktualni_datum = datetime.now()
     vybrany_rok = request.args.get("rok", aktualni_datum.year, type=int)
-    dostupne_roky = [2025, 2026]
+    dostupne_roky = available_years("prodeje")
 
     uzivatele = User.query.filter(User.role != "admin").order_by(User.username).all()
     jmena_uzivatelu = [u.username for u in uzivatele]
 
-    data = defaultdict(lambda: {"zkousky": 0, "prodeje": 0})
-    zaznamy = Sales.query.filter_by(year=vybrany_rok).all()
-    for z in zaznamy:
-        data[z.user]["zkousky"] += z.tries
-        data[z.user]["prodeje"] += z.sales
-
-    for jmeno in jmena_uzivatelu:
-        zk = data[jmeno]["zkousky"]
-        pr = data[jmeno]["prodeje"]
-        data[jmeno]["uspesnost"] = f"{(pr / zk * 100):.1f} %" if zk > 0 else "-"
-
-    celkem_zkousky = sum(data[j]["zkousky"] for j in jmena_uzivatelu)
-    celkem_prodeje = sum(data[j]["prodeje"] for j in jmena_uzivatelu)
-    celkem_uspesnost = f"{(celkem_prodeje / celkem_zkousky * 100):.1f} %" if celkem_zkousky > 0 else "-"
-    
-    data["Celkem"] = {"zkousky": celkem_zkousky, "prodeje": celkem_prodeje, "uspesnost": celkem_uspesnost}
-    jmena_uzivatelu.append("Celkem")
+    pivot = monthly_pivot("prodeje", vybrany_rok)
+    data, jmena_uzivatelu = pivot.table(jmena_uzivatelu)
+    add_success_rate(data)
 
-    return render_template("prodeje_rocni.html", rok=vybrany_rok, data=data, uzivatele=jmena_uzivatelu, dostupne_roky=dostupne_roky)
+    return render_template(
+        "prodeje_rocni.html", rok=vybrany_rok, data=data, uzivatele=jmena_uzivatelu,
+        dostupne_roky=dostupne_roky, pivot=pivot, mesice=MESICE,
+        metriky=[("zkousky", "Zkoušky"), ("prodeje", "Prodeje")]
+    )
 
 @app.route("/prescasy")
 @login_required
@@ -762,42 +893,23 @@ def prescasy():
     vybrany_rok = request.args.get("rok", aktualni_datum.year, type=int)
     mesic = request.args.get("mesic", aktualni_datum.month, type=int)
     
-    dostupne_roky = [2025, 2026]
-
-    mesice = [
-        (1, "Leden"), (2, "Únor"), (3, "Březen"), (4, "Duben"),
-        (5, "Květen"), (6, "Červen"), (7, "Červenec"), (8, "Srpen"),
-        (9, "Září"), (10, "Říjen"), (11, "Listopad"), (12, "Prosinec")
-    ]
-    nazvy_mesicu = {m[0]: m[1] for m in mesice}
+    dostupne_roky = available_years("prescasy")
+
+    nazvy_mesicu = dict(MESICE)
     vybrany_nazev_mesice = nazvy_mesicu.get(mesic, "")
 
     uzivatele = User.query.filter(User.role != "admin").order_by(User.username).all()
     jmena_uzivatelu = [u.username for u in uzivatele]
 
-    zaznamy = Overtime.query.filter_by(year=vybrany_rok, month=mesic).all()
-    data = defaultdict(lambda: {"classic": 0, "deluxe": 0})
-    for z in zaznamy:
-        data[z.user]["classic"] = z.classic
-        data[z.user]["deluxe"] = z.deluxe
-
-    celkem_classic = sum(data[j]["classic"] for j in jmena_uzivatelu)
-    celkem_deluxe = sum(data[j]["deluxe"] for j in jmena_uzivatelu)
-    data["Celkem"] = {"classic": celkem_classic, "deluxe": celkem_deluxe}
-    jmena_uzivatelu.append("Celkem")
+    data, jmena_uzivatelu = monthly_pivot("prescasy", vybrany_rok).table(jmena_uzivatelu, mesic)
 
-    return render_template("prescasy.html", mesice=mesice, vybrany_mesic=mesic, vybrany_nazev_mesice=vybrany_nazev_mesice, data=data, uzivatele=jmena_uzivatelu, vybrany_rok=vybrany_rok, dostupne_roky=dostupne_roky)
+    return render_template("prescasy.html", mesice=MESICE, vybrany_mesic=mesic, vybrany_nazev_mesice=vybrany_nazev_mesice, data=data, uzivatele=jmena_uzivatelu, vybrany_rok=vybrany_rok, dostupne_roky=dostupne_roky)
 
 
 @app.route("/prescasy/zapsat", methods=["GET", "POST"])
 @login_required
 def zapsat_prescasy():
-    mesice = [
-        (1, "Leden"), (2, "Únor"), (3, "Březen"), (4, "Duben"),
-        (5, "Květen"), (6, "Červen"), (7, "Červenec"), (8, "Srpen"),
-        (9, "Září"), (10, "Říjen"), (11, "Listopad"), (12, "Prosinec")
-    ]
-    nazvy_mesicu = {m[0]: m[1] for m in mesice}
+    nazvy_mesicu = dict(MESICE)
 
     if request.method == "POST":
         try:
@@ -823,26 +935,21 @@ def zapsat_prescasy():
             except (ValueError, TypeError):
                 pass
 
-        zaznam = Overtime.query.filter_by(user=username, year=rok, month=mesic).first()
-        if not zaznam:
-            zaznam = Overtime(user=username, year=rok, month=mesic, classic=0, deluxe=0)
-            db.session.add(zaznam)
+        def zapsat():
+            record_overtime(username, rok, mesic, classic, deluxe)
+            now = datetime.now()
 
-        zaznam.classic += classic
-        zaznam.deluxe += deluxe
-        now = datetime.now()
+            if classic != 0:
+                db.session.add(History(user=current_user.username, sklad="Přesčasy", product_id=None, size=None, change_type="classic přesčas", amount=classic, timestamp=now, note=f"{username} – {nazvy_mesicu[mesic]} {rok}"))
+            if deluxe != 0:
+                db.session.add(History(user=current_user.username, sklad="Přesčasy", product_id=None, size=None, change_type="deluxe přesčas", amount=deluxe, timestamp=now, note=f"{username} – {nazvy_mesicu[mesic]} {rok}"))
 
-        if classic != 0:
-            db.session.add(History(user=current_user.username, sklad="Přesčasy", product_id=None, size=None, change_type="classic přesčas", amount=classic, timestamp=now, note=f"{username} – {nazvy_mesicu[mesic]} {rok}"))
-        if deluxe != 0:
-            db.session.add(History(user=current_user.username, sklad="Přesčasy", product_id=None, size=None, change_type="deluxe přesčas", amount=deluxe, timestamp=now, note=f"{username} – {nazvy_mesicu[mesic]} {rok}"))
-
-        db.session.commit()
+        commit_with_retry(zapsat)
         flash("Přesčasy byly zapsány.")
         return redirect(url_for("prescasy", mesic=mesic))
 
     uzivatele = User.query.filter(User.role != "admin").order_by(User.username).all()
-    return render_template("zapsat_prescasy.html", uzivatele=uzivatele, current_month=datetime.now().month, mesice=mesice)
+    return render_template("zapsat_prescasy.html", uzivatele=uzivatele, current_month=datetime.now().month, mesice=MESICE)
 
 
 @app.route("/prescasy/rocni")
@@ -850,31 +957,58 @@ def zapsat_prescasy():
 def prescasy_rocni():
     aktualni_datum = datetime.now()
     vybrany_rok = request.args.get("rok", aktualni_datum.year, type=int)
-    dostupne_roky = [2025, 2026]
+    dostupne_roky = available_years("prescasy")
 
     uzivatele = User.query.filter(User.role != "admin").order_by(User.username).all()
     jmena_uzivatelu = [u.username for u in uzivatele]
 
-    data = {}
-    for jmeno in jmena_uzivatelu:
-        zaznamy = Overtime.query.filter_by(user=jmeno, year=vybrany_rok).all()
-        classic = sum(z.classic or 0 for z in zaznamy)
-        deluxe = sum(z.deluxe or 0 for z in zaznamy)
-        data[jmeno] = {"classic": classic, "deluxe": deluxe}
+    # jeden GROUP BY místo dotazu na každého uživatele
+    pivot = monthly_pivot("prescasy", vybrany_rok)
+    data, jmena_uzivatelu = pivot.table(jmena_uzivatelu)
 
-    celkem_classic = sum(data[j]["classic"] for j in jmena_uzivatelu)
-    celkem_deluxe = sum(data[j]["deluxe"] for j in jmena_uzivatelu)
-    data["Celkem"] = {"classic": celkem_classic, "deluxe": celkem_deluxe}
-    jmena_uzivatelu.append("Celkem")
+    return render_template(
+        "prescasy_rocni.html", data=data, uzivatele=jmena_uzivatelu, rok=vybrany_rok,
+        dostupne_roky=dostupne_roky, pivot=pivot, mesice=MESICE,
+        metriky=[("classic", "Classic"), ("deluxe", "Deluxe")]
+    )
 
-    return render_template("prescasy_rocni.html", data=data, uzivatele=jmena_uzivatelu, rok=vybrany_rok, dostupne_roky=dostupne_roky)
+def _porovnani_let(modul, metriky, nadpis):
+    """Meziroční porovnání po uživatelích – jeden GROUP BY přes všechny roky."""
+    od = request.args.get("od", type=int)
+    do = request.args.get("do", type=int)
+    uzivatele = User.query.filter(User.role != "admin").order_by(User.username).all()
+    jmena_uzivatelu = [u.username for u in uzivatele]
+
+    pivot = yearly_pivot(modul, od, do)
+    roky = sorted(pivot.obdobi)
+    tabulky = {rok: pivot.table(jmena_uzivatelu, rok)[0] for rok in roky}
+    if modul == "prodeje":
+        for data in tabulky.values():
+            add_success_rate(data)
+
+    return render_template(
+        "porovnani_let.html", modul=modul, nadpis=nadpis, metriky=metriky,
+        roky=roky, tabulky=tabulky, uzivatele=jmena_uzivatelu + ["Celkem"], od=od, do=do
+    )
+
+@app.route("/prodeje/porovnani")
+@login_required
+@read_replica
+def prodeje_porovnani():
+    return _porovnani_let("prodeje", [("zkousky", "Zkoušky"), ("prodeje", "Prodeje"), ("uspesnost", "Úspěšnost")], "Prodeje")
+
+@app.route("/prescasy/porovnani")
+@login_required
+@read_replica
+def prescasy_porovnani():
+    return _porovnani_let("prescasy", [("classic", "Classic"), ("deluxe", "Deluxe")], "Přesčasy")
 
 
 @app.route("/preskladnit", methods=["GET", "POST"])
 @login_required
 def preskladnit():
     def ulozit_kosik_z_formulare():
-        for it in session["kosik"]:
+        for it in kosik:
             pid = it["id"]
             prefix = f"velikost_{pid}_"
             for key, raw in request.form.items():
@@ -885,7 +1019,6 @@ def preskladnit():
                     except (ValueError, TypeError):
                         continue
                     it["velikosti"][suffix] = max(0, q)
-        session.modified = True
 
     sklady = ["Praha", "Brno", "Pardubice", "Ostrava"]
     default_source = (
@@ -900,9 +1033,9 @@ def preskladnit():
         flash("Nemáte oprávnění zakládat přeskladnění.", "danger")
         return redirect(url_for("dashboard"))
 
-    session.setdefault("kosik", [])
+    # košík je na serveru (app/drafts.py), v cookie jen zvolené sklady
+    kosik = get_draft("kosik", [])
     session.setdefault("target_sklad", sklady[0])
-    session.modified = True
 
     velikosti = {
         "saty":    list(range(32, 56, 2)),
@@ -916,66 +1049,44 @@ def preskladnit():
 
         if "add_product" in request.form:
             pid = int(request.form["add_product"])
-            if not any(it["id"] == pid for it in session["kosik"]):
+            if not any(it["id"] == pid for it in kosik):
                 cat = Product.query.get(pid).category
-                session["kosik"].append({
+                kosik.append({
                     "id": pid,
                     "velikosti": {str(v): 0 for v in velikosti[cat]}
                 })
-            session.modified = True
+            commit_with_retry(lambda: save_draft("kosik", kosik))
             return redirect(url_for("preskladnit"))
 
         if "remove_product" in request.form:
             pid = int(request.form["remove_product"])
-            session["kosik"] = [it for it in session["kosik"] if it["id"] != pid]
-            session.modified = True
+            kosik = [it for it in kosik if it["id"] != pid]
+            commit_with_retry(lambda: save_draft("kosik", kosik))
             return redirect(url_for("preskladnit"))
 
         if "preskladnit" in request.form:
             target = request.form.get("target_sklad", session["target_sklad"])
             session["target_sklad"] = target
-            session.modified = True
-
-            transfer = Transfer(
-                source_sklad=source_sklad,
-                target_sklad=target,
-                created_by=current_user.username,
-                created_at=datetime.now()
-            )
-            db.session.add(transfer)
-            db.session.flush()
+            # rozepsaný košík se uloží i v případě, že založení selže
+            commit_with_retry(lambda: save_draft("kosik", kosik))
 
             try:
-                for it in session["kosik"]:
-                    prod = Product.query.get(it["id"])
+                polozky = []
+                for it in kosik:
                     for suffix, q in it["velikosti"].items():
                         try:
                             qty = int(q)
                             size = int(suffix)
                         except:
                             continue
-                        if qty <= 0:
-                            continue
+                        if qty > 0:
+                            polozky.append((it["id"], size, qty))
 
-                        sklad_z = Stock.query.filter_by(product_id=prod.id, sklad=source_sklad, size=size).first()
-                        size_display = "-" if prod.category in ["doplnky", "ostatni"] else size
-                        if not sklad_z or sklad_z.quantity < qty:
-                            raise ValueError(f"Nedostatek zásoby: {prod.name}, vel. {size_display}")
-                        
-                        sklad_z.quantity -= qty
-                        db.session.add(History(
-                            user=current_user.username,
-                            sklad=source_sklad,
-                            product_id=prod.id,
-                            size=size,
-                            change_type="preskladneni_vysklad",
-                            amount=-qty,
-                            timestamp=datetime.now()
-                        ))
-                        db.session.add(TransferItem(transfer_id=transfer.id, product_id=prod.id, size=size, quantity=qty))
-
-                db.session.commit()
-                session["kosik"] = []
+                def zalozit():
+                    create_transfer(source_sklad, target, polozky, current_user.username)
+                    delete_draft("kosik")
+
+                commit_with_retry(zalozit)
                 flash("Přeskladnění založeno – potvrďte v seznamu.", "success")
                 return redirect(url_for("preskladneni_seznam"))
             except Exception as e:
@@ -984,30 +1095,14 @@ def preskladnit():
                 return redirect(url_for("preskladnit"))
 
         if "tisk" in request.form:
+            commit_with_retry(lambda: save_draft("kosik", kosik))
             flash("Tisk zatím není implementován.", "info")
             return redirect(url_for("preskladnit"))
 
-    produkty = Product.query.order_by(Product.name).all()
-    produkty_podle_kategorii = {k: [] for k in velikosti.keys()}
-    
-    all_stock_for_sklad = Stock.query.filter_by(sklad=source_sklad).all()
-    stock_map = {(s.product_id, s.size): s.quantity for s in all_stock_for_sklad}
-
-    for p in produkty:
-        qtys = {}
-        for v in velikosti[p.category]:
-            qtys[v] = stock_map.get((p.id, v), 0)
-            
-        produkty_podle_kategorii[p.category].append({
-            "id": p.id,
-            "name": p.name,
-            "color": p.color,
-            "back_solution": p.back_solution,
-            "velikosti": qtys
-        })
-
+    # katalog si stránka načítá po stránkách z /produkty/hledat,
+    # z databáze se tu berou jen produkty v košíku
     normalized = []
-    for it in session["kosik"]:
+    for it in kosik:
         sizes = {}
         for suffix, q in it["velikosti"].items():
             try:
@@ -1016,10 +1111,16 @@ def preskladnit():
                 continue
         normalized.append({"id": it["id"], "velikosti": sizes})
 
-    produkty_dict = {p.id: p for p in produkty}
+    produkty_dict = {}
+    if normalized:
+        produkty_dict = {
+            p.id: p for p in Product.query.filter(Product.id.in_([it["id"] for it in normalized]))
+        }
     kosik_saty, kosik_boty, kosik_doplnky, kosik_ostatni = [], [], [], []
     for it in normalized:
-        prod = produkty_dict[it["id"]]
+        prod = produkty_dict.get(it["id"])
+        if prod is None:
+            continue    # produkt mezitím smazán
         row = {
             "id": prod.id, "name": prod.name, "color": prod.color,
             "back_solution": prod.back_solution, "velikosti": it["velikosti"]
@@ -1031,7 +1132,7 @@ def preskladnit():
 
     return render_template(
         "preskladnit.html", sklady=sklady, source_sklad=source_sklad,
-        target_sklad=session["target_sklad"], produkty_podle_kategorii=produkty_podle_kategorii,
+        target_sklad=session["target_sklad"],
         kosik_saty=kosik_saty, kosik_boty=kosik_boty, kosik_doplnky=kosik_doplnky,
         kosik_ostatni=kosik_ostatni, velikosti=velikosti
     )
@@ -1054,27 +1155,9 @@ def preskladneni_detail(transfer_id):
 
     if request.method == "POST" and transfer.status == "v_tranzitu":
         try:
-            for pol in polozky:
-                sklad_cil = Stock.query.filter_by(product_id=pol.product_id, sklad=transfer.target_sklad, size=pol.size).first()
-                if sklad_cil:
-                    sklad_cil.quantity += pol.quantity
-                else:
-                    db.session.add(Stock(product_id=pol.product_id, sklad=transfer.target_sklad, size=pol.size, quantity=pol.quantity))
-
-                db.session.add(History(
-                    user=current_user.username,
-                    sklad=transfer.target_sklad,
-                    product_id=pol.product_id,
-                    size=pol.size,
-                    change_type="preskladneni_nasklad",
-                    amount=pol.quantity,
-                    timestamp=datetime.now()
-                ))
-
-            transfer.status = "potvrzeno"
-            transfer.confirmed_by = current_user.username
-            transfer.confirmed_at = datetime.now()
-            db.session.commit()
+            if not commit_with_retry(lambda: confirm_transfer(transfer, current_user.username)):
+                flash("Přeskladnění už mezitím potvrdil někdo jiný.", "warning")
+                return redirect(url_for("preskladneni_seznam"))
             flash("Přeskladnění potvrzeno a naskladněno.", "success")
             return redirect(url_for("preskladneni_seznam"))
         except Exception as e:
@@ -1125,22 +1208,14 @@ def export_transfer(transfer_id):
         flash("Nemáte oprávnění exportovat tento dokument.", "danger")
         return redirect(url_for("preskladneni_detail", transfer_id=transfer_id))
 
-    polozky = TransferItem.query.filter_by(transfer_id=transfer_id).all()
-    produkty = {p.id: p for p in Product.query.all()}
-    podrobnosti = []
-    for pol in polozky:
-        prod = produkty[pol.product_id]
-        label = f"{prod.name}-{prod.color or '-'}-{prod.back_solution or '-'}"
-        size_display = "-" if prod.category in ["doplnky", "ostatni"] else (pol.size or "-")
-        podrobnosti.append({"label": label, "size": size_display, "quantity": pol.quantity})
-
-    html = render_template("export_transfer.html", transfer=transfer, polozky=podrobnosti)
-    pdf = HTML(string=html).write_pdf()
+    params = {"transfer_id": transfer.id}
+    cached = cached_pdf("transfer", params)
+    if cached:
+        return _send_pdf(*cached)
 
-    resp = make_response(pdf)
-    resp.headers["Content-Type"] = "application/pdf"
-    resp.headers["Content-Disposition"] = f"attachment; filename=preskladneni_{transfer.id}.pdf"
-    return resp
+    # PDF vyrobí worker na pozadí (viz app/pdf_jobs.py)
+    job = enqueue_pdf("transfer", params, current_user.username)
+    return redirect(url_for("pdf_job", job_id=job.id))
 
 @app.route("/export/inventory", defaults={"sklad": None})
 @app.route("/export/inventory/<sklad>")
@@ -1159,41 +1234,71 @@ def export_inventory(sklad):
             flash("Nemáte přiřazen žádný sklad.", "danger")
             return redirect(url_for("dashboard"))
 
-    velikosti = {
-        "saty":     list(range(32, 56, 2)),
-        "boty":     list(range(36, 43)),
-        "doplnky":  [UNIVERSAL_SIZE],
-        "ostatni":  [UNIVERSAL_SIZE]
-    }
+    params = {"sklad": sklad}
+    cached = cached_pdf("inventory", params)
+    if cached:
+        return _send_pdf(*cached)
 
-    produkty = Product.query.order_by(Product.name).all()
-    products_by_category = {"saty": [], "boty": [], "doplnky": [], "ostatni": []}
-    
-    for p in produkty:
-        qtys = {}
-        for v in velikosti[p.category]:
-            st = Stock.query.filter_by(product_id=p.id, sklad=sklad, size=v).first()
-            qtys[v] = st.quantity if st else 0
-        
-        if p.category in ["doplnky", "ostatni"]:
-            products_by_category[p.category].append({
-                "name": p.name, "color": p.color, "quantity": qtys.get(UNIVERSAL_SIZE, 0)
-            })
-        else:
-             products_by_category[p.category].append({
-                "name": p.name, "color": p.color, "sizes": qtys, "back_solution": p.back_solution
-            })
+    job = enqueue_pdf("inventory", params, current_user.username)
+    return redirect(url_for("pdf_job", job_id=job.id))
 
-    html = render_template("export_inventory.html", sklad=sklad, velikosti=velikosti, products_by_category=products_by_category)
-    pdf_bytes = HTML(string=html, base_url=request.host_url).write_pdf()
-    buf = BytesIO(pdf_bytes)
-    filename = f"inventura_{sklad}.pdf"
 
-    return send_file(buf, download_name=filename, mimetype="application/pdf", as_attachment=True)
+def _send_pdf(data, filename):
+    return send_file(BytesIO(data), download_name=filename, mimetype="application/pdf", as_attachment=True)
 
-import csv
-from io import StringIO
-from flask import make_response, flash, redirect, url_for
+def _get_pdf_job(job_id):
+    job = PdfJob.query.get_or_404(job_id)
+    if job.created_by != current_user.username and current_user.role != "admin":
+        abort(404)
+    return job
+
+@app.route("/export/uloha/<job_id>")
+@login_required
+def pdf_job(job_id):
+    job = expire_waiting(_get_pdf_job(job_id))
+    return render_template("pdf_job.html", job=job)
+
+@app.route("/export/uloha/<job_id>/stav")
+@login_required
+def pdf_job_status(job_id):
+    job = expire_waiting(_get_pdf_job(job_id))
+    return jsonify({
+        "id": job.id,
+        "status": job.status,
+        "error": job.error,
+        "download_url": url_for("pdf_job_download", job_id=job.id) if job.status == "hotovo" else None,
+        "queue_ms": job.queue_ms,
+        "build_ms": job.build_ms,
+        "render_ms": job.render_ms,
+    })
+
+@app.route("/export/uloha/<job_id>/stahnout")
+@login_required
+def pdf_job_download(job_id):
+    job = _get_pdf_job(job_id)
+    if job.status != "hotovo" or not os.path.exists(pdf_job_path(job)):
+        flash("Dokument ještě není připravený.", "warning")
+        return redirect(url_for("pdf_job", job_id=job.id))
+    return send_file(
+        pdf_job_path(job), download_name=job.filename,
+        mimetype="application/pdf", as_attachment=True
+    )
+
+@app.route("/export/pdf-cache")
+@login_required
+def pdf_cache_stats():
+    if current_user.role != "admin":
+        abort(404)
+    # počítadla zásahů jsou za tento proces, obsah adresáře je společný
+    return jsonify(pdf_cache.stats())
+
+@app.route("/diagnostika/db")
+@login_required
+def db_pool_stats():
+    if current_user.role != "admin":
+        abort(404)
+    # stav poolů spojení tohoto procesu (gunicorn worker)
+    return jsonify(pool_stats(db.engines))
 
 @app.route("/export/inventory/csv/<sklad>")
 @login_required
@@ -1202,82 +1307,16 @@ def export_inventory_csv(sklad):
         flash("Nemáte oprávnění k exportu tohoto skladu.", "danger")
         return redirect(url_for("dashboard"))
 
-    velikosti = {
-        "saty":    list(range(32, 56, 2)),
-        "boty":    list(range(36, 43)),
-        "doplnky": [0],
-        "ostatni": [0]
-    }
-    
-    # 1. Načteme skladové zásoby najednou do slovníku
-    all_stock_records = Stock.query.filter_by(sklad=sklad).all()
-    stock_map = {(s.product_id, s.size): s.quantity for s in all_stock_records}
-    
-    # 2. Načteme produkty a roztřídíme je
-    produkty = Product.query.order_by(Product.name).all()
-    prod_by_cat = {"saty": [], "boty": [], "doplnky": [], "ostatni": []}
-    for p in produkty:
-        prod_by_cat[p.category].append(p)
+    # CSV se posílá po částech přímo z DB (viz app/exports.py)
+    return csv_response(inventory_rows(sklad), f"inventura_{sklad}.csv")
 
-    # 3. Příprava CSV
-    si = StringIO()
-    cw = csv.writer(si, delimiter=';')
-    
-    # 4. Generování bloků pro každou kategorii
-    for cat, label in [("saty", "ŠATY"), ("boty", "BOTY"), ("doplnky", "DOPLŇKY"), ("ostatni", "OSTATNÍ")]:
-        if not prod_by_cat[cat]:
-            continue
-            
-        # Hlavička sekce
-        cw.writerow([f"--- {label} ---"])
-        
-        # Názvy sloupců podle kategorie
-        if cat == "saty":
-            header = ["Název", "Barva", "Řešení zad"] + [str(v) for v in velikosti[cat]] + ["Celkem"]
-        elif cat == "boty":
-            header = ["Název"] + [str(v) for v in velikosti[cat]] + ["Celkem"]
-        elif cat == "doplnky":
-            header = ["Název", "Barva", "Množství"]
-        else: # ostatni
-            header = ["Název", "Množství"]
-        
-        cw.writerow(header)
-        
-        # Samotná data produktů
-        for p in prod_by_cat[cat]:
-            row = []
-            if cat == "saty":
-                row.extend([p.name, p.color or "-", p.back_solution or "-"])
-            elif cat == "boty":
-                row.append(p.name)
-            elif cat == "doplnky":
-                row.extend([p.name, p.color or "-"])
-            else: # ostatni
-                row.append(p.name)
-            
-            celkem = 0
-            for v in velikosti[cat]:
-                qty = stock_map.get((p.id, v), 0)
-                
-                # ZMĚNA ZDE: Místo nuly vložíme prázdný text ""
-                row.append(qty if qty > 0 else "")
-                
-                if cat in ["saty", "boty"]:
-                    celkem += qty
-            
-            if cat in ["saty", "boty"]:
-                # ZMĚNA ZDE: Sloupec "Celkem" bude také prázdný, pokud je výsledek 0
-                row.append(celkem if celkem > 0 else "")
-                
-            cw.writerow(row)
-        
-        cw.writerow([])
 
-    output = make_response('\ufeff' + si.getvalue())
-    output.headers["Content-Disposition"] = f"attachment; filename=inventura_{sklad}.csv"
-    output.headers["Content-type"] = "text/csv; charset=utf-8"
-    
-    return output
+@app.route("/historie/export.csv")
+@login_required
+def export_history_csv():
+    query, filtry = _history_filters(request.args)
+    filename = f"historie_{datetime.now().strftime('%Y%m%d')}.csv"
+    return csv_response(history_rows(query), filename)
 
 
 @app.route("/inventura", methods=["GET", "POST"])
@@ -1291,6 +1330,10 @@ def inventura():
             "sklad",
             session.get("inventura_sklad", current_user.sklad or sklady[0])
         )
+        if sklad not in sklady:
+            session.pop("inventura_sklad", None)
+            flash("Neplatný sklad.", "danger")
+            return redirect(url_for("inventura"))
         session["inventura_sklad"] = sklad
     else:
         sklad = current_user.sklad
@@ -1305,42 +1348,23 @@ def inventura():
         "ostatni": [UNIVERSAL_SIZE],
     }
 
+    # rozpočítaná inventura leží na serveru, zvlášť pro každý sklad
+    kind = inventura_kind(sklad)
+
     if request.method == "POST":
         zero_empty = request.form.get("zero_empty") == "on"
 
         if "save_inventura" in request.form:
-            session["inventura_data"] = _parse_qty_form(request.form, zero_empty)
-            session.modified = True
+            inv = _parse_qty_form(request.form, zero_empty)
+            commit_with_retry(lambda: save_draft(kind, inv))
             flash("Inventura dočasně uložena.", "success")
             return redirect(url_for("inventura", sklad=sklad))
 
         if "submit_inventura" in request.form:
-            session["inventura_data"] = _parse_qty_form(request.form, zero_empty)
-            session.modified = True
-
-            inv = session["inventura_data"]
-            diffs = []
-            
-            all_stock_records = Stock.query.filter_by(sklad=sklad).all()
-            stock_map = {(s.product_id, s.size): s.quantity for s in all_stock_records}
-            
-            for pid_str, sizes in inv.items():
-                pid = int(pid_str)
-                prod = Product.query.get(pid)
-                for size_str, new_qty in sizes.items():
-                    size = int(size_str)
-                    old_qty = stock_map.get((pid, size), 0)
-                    delta = new_qty - old_qty
-                    
-                    size_display = "-" if prod.category in ["doplnky", "ostatni"] else size
-                    if delta:
-                        diffs.append({
-                            "label": prod.variant_label,
-                            "size": size_display,
-                            "old": old_qty,
-                            "new": new_qty,
-                            "delta": delta
-                        })
+            inv = _parse_qty_form(request.form, zero_empty)
+            commit_with_retry(lambda: save_draft(kind, inv))
+            # jen buňky konceptu, ne celý sklad
+            diffs = cell_diffs(sklad, inv)
 
             return render_template(
                 "inventura.html",
@@ -1351,57 +1375,75 @@ def inventura():
             )
 
         if "confirm_inventura" in request.form:
-            inv = session.pop("inventura_data", {})
-            for pid_str, sizes in inv.items():
-                pid = int(pid_str)
-                for size_str, new_qty in sizes.items():
-                    size = int(size_str)
-                    st = Stock.query.filter_by(product_id=pid, sklad=sklad, size=size).first()
-                    old_qty = st.quantity if st else 0
-                    delta = new_qty - old_qty
-
-                    if st:
-                        st.quantity = new_qty
-                    else:
-                        db.session.add(Stock(product_id=pid, sklad=sklad, size=size, quantity=new_qty))
-                    if delta:
-                        db.session.add(History(
-                            user=current_user.username,
-                            sklad=sklad,
-                            product_id=pid,
-                            size=size,
-                            change_type="inventura",
-                            amount=delta,
-                            timestamp=datetime.now()
-                        ))
-            db.session.commit()
-            flash("Inventura potvrzena a uložena.", "success")
+            def potvrdit():
+                batch = confirm_inventura(sklad, get_draft(kind, {}), current_user.username)
+                delete_draft(kind)
+                return batch
+
+            batch = commit_with_retry(potvrdit)
+            flash(
+                f"Inventura č. {batch.id} potvrzena a uložena ({batch.changes} změn).",
+                "success"
+            )
             return redirect(url_for("inventura", sklad=sklad))
 
-    inv = session.get("inventura_data", {})
-    produkty = Product.query.order_by(Product.name).all()
-    
-    all_stock_records = Stock.query.filter_by(sklad=sklad).all()
-    stock_map = {(s.product_id, s.size): s.quantity for s in all_stock_records}
-
-    data_by_cat = {"saty": [], "boty": [], "doplnky": [], "ostatni": []}
-    for p in produkty:
-        kat = p.category
-        row = {
-            "product_id": p.id, "name": p.name, "color": p.color,
-            "back_solution": p.back_solution, "qtys": {}
-        }
-        for v in velikosti[kat]:
-            old_qty = stock_map.get((p.id, v), 0)
-            new_qty = inv.get(str(p.id), {}).get(str(v), None)
-            row["qtys"][v] = {"old": old_qty, "new": new_qty}
-        data_by_cat[kat].append(row)
+    inv = get_draft(kind, {})
+    snapshot = load_snapshot(sklad)
+
+    data_by_cat = {}
+    for kat, rows in snapshot.by_category.items():
+        data_by_cat[kat] = []
+        for p in rows:
+            row = {
+                "product_id": p.product_id, "name": p.name, "color": p.color,
+                "back_solution": p.back_solution, "qtys": {}
+            }
+            for v in velikosti[kat]:
+                new_qty = inv.get(str(p.product_id), {}).get(str(v), None)
+                row["qtys"][v] = {"old": p.qtys[v], "new": new_qty}
+            data_by_cat[kat].append(row)
 
     return render_template("inventura.html", mode="edit", sklad=sklad, sklady=sklady, velikosti=velikosti, data_by_cat=data_by_cat)
-    
+
+@app.route("/inventura/autosave", methods=["POST"])
+@login_required
+def inventura_autosave():
+    """
+    Průběžné ukládání inventury: jen změněné buňky.
+    Tělo: {"sklad": "Praha", "cells": [{"pid": 1, "size": 34, "qty": 4}, …]}
+    (qty null buňku vymaže). Vrací rozdíly proti skladu pro tyto buňky.
+    """
+    payload = request.get_json(silent=True) or {}
+    if current_user.role in ["admin", "Max"]:
+        sklad = payload.get("sklad")
+        if sklad not in ["Praha", "Brno", "Pardubice", "Ostrava"]:
+            return jsonify({"error": "Neznámý sklad."}), 400
+    else:
+        sklad = current_user.sklad
+        if not sklad or payload.get("sklad", sklad) != sklad:
+            return jsonify({"error": "Nemáte oprávnění k inventuře tohoto skladu."}), 403
+
+    try:
+        cells = parse_cells(payload.get("cells"))
+    except CellError as e:
+        return jsonify({"error": str(e)}), 400
+
+    kind = inventura_kind(sklad)
+    commit_with_retry(lambda: save_draft(kind, merge_cells(get_draft(kind, {}), cells)))
+
+    changed = {}
+    for pid, size, qty in cells:
+        if qty is not None:
+            changed.setdefault(str(pid), {})[str(size)] = qty
+    return jsonify({
+        "saved": len(cells),
+        "diffs": cell_diffs(sklad, changed),
+    })
+
 
 @app.route("/distribuce", methods=["GET", "POST"])
 @login_required
+@read_replica
 def distribuce():
     if current_user.role not in ['admin', 'Max']:
         flash("Nemáte oprávnění k přístupu do tohoto modulu.", "danger")
@@ -1409,9 +1451,17 @@ def distribuce():
 
     # --- 1. FILTRY ---
     kategorie = request.args.get('kategorie', 'saty')
-    # Nové intervaly: 7, 14, 30 dní
+    # Intervaly: 7, 14, 30, 60, 90 dní (volitelně stejné období loni)
     dny = int(request.args.get('dny', 14)) 
-    datum_od = datetime.now() - timedelta(days=dny)
+    loni = request.args.get('loni') == '1'
+    datum_do = datetime.now().date()
+    if loni:
+        try:
+            datum_do = datum_do.replace(year=datum_do.year - 1)
+        except ValueError:   # 29. 2.
+            datum_do = datum_do.replace(year=datum_do.year - 1, day=28)
+    # okno [od, do] včetně obou krajů = přesně `dny` dní
+    datum_od = datum_do - timedelta(days=dny - 1)
 
     # --- 2. ZPRACOVÁNÍ POST (Potvrzení vybraných skladů) ---
     if request.method == "POST":
@@ -1420,7 +1470,7 @@ def distribuce():
         
         if not target_warehouses:
             flash("Nebyl vybrán žádný cílový sklad pro vytvoření přesunu.", "warning")
-            return redirect(url_for('distribuce', kategorie=kategorie, dny=dny))
+            return redirect(url_for('distribuce', kategorie=kategorie, dny=dny, loni=int(loni)))
 
         transfers_to_create = {target: [] for target in target_warehouses}
 
@@ -1442,116 +1492,32 @@ def distribuce():
                     'product_id': p_id, 'size': size, 'qty': qty
                 })
 
-        # Reálné vytvoření Transferů
-        created_any = False
-        for target, items in transfers_to_create.items():
-            if items:
-                created_any = True
-                new_transfer = Transfer(
-                    source_sklad="Pardubice",
-                    target_sklad=target,
-                    status="v_tranzitu",
-                    created_by=current_user.username,
-                    created_at=datetime.now()
+        # Reálné vytvoření Transferů – odpis z Pardubic s kontrolou zásoby
+        transfers_to_create = {target: items for target, items in transfers_to_create.items() if items}
+
+        def zalozit():
+            for target, items in transfers_to_create.items():
+                create_transfer(
+                    "Pardubice", target,
+                    [(item['product_id'], item['size'], item['qty']) for item in items],
+                    current_user.username
                 )
-                db.session.add(new_transfer)
-                db.session.flush()
-
-                for item in items:
-                    ti = TransferItem(
-                        transfer_id=new_transfer.id,
-                        product_id=item['product_id'],
-                        size=item['size'],
-                        quantity=item['qty']
-                    )
-                    db.session.add(ti)
-
-                    # Odečtení z Pce
-                    stock_pce = Stock.query.filter_by(
-                        product_id=item['product_id'], sklad="Pardubice", size=item['size']
-                    ).first()
-                    if stock_pce:
-                        stock_pce.quantity -= item['qty']
-                        h = History(
-                            product_id=item['product_id'],
-                            sklad="Pardubice",
-                            user=current_user.username,
-                            change_type="PRESKLADNENI_VYSKLAD",
-                            amount=-item['qty'],
-                            size=item['size'],
-                            timestamp=datetime.now()
-                        )
-                        db.session.add(h)
-
-        if created_any:
-            db.session.commit()
+
+        if transfers_to_create:
+            try:
+                commit_with_retry(zalozit)
+            except ValueError as e:
+                db.session.rollback()
+                flash(f"{e} – žádné přeskladnění nebylo vytvořeno.", "danger")
+                return redirect(url_for('distribuce', kategorie=kategorie, dny=dny, loni=int(loni)))
             flash(f"Přeskladnění pro vybrané sklady ({', '.join(target_warehouses)}) byla vytvořena.", "success")
             return redirect(url_for('preskladneni_seznam'))
         else:
             flash("Nebyla zadána žádná množství k přesunu.", "info")
-            return redirect(url_for('distribuce', kategorie=kategorie, dny=dny))
+            return redirect(url_for('distribuce', kategorie=kategorie, dny=dny, loni=int(loni)))
 
     # --- 3. LOGIKA VÝPOČTU NÁVRHU (GET) ---
-    produkty = Product.query.filter_by(category=kategorie).order_by(Product.name).all()
-    velikosti_map = {"saty": list(range(32, 56, 2)), "boty": list(range(36, 43)), "doplnky": [0], "ostatni": [0]}
-    velikosti = velikosti_map.get(kategorie, [0])
-
-    # Historie (začíná na "vyskladn")
-    prodeje_raw = History.query.filter(
-        History.timestamp >= datum_od,
-        History.change_type.ilike("vyskladn%")
-    ).all()
-
-    sales_stats = {}
-    for h in prodeje_raw:
-        key = (h.product_id, h.size, h.sklad)
-        sales_stats[key] = sales_stats.get(key, 0) + abs(h.amount)
-
-    stocks_raw = Stock.query.all()
-    stock_map = {(s.product_id, s.size, s.sklad): s.quantity for s in stocks_raw}
-
-    def custom_round(val):
-        if val <= 0: return 0
-        if val < 1.0: return 1 # Speciální pravidlo uživatele
-        return int(val + 0.5) if (val - int(val)) >= 0.5 else int(val)
-
-    navrh_data = []
-    for p in produkty:
-        for v in velikosti:
-            pce_stock = stock_map.get((p.id, v, "Pardubice"), 0)
-            praha_stock = stock_map.get((p.id, v, "Praha"), 0)
-            brno_stock = stock_map.get((p.id, v, "Brno"), 0)
-            pce_sales = sales_stats.get((p.id, v, "Pardubice"), 0)
-            praha_sales = sales_stats.get((p.id, v, "Praha"), 0)
-            brno_sales = sales_stats.get((p.id, v, "Brno"), 0)
-
-            total_sales = pce_sales + praha_sales + brno_sales
-            total_available = pce_stock
-            if praha_sales > 0: total_available += praha_stock
-            if brno_sales > 0: total_available += brno_stock
-
-            navrh_praha = 0
-            navrh_brno = 0
-
-            if total_sales > 0 and total_available > 0:
-                if praha_sales > 0:
-                    share = (praha_sales / total_sales) * total_available
-                    navrh_praha = max(0, custom_round(share) - praha_stock)
-                if brno_sales > 0:
-                    share = (brno_sales / total_sales) * total_available
-                    navrh_brno = max(0, custom_round(share) - brno_stock)
-
-                while (navrh_praha + navrh_brno) > pce_stock:
-                    if navrh_praha >= navrh_brno and navrh_praha > 0: navrh_praha -= 1
-                    elif navrh_brno > 0: navrh_brno -= 1
-                    else: break
-
-            if pce_stock > 0 or navrh_praha > 0 or navrh_brno > 0:
-                navrh_data.append({
-                    'product': p, 'size': v,
-                    'pce_stock': pce_stock, 'pce_sales': pce_sales,
-                    'praha_stock': praha_stock, 'praha_sales': praha_sales, 'navrh_praha': navrh_praha,
-                    'brno_stock': brno_stock, 'brno_sales': brno_sales, 'navrh_brno': navrh_brno
-                })
+    # součty v SQL + výpočet nad NumPy poli (viz app/allocation.py)
+    navrh_data = build_proposal(kategorie, datum_od, datum_do)
 
-    return render_template("distribuce.html", data=navrh_data, kategorie=kategorie, dny=dny)
\ No newline at end of file
+    return render_template("distribuce.html", data=navrh_data, kategorie=kategorie, dny=dny, loni=loni)
\ No newline at end of file
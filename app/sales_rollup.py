@@ -0,0 +1,127 @@
+# app/sales_rollup.py
+#
+# Denní souhrn výdejů (tabulka outbound_daily).
+#
+# Distribuce počítá rychlost prodeje z oken 7–90 dní. Místo sčítání
+# tisíců řádků History se okno sečte z nejvýš N denních řádků na SKU.
+# Souhrn se udržuje průběžně: při zápisu výdejového řádku History
+# (ORM i hromadný insert přes ledger) se den/SKU/sklad navýší UPSERTem.
+# Celý souhrn lze přepočítat příkazem `python manage.py backfill-outbound`.
+
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import case, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.db_utils import dialect_insert
+from app.models import History, OutboundDaily
+
+
+# change_type výdejů přesně tak, jak je aplikace zapisuje (přeskladnění
+# z distribuce se dřív zapisovalo velkými písmeny). Rovnost místo
+# LOWER(...) LIKE umí obsloužit index ix_history_outbound.
+VYDEJ_TYPES = ("vyskladneni",)
+PRESUN_TYPES = ("preskladneni_vysklad", "PRESKLADNENI_VYSKLAD")
+OUTBOUND_TYPES = VYDEJ_TYPES + PRESUN_TYPES
+
+
+def classify(change_type):
+    """
+    'vydej' pro prodej, 'presun' pro odeslané přeskladnění, jinak None.
+    Stejné typy jako backfill a window_query, aby průběžný souhrn
+    i přepočet počítaly tytéž řádky.
+    """
+    if change_type in VYDEJ_TYPES:
+        return "vydej"
+    if change_type in PRESUN_TYPES:
+        return "presun"
+    return None
+
+
+def record_outbound(session, rows):
+    """rows = iterovatelné slovníky/objekty s atributy jako History."""
+    sums = defaultdict(lambda: {"vydej": 0, "presun": 0})
+    for r in rows:
+        get = r.get if isinstance(r, dict) else lambda k, r=r: getattr(r, k)
+        kind = classify(get("change_type"))
+        if not kind or get("product_id") is None or get("size") is None or not get("sklad"):
+            continue
+        ts = get("timestamp") or datetime.now()
+        sums[(ts.date(), get("product_id"), get("size"), get("sklad"))][kind] += abs(get("amount") or 0)
+    if not sums:
+        return
+
+    stmt = dialect_insert(OutboundDaily).values([
+        {"den": den, "product_id": pid, "size": size, "sklad": sklad, **vals}
+        for (den, pid, size, sklad), vals in sums.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OutboundDaily.den, OutboundDaily.product_id, OutboundDaily.size, OutboundDaily.sklad],
+        set_={
+            "vydej": OutboundDaily.vydej + stmt.excluded.vydej,
+            "presun": OutboundDaily.presun + stmt.excluded.presun,
+        }
+    )
+    session.execute(stmt)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_outbound(session, flush_context, instances):
+    rows = [obj for obj in session.new if isinstance(obj, History)]
+    if rows:
+        record_outbound(session, rows)
+
+
+def outbound_source(od=None):
+    """Výdejové řádky History pro souhrn: (den, SKU, sklad, výdej, přesun)."""
+    den = func.date(History.timestamp)
+    is_vydej = History.change_type.in_(VYDEJ_TYPES)
+    src = (
+        select(
+            den, History.product_id, History.size, History.sklad,
+            func.sum(case((is_vydej, func.abs(History.amount)), else_=0)),
+            func.sum(case((~is_vydej, func.abs(History.amount)), else_=0)),
+        )
+        .where(
+            History.change_type.in_(OUTBOUND_TYPES),
+            History.product_id.isnot(None), History.size.isnot(None), History.sklad.isnot(None)
+        )
+        .group_by(den, History.product_id, History.size, History.sklad)
+    )
+    if od is not None:
+        src = src.where(History.timestamp >= datetime.combine(od, datetime.min.time()))
+    return src
+
+
+def backfill(od=None):
+    """Přepočítá souhrn z History (od data `od`, jinak celý). Vrací počet řádků."""
+    q = OutboundDaily.query
+    if od is not None:
+        q = q.filter(OutboundDaily.den >= od)
+
+    q.delete(synchronize_session=False)
+    res = db.session.execute(
+        insert(OutboundDaily).from_select(
+            ["den", "product_id", "size", "sklad", "vydej", "presun"], outbound_source(od)
+        )
+    )
+    return res.rowcount
+
+
+def window_query(product_ids, od, do=None, kind="vydej"):
+    """SELECT součtů za okno dnů [od, do] po (product_id, size, sklad)."""
+    col = OutboundDaily.vydej if kind == "vydej" else OutboundDaily.presun
+    q = (
+        select(OutboundDaily.product_id, OutboundDaily.size, OutboundDaily.sklad, func.sum(col))
+        .where(OutboundDaily.den >= od, OutboundDaily.product_id.in_(product_ids))
+    )
+    if do is not None:
+        q = q.where(OutboundDaily.den <= do)
+    return q.group_by(OutboundDaily.product_id, OutboundDaily.size, OutboundDaily.sklad)
+
+
+def window_sums(product_ids, od, do=None, kind="vydej"):
+    """Součty za okno dnů [od, do] po (product_id, size, sklad)."""
+    return db.session.execute(window_query(product_ids, od, do, kind)).all()
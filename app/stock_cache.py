@@ -0,0 +1,231 @@
+# app/stock_cache.py
+#
+# Materializovaná matice zásob pro dashboard.
+#
+# Každý gunicorn worker drží v paměti pro každý sklad slovník
+# product_id -> {size: quantity} a poznámky (product_id, size) -> text.
+# Platnost se hlídá přes tabulku stock_version: po commitu transakce, která
+# měnila Stock, se verze dotčených skladů zvýší vlastní krátkou transakcí
+# (UPSERT version + 1). Řádek verze tak není zamčený po celou dobu zápisu
+# a souběžné zápisy do jednoho skladu na sebe nečekají. Verze se čte před
+# daty a zvyšuje až po commitu dat, takže matice nikdy nenese novější verzi
+# než data – nanejvýš se sklad načte jednou navíc.
+# Worker, který zápis provedl, si změnu rovnou propíše do své matice
+# (inkrementálně), ostatní workery verzi uvidí jako novější a sklad si
+# jedním dotazem načtou znovu.
+# Stejná verze je součástí klíče PDF cache inventury (viz app/pdf_cache.py).
+
+import threading
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import db
+from app.db_utils import dialect_insert
+from app.models import Stock, StockVersion
+from app.pdf_cache import drop_inventory
+
+SKLADY = ["Praha", "Brno", "Pardubice", "Ostrava"]
+CELKEM = "Celkem"
+
+_PENDING_KEY = "stock_matrix_pending"
+_VERSIONS_KEY = "stock_matrix_versions"
+
+
+class StockMatrix:
+    def __init__(self, version, qty=None, notes=None):
+        self.version = version
+        self.qty = qty if qty is not None else defaultdict(dict)
+        self.notes = notes if notes is not None else {}
+
+    def sizes_for(self, product_id):
+        """Kopie {size: qty} s kladným množstvím (jako HAVING SUM > 0)."""
+        return {s: q for s, q in self.qty.get(product_id, {}).items() if q > 0}
+
+    def apply(self, product_id, size, delta=0, note=None):
+        if delta:
+            sizes = self.qty[product_id]
+            sizes[size] = sizes.get(size, 0) + delta
+        if note is not None:
+            if note:
+                self.notes[(product_id, size)] = note
+            else:
+                self.notes.pop((product_id, size), None)
+
+    def drop_product(self, product_id):
+        self.qty.pop(product_id, None)
+        for key in [k for k in self.notes if k[0] == product_id]:
+            del self.notes[key]
+
+
+class StockMatrixCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrices = {}
+        self._celkem = None
+
+    # ---------------------------------------------------------------
+    #  čtení
+    # ---------------------------------------------------------------
+    def get(self, sklad):
+        versions = self._db_versions()
+
+        if sklad == CELKEM:
+            return self._get_celkem(versions)
+        return self._get_sklad(sklad, versions.get(sklad, 0))
+
+    def _db_versions(self):
+        rows = db.session.query(StockVersion.sklad, StockVersion.version).all()
+        return {s: v for s, v in rows}
+
+    def _get_sklad(self, sklad, version):
+        with self._lock:
+            m = self._matrices.get(sklad)
+        if m is not None and m.version == version:
+            return m
+
+        m = self._load(sklad, version)
+        with self._lock:
+            self._matrices[sklad] = m
+        return m
+
+    def _get_celkem(self, versions):
+        key = tuple(versions.get(s, 0) for s in SKLADY)
+        with self._lock:
+            cached = self._celkem
+        if cached is not None and cached.version == key:
+            return cached
+
+        celkem = StockMatrix(key)
+        for s in SKLADY:
+            m = self._get_sklad(s, versions.get(s, 0))
+            for pid, sizes in m.qty.items():
+                target = celkem.qty[pid]
+                for size, q in sizes.items():
+                    target[size] = target.get(size, 0) + q
+        # souhrnný pohled poznámky nemá (dřív se hledaly u skladu "Celkem")
+        with self._lock:
+            self._celkem = celkem
+        return celkem
+
+    def _load(self, sklad, version):
+        rows = (
+            db.session.query(Stock.product_id, Stock.size, Stock.quantity, Stock.note)
+            .filter(Stock.sklad == sklad)
+            .all()
+        )
+        m = StockMatrix(version)
+        for pid, size, qty, note in rows:
+            if qty:
+                m.qty[pid][size] = m.qty[pid].get(size, 0) + qty
+            if note:
+                m.notes[(pid, size)] = note
+        return m
+
+    # ---------------------------------------------------------------
+    #  zápis – volá se po commitu transakce, která zásoby měnila
+    # ---------------------------------------------------------------
+    def apply_committed(self, sklad, version, changes):
+        with self._lock:
+            m = self._matrices.get(sklad)
+            if m is None:
+                return
+            if m.version != version - 1:
+                # mezitím zapisoval jiný worker – sklad se načte znovu
+                del self._matrices[sklad]
+                return
+            for ch in changes:
+                if ch[0] == "drop":
+                    m.drop_product(ch[1])
+                else:
+                    _, pid, size, delta, note = ch
+                    m.apply(pid, size, delta, note)
+            m.version = version
+
+    def invalidate(self, sklad=None):
+        with self._lock:
+            if sklad is None:
+                self._matrices.clear()
+            else:
+                self._matrices.pop(sklad, None)
+            self._celkem = None
+
+
+stock_matrix = StockMatrixCache()
+
+
+# -------------------------------------------------------------
+#  API pro zapisující routy
+# -------------------------------------------------------------
+def _bump_version(sklad):
+    """Verze skladu se zvýší po commitu aktuální transakce (viz _bump_committed)."""
+    db.session.info.setdefault(_VERSIONS_KEY, set()).add(sklad)
+
+
+def _bump_committed(sklady):
+    """
+    Zvýší verze skladů vlastní krátkou transakcí mimo session a vrátí
+    {sklad: nová verze}. Chybějící řádek verze založí (UPSERT).
+    """
+    versions = {}
+    with db.engine.begin() as conn:
+        for sklad in sorted(sklady):
+            stmt = dialect_insert(StockVersion).values(sklad=sklad, version=1)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[StockVersion.sklad],
+                set_={"version": StockVersion.version + 1}
+            ).returning(StockVersion.version)
+            versions[sklad] = conn.execute(stmt).scalar_one()
+    return versions
+
+
+def record_stock_change(sklad, product_id, size, delta=0, note=None):
+    """
+    Zaznamená změnu zásoby/poznámky v aktuální transakci.
+    delta = změna množství, note = nový text poznámky (None = beze změny).
+    """
+    _bump_version(sklad)
+    pending = db.session.info.setdefault(_PENDING_KEY, defaultdict(list))
+    pending[sklad].append(("cell", product_id, size, delta, note))
+
+
+def record_catalog_change():
+    """Přidání/úprava produktu – mění výpisy skladů, ne množství (PDF cache)."""
+    for sklad in SKLADY:
+        _bump_version(sklad)
+
+
+def record_product_removed(product_id):
+    for sklad in SKLADY:
+        _bump_version(sklad)
+        pending = db.session.info.setdefault(_PENDING_KEY, defaultdict(list))
+        pending[sklad].append(("drop", product_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    sklady = session.info.pop(_VERSIONS_KEY, None)
+    if not sklady:
+        return
+    try:
+        versions = _bump_committed(sklady)
+    except SQLAlchemyError:
+        # data jsou zapsaná; ostatní workery změnu uvidí až s dalším zápisem
+        current_app.logger.exception("Nepodařilo se zvýšit verzi zásob %s", sorted(sklady))
+        for sklad in sklady:
+            stock_matrix.invalidate(sklad)
+            drop_inventory(sklad)
+        return
+    for sklad, version in versions.items():
+        stock_matrix.apply_committed(sklad, version, (pending or {}).get(sklad, []))
+        drop_inventory(sklad)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_rollback(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_VERSIONS_KEY, None)
@@ -0,0 +1,162 @@
+# app/transfers.py
+#
+# Založení a potvrzení přeskladnění po dávkách.
+#
+# Dřív stálo každá položka košíku několik dotazů (Product.query.get,
+# Stock...first(), INSERT History, INSERT TransferItem), takže přesun
+# o 200 řádcích udělal uvnitř jedné transakce stovky round-tripů.
+# Teď se změny zapíšou hromadně (viz ledger.post_movements); odpis ze
+# zdrojového skladu je podmíněný UPDATE, takže dostupnost se ověřuje
+# atomicky až při zápisu a souběžné přeskladnění ji nepřebije.
+#
+# Počty přeskladnění na cestě (badge v menu) se drží v tabulce
+# transfer_counter a mění se ve stejné transakci jako status přeskladnění.
+# Potvrzení si přeskladnění nejdřív zabere podmíněným UPDATE statusu
+# (jako PdfJob.claim), aby dvojí potvrzení nenaskladnilo zboží dvakrát.
+# Každý proces si je na IN_TRANSIT_TTL sekund podrží v paměti, takže
+# běžné zobrazení stránky se na ně databáze neptá.
+
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from app import db
+from app.db_utils import dialect_insert
+from app.ledger import InsufficientStock, post_movements
+from app.models import Product, Transfer, TransferCounter, TransferItem
+
+_COUNTS_DIRTY_KEY = "transfer_counts_dirty"
+_counts_lock = threading.Lock()
+_counts_cache = {"expires": 0.0, "counts": None}
+
+
+def _size_display(prod, size):
+    return "-" if prod.category in ["doplnky", "ostatni"] else size
+
+
+def create_transfer(source_sklad, target_sklad, items, user):
+    """
+    Založí přeskladnění a odepíše zboží ze zdrojového skladu.
+    items = seznam (product_id, size, qty); při nedostatku zásoby
+    vyhodí ValueError a nic nezapíše (commit/rollback je na volajícím).
+    """
+    items = [(int(pid), int(size), int(qty)) for pid, size, qty in items if int(qty) > 0]
+
+    pids = {pid for pid, _, _ in items}
+    produkty = {p.id: p for p in Product.query.filter(Product.id.in_(pids))} if pids else {}
+    for pid in pids:
+        if pid not in produkty:
+            raise ValueError(f"Neznámý produkt (ID {pid}).")
+
+    now = datetime.now()
+    transfer = Transfer(
+        source_sklad=source_sklad,
+        target_sklad=target_sklad,
+        created_by=user,
+        created_at=now
+    )
+    db.session.add(transfer)
+    db.session.flush()
+    record_in_transit(target_sklad, 1)
+
+    if items:
+        db.session.execute(insert(TransferItem), [
+            {"transfer_id": transfer.id, "product_id": pid, "size": size, "quantity": qty}
+            for pid, size, qty in items
+        ])
+        # stejná položka může být v košíku vícekrát – post_movements je sečte
+        try:
+            post_movements([
+                {
+                    "user": user, "sklad": source_sklad, "product_id": pid, "size": size,
+                    "amount": -qty, "change_type": "preskladneni_vysklad", "timestamp": now,
+                }
+                for pid, size, qty in items
+            ], check_stock=True)
+        except InsufficientStock as e:
+            prod = produkty[e.product_id]
+            raise ValueError(f"Nedostatek zásoby: {prod.name}, vel. {_size_display(prod, e.size)}")
+    return transfer
+
+
+def confirm_transfer(transfer, user):
+    """
+    Naskladní položky přeskladnění do cílového skladu a označí ho jako
+    potvrzené. Status se přepne podmíněným UPDATE (jen z "v_tranzitu"),
+    takže ze dvou souběžných potvrzení naskladní jen jedno. Vrací True,
+    pokud přeskladnění potvrdilo toto volání. Commit je na volajícím.
+    """
+    now = datetime.now()
+    claimed = (
+        Transfer.query
+        .filter(Transfer.id == transfer.id, Transfer.status == "v_tranzitu")
+        .update(
+            {"status": "potvrzeno", "confirmed_by": user, "confirmed_at": now},
+            synchronize_session=False
+        )
+    )
+    db.session.expire(transfer, ["status", "confirmed_by", "confirmed_at"])
+    if claimed != 1:
+        return False
+
+    polozky = (
+        db.session.query(TransferItem.product_id, TransferItem.size, TransferItem.quantity)
+        .filter(TransferItem.transfer_id == transfer.id)
+        .all()
+    )
+    post_movements([
+        {
+            "user": user, "sklad": transfer.target_sklad, "product_id": pid, "size": size,
+            "amount": qty, "change_type": "preskladneni_nasklad", "timestamp": now,
+        }
+        for pid, size, qty in polozky
+    ])
+    record_in_transit(transfer.target_sklad, -1)
+    return True
+
+
+# -------------------------------------------------------------
+#  Počty přeskladnění na cestě
+# -------------------------------------------------------------
+def record_in_transit(target_sklad, delta):
+    """Změní počet přeskladnění na cestě do skladu v aktuální transakci."""
+    stmt = dialect_insert(TransferCounter).values(target_sklad=target_sklad, in_transit=delta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TransferCounter.target_sklad],
+        set_={"in_transit": TransferCounter.in_transit + stmt.excluded.in_transit}
+    )
+    db.session.execute(stmt)
+    db.session.info[_COUNTS_DIRTY_KEY] = True
+
+
+def in_transit_counts():
+    """{cílový sklad: počet na cestě}; v paměti procesu na IN_TRANSIT_TTL sekund."""
+    now = time.monotonic()
+    with _counts_lock:
+        if _counts_cache["counts"] is not None and _counts_cache["expires"] > now:
+            return _counts_cache["counts"]
+
+    counts = {
+        sklad: n for sklad, n in
+        db.session.query(TransferCounter.target_sklad, TransferCounter.in_transit)
+    }
+    with _counts_lock:
+        _counts_cache["counts"] = counts
+        _counts_cache["expires"] = now + current_app.config["IN_TRANSIT_TTL"]
+    return counts
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_counts(session):
+    if session.info.pop(_COUNTS_DIRTY_KEY, None):
+        with _counts_lock:
+            _counts_cache["counts"] = None
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_counts(session, previous_transaction):
+    session.info.pop(_COUNTS_DIRTY_KEY, None)
@@ -0,0 +1,115 @@
+# app/user_cache.py
+#
+# Krátkodobý cache uživatelů pro Flask-Login.
+#
+# load_user() se volá na každém požadavku; dřív pokaždé User.query.get.
+# Teď si proces drží odpojenou kopii záznamu na USER_CACHE_TTL sekund a do
+# session ji vrací přes merge(load=False) – místo celého řádku user se
+# čte jen jeho verze z tabulky user_version (primární klíč, jedno číslo).
+# Změna nebo smazání uživatele (edit_user, delete_user, změna hesla)
+# po commitu zvýší verzi vlastní krátkou transakcí (jako stock_version,
+# viz app/stock_cache.py). Ostatní procesy tak zastaralou kopii – starou
+# roli, heslo nebo smazaného uživatele – zahodí hned na dalším požadavku,
+# ne až po uplynutí TTL. Verze se čte před daty, takže kopie nikdy nenese
+# novější verzi než data.
+
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app import db
+from app.db_utils import dialect_insert
+from app.models import User, UserVersion
+
+_DIRTY_KEY = "user_cache_dirty"
+_lock = threading.Lock()
+_users = {}   # id -> (platnost_do, verze, odpojená kopie User)
+
+
+def _detached_copy(user):
+    copy = User(
+        id=user.id, username=user.username, password=user.password,
+        role=user.role, sklad=user.sklad
+    )
+    make_transient_to_detached(copy)
+    return copy
+
+
+def _db_version(user_id):
+    return (
+        db.session.query(UserVersion.version)
+        .filter(UserVersion.user_id == user_id)
+        .scalar()
+    ) or 0
+
+
+def get_user(user_id):
+    now = time.monotonic()
+    version = _db_version(user_id)
+    with _lock:
+        hit = _users.get(user_id)
+    if hit and hit[0] > now and hit[1] == version:
+        return db.session.merge(hit[2], load=False)
+
+    user = db.session.get(User, user_id)
+    with _lock:
+        if user is None:
+            _users.pop(user_id, None)
+        else:
+            _users[user_id] = (
+                now + current_app.config["USER_CACHE_TTL"], version, _detached_copy(user)
+            )
+    return user
+
+
+def invalidate(user_id=None):
+    with _lock:
+        if user_id is None:
+            _users.clear()
+        else:
+            _users.pop(user_id, None)
+
+
+def _bump_committed(user_ids):
+    """Zvýší verze uživatelů vlastní krátkou transakcí mimo session (UPSERT)."""
+    with db.engine.begin() as conn:
+        for user_id in sorted(user_ids):
+            stmt = dialect_insert(UserVersion).values(user_id=user_id, version=1)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[UserVersion.user_id],
+                set_={"version": UserVersion.version + 1}
+            )
+            conn.execute(stmt)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changed_users(session, flush_context, instances):
+    ids = {
+        obj.id for obj in list(session.dirty) + list(session.deleted)
+        if isinstance(obj, User) and obj.id is not None
+    }
+    if ids:
+        session.info.setdefault(_DIRTY_KEY, set()).update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    user_ids = session.info.pop(_DIRTY_KEY, None)
+    if not user_ids:
+        return
+    for user_id in user_ids:
+        invalidate(user_id)
+    try:
+        _bump_committed(user_ids)
+    except SQLAlchemyError:
+        # změna je zapsaná; ostatní procesy kopii obnoví po uplynutí TTL
+        current_app.logger.exception("Nepodařilo se zvýšit verzi uživatelů %s", sorted(user_ids))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_rollback(session, previous_transaction):
+    session.info.pop(_DIRTY_KEY, None)
@@ -0,0 +1,109 @@
+# app/warehouse_snapshot.py
+#
+# Stav jednoho skladu pro výpisy (PDF inventury, CSV export, inventura).
+#
+# Katalog i zásoby skladu se načtou jedním dotazem: Product LEFT JOIN Stock
+# (jen daný sklad), seřazeno podle kategorie a názvu. Řádky se seskupí po
+# produktech do SnapshotRow s množstvím pro každou velikost kategorie.
+# Počet dotazů tak nezávisí na velikosti katalogu – dřív export PDF dělal
+# jeden SELECT na každou kombinaci produkt × velikost.
+
+from sqlalchemy import and_, case
+
+from app import db
+from app.models import Product, Stock
+
+UNIVERSAL_SIZE = 0
+
+VELIKOSTI = {
+    "saty":    list(range(32, 56, 2)),
+    "boty":    list(range(36, 43)),
+    "doplnky": [UNIVERSAL_SIZE],
+    "ostatni": [UNIVERSAL_SIZE],
+}
+
+KATEGORIE = ["saty", "boty", "doplnky", "ostatni"]
+
+
+class SnapshotRow:
+    __slots__ = ("product_id", "name", "color", "back_solution", "category", "qtys")
+
+    def __init__(self, product_id, name, color, back_solution, category):
+        self.product_id = product_id
+        self.name = name
+        self.color = color
+        self.back_solution = back_solution
+        self.category = category
+        # všechny velikosti kategorie, chybějící řádek Stock = 0
+        self.qtys = {v: 0 for v in VELIKOSTI[category]}
+
+    @property
+    def variant_label(self):
+        parts = [self.name]
+        if self.color:
+            parts.append(self.color)
+        if self.back_solution:
+            parts.append(self.back_solution)
+        return "-".join(parts)
+
+    @property
+    def total(self):
+        return sum(self.qtys.values())
+
+
+class WarehouseSnapshot:
+    def __init__(self, sklad):
+        self.sklad = sklad
+        self.velikosti = VELIKOSTI
+        self.by_category = {k: [] for k in KATEGORIE}
+        self.by_id = {}
+
+    def add(self, row):
+        self.by_category[row.category].append(row)
+        self.by_id[row.product_id] = row
+
+    def qty(self, product_id, size):
+        row = self.by_id.get(product_id)
+        return row.qtys.get(size, 0) if row else 0
+
+
+def iter_rows(sklad, stream=False):
+    """
+    Generátor SnapshotRow po produktech (pořadí kategorií jako KATEGORIE,
+    uvnitř podle názvu). stream=True čte po dávkách (pro CSV export).
+    """
+    poradi = case({k: i for i, k in enumerate(KATEGORIE)}, value=Product.category)
+    query = (
+        db.session.query(
+            Product.id, Product.name, Product.color, Product.back_solution, Product.category,
+            Stock.size, Stock.quantity
+        )
+        .outerjoin(Stock, and_(
+            Stock.product_id == Product.id,
+            Stock.sklad == sklad,
+            Stock.size.isnot(None)
+        ))
+        .filter(Product.category.in_(KATEGORIE))
+        .order_by(poradi, Product.name, Product.id)
+    )
+    if stream:
+        query = query.execution_options(stream_results=True, yield_per=1000)
+
+    row = None
+    for pid, name, color, back_solution, category, size, qty in query:
+        if row is None or row.product_id != pid:
+            if row is not None:
+                yield row
+            row = SnapshotRow(pid, name, color, back_solution, category)
+        if size in row.qtys:
+            row.qtys[size] += qty or 0
+    if row is not None:
+        yield row
+
+
+def load_snapshot(sklad):
+    """Celý stav skladu jako WarehouseSnapshot (jeden dotaz)."""
+    snapshot = WarehouseSnapshot(sklad)
+    for row in iter_rows(sklad):
+        snapshot.add(row)
+    return snapshot
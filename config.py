@@ -2,9 +2,79 @@
 import os
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+
+def _env_bool(name, default):
+    raw = os.environ.get(name)
+    if raw is None or raw == '':
+        return default
+    return raw.lower() in ('1', 'true', 'yes')
+
+
+def engine_options(url):
+    """
+    Nastavení enginu pro databázi `url` z proměnných prostředí.
+    Velikost poolu platí jen pro server (PostgreSQL); SQLite si pool
+    volí sám. DB_STATEMENT_TIMEOUT_MS (0 = bez limitu) jen pro PostgreSQL.
+    """
+    options = {
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE') or 1800),
+    }
+    if url.startswith('sqlite'):
+        return options
+
+    options.update({
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 5),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 10),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT') or 30),
+    })
+    timeout_ms = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 0)
+    if timeout_ms and url.startswith('postgres'):
+        options['connect_args'] = {'options': f'-c statement_timeout={timeout_ms}'}
+    return options
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-fallback-key'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # volitelná replika jen pro čtení – reporty (historie, roční prodeje,
+    # distribuce) na ni posílají dotazy GET požadavků (viz app/db_routing.py)
+    SQLALCHEMY_BINDS = {
+        'replica': {'url': os.environ['DATABASE_REPLICA_URL'],
+                    **engine_options(os.environ['DATABASE_REPLICA_URL'])},
+    } if os.environ.get('DATABASE_REPLICA_URL') else {}
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite profil pro menší pobočky (viz app/db_utils.py) – pragmy při připojení
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_MMAP_MB = int(os.environ.get('SQLITE_MMAP_MB') or 64)
+    SQLITE_CACHE_MB = int(os.environ.get('SQLITE_CACHE_MB') or 16)
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    # kolikrát zopakovat zápis, který narazil na zamčenou databázi
+    SQLITE_BUSY_RETRIES = int(os.environ.get('SQLITE_BUSY_RETRIES') or 3)
+
+    # Generování PDF na pozadí (viz app/pdf_jobs.py a `python manage.py worker`)
+    PDF_JOB_DIR = os.environ.get('PDF_JOB_DIR') or os.path.join(basedir, 'instance', 'pdf_jobs')
+    PDF_WORKER_CONCURRENCY = int(os.environ.get('PDF_WORKER_CONCURRENCY') or 1)
+    PDF_JOB_MAX_AGE_HOURS = int(os.environ.get('PDF_JOB_MAX_AGE_HOURS') or 24)
+    # bez zvláštního procesu (vývoj, `flask run`) se úlohy zpracují rovnou
+    # v požadavku; nasazení s procesem `worker` z Procfile nastaví
+    # PDF_JOBS_INLINE=0
+    PDF_JOBS_INLINE = _env_bool('PDF_JOBS_INLINE', True)
+    # úloha, kterou do tolika sekund žádný worker nezačal, skončí chybou
+    PDF_JOB_QUEUE_TIMEOUT = int(os.environ.get('PDF_JOB_QUEUE_TIMEOUT') or 300)
+    # cache hotových PDF (viz app/pdf_cache.py)
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR') or os.path.join(basedir, 'instance', 'pdf_cache')
+    PDF_CACHE_MAX_MB = int(os.environ.get('PDF_CACHE_MAX_MB') or 200)
+
+    # krátkodobé cache v procesu (sekundy) – přihlášený uživatel a badge přeskladnění
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 30)
+    IN_TRANSIT_TTL = int(os.environ.get('IN_TRANSIT_TTL') or 10)
+
+    # rozpracovaný košík a inventura na serveru (viz app/drafts.py) – platnost ve dnech
+    DRAFT_TTL_DAYS = int(os.environ.get('DRAFT_TTL_DAYS') or 7)
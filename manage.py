@@ -1,9 +1,24 @@
 #!/usr/bin/env python
 import os
+import time
+import multiprocessing
 import click
+from datetime import datetime, timedelta
+from flask import render_template
 from flask.cli import FlaskGroup, with_appcontext
+from sqlalchemy import select, func, event
 from app import app, db
-from app.models import User
+from app.models import User, Product, History, Stock, Transfer, PdfJob
+from app import pdf_jobs
+from app.pdf_cache import pdf_cache
+from app.pdf_exports import inventory_html
+from app.pdf_renderer import get_renderer
+from app.exports import inventory_rows
+from app.warehouse_snapshot import load_snapshot
+from app.ledger import take_snapshot, verify_against_snapshot
+from app.transfers import create_transfer, confirm_transfer
+from app.sales_rollup import backfill as backfill_rollup
+from app.drafts import purge_expired as purge_expired_drafts
 from flask_migrate import Migrate
 
 # --- 1) Inicializace Flask-Migrate ---
@@ -31,12 +46,651 @@ def create_admin(username, password, role, sklad):
     db.session.commit()
     click.secho(f"✅ Admin '{username}' vytvořen s rolí '{role}' a skladem '{sklad}'.", fg="green")
 
+# --- 2b) Plány dotazů pro nejzatíženější stránky ---
+def _hot_queries():
+    from app.models import StockVersion, TransferCounter
+    from app.product_search import search_condition
+    from app.sales_rollup import outbound_source, window_query
+
+    od = datetime.now() - timedelta(days=60)
+    return [
+        ("historie – výchozí výpis",
+         select(History).where(History.timestamp >= od)
+         .order_by(History.timestamp.desc(), History.id.desc()).limit(50)),
+        ("historie – filtr uživatele",
+         select(History).where(History.user == "admin", History.timestamp >= od)
+         .order_by(History.timestamp.desc()).limit(50)),
+        ("historie – filtr skladu",
+         select(History).where(History.sklad == "Praha", History.timestamp >= od)
+         .order_by(History.timestamp.desc()).limit(50)),
+        ("historie – filtr produktu (index vyhledávání)",
+         select(History).where(
+             History.product_id.in_(select(Product.id).where(search_condition("amanda cerna"))),
+             History.timestamp >= od
+         ).order_by(History.timestamp.desc()).limit(50)),
+        ("výběr produktu – hledání, jen skladem",
+         select(Product).where(
+             search_condition("amanda"),
+             Product.id.in_(select(Stock.product_id).where(
+                 Stock.sklad == "Praha", Stock.size.isnot(None), Stock.quantity > 0
+             ))
+         ).order_by(Product.name, Product.id).limit(21)),
+        ("distribuce – okno výdejů (outbound_daily)",
+         window_query([1, 2, 3], (datetime.now() - timedelta(days=29)).date())),
+        ("backfill-outbound – výdeje z deníku",
+         outbound_source((datetime.now() - timedelta(days=30)).date())),
+        ("badge – přeskladnění na cestě",
+         select(TransferCounter.target_sklad, TransferCounter.in_transit)),
+        ("dashboard – verze zásob",
+         select(StockVersion.sklad, StockVersion.version)),
+        ("dashboard / export – zásoby skladu",
+         select(Stock.product_id, Stock.size, Stock.quantity).where(Stock.sklad == "Praha")),
+    ]
+
+
+@click.command("explain-hot-queries")
+@with_appcontext
+def explain_hot_queries():
+    """
+    Vypíše plán (EXPLAIN) pro nejčastější dotazy aplikace.
+    Použití: python manage.py explain-hot-queries
+    """
+    dialect = db.engine.dialect
+    if dialect.name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect.name == "postgresql":
+        prefix = "EXPLAIN "
+    else:
+        click.secho(f"⚠️ Databáze '{dialect.name}' není podporována.", fg="yellow")
+        return
+
+    with db.engine.connect() as conn:
+        for nazev, stmt in _hot_queries():
+            compiled = stmt.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+            params = compiled.params
+            if compiled.positional:
+                params = tuple(params[k] for k in compiled.positiontup)
+
+            click.secho(f"\n== {nazev} ==", fg="cyan", bold=True)
+            for row in conn.exec_driver_sql(prefix + str(compiled), params):
+                line = row[-1]
+                full_scan = (
+                    "Seq Scan" in line
+                    or (line.startswith("SCAN") and "INDEX" not in line)
+                )
+                click.secho(f"  {line}", fg="red" if full_scan else None)
+
+@click.command("stock-snapshot")
+@click.option("--verify/--no-verify", default=True, help="Před snímkem porovnat Stock s deníkem")
+@with_appcontext
+def stock_snapshot(verify):
+    """
+    Uloží snímek zásob pro dotazy na stav k datu (spouštět periodicky, např. v noci).
+    Použití: python manage.py stock-snapshot [--no-verify]
+    """
+    if verify:
+        drift = verify_against_snapshot()
+        for sklad, pid, size, ocekavano, skutecnost in drift:
+            click.secho(
+                f"⚠️ {sklad} / produkt {pid} / vel. {size}: deník {ocekavano}, Stock {skutecnost}",
+                fg="yellow"
+            )
+        if not drift:
+            click.secho("✅ Stock odpovídá poslednímu snímku a deníku.", fg="green")
+
+    pocet = take_snapshot()
+    db.session.commit()
+    click.secho(f"✅ Snímek uložen ({pocet} řádků).", fg="green")
+
+@click.command("bench-transfers")
+@click.option("--sizes", default="10,50,200", help="Počty řádků přeskladnění, čárkou oddělené")
+@with_appcontext
+def bench_transfers(sizes):
+    """
+    Změří počet dotazů a čas založení + potvrzení přeskladnění podle velikosti.
+    Vše běží v transakci, která se na konci vrátí (databáze zůstane beze změny).
+    Použití: python manage.py bench-transfers [--sizes 10,50,200]
+    """
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _count)
+    try:
+        click.echo(f"{'řádků':>6} {'založení':>18} {'potvrzení':>18}")
+        for n in [int(x) for x in sizes.split(",")]:
+            # testovací produkty se zásobou ve zdrojovém skladu
+            produkty = [Product(name=f"__bench_{i}", category="boty") for i in range(n)]
+            db.session.add_all(produkty)
+            db.session.flush()
+            db.session.add_all([
+                Stock(product_id=p.id, sklad="Pardubice", size=36, quantity=5) for p in produkty
+            ])
+            db.session.flush()
+            items = [(p.id, 36, 1) for p in produkty]
+
+            statements.clear()
+            t0 = time.perf_counter()
+            transfer = create_transfer("Pardubice", "Brno", items, "bench")
+            db.session.flush()
+            t_create, q_create = time.perf_counter() - t0, len(statements)
+
+            statements.clear()
+            t0 = time.perf_counter()
+            confirm_transfer(transfer, "bench")
+            db.session.flush()
+            t_confirm, q_confirm = time.perf_counter() - t0, len(statements)
+
+            click.echo(
+                f"{n:>6} {q_create:>5} dotazů {t_create * 1000:>6.1f} ms"
+                f" {q_confirm:>5} dotazů {t_confirm * 1000:>6.1f} ms"
+            )
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _count)
+        db.session.rollback()
+
+@click.command("backfill-outbound")
+@click.option("--od", "od_str", default=None, help="Přepočítat jen od data (dd.mm.rrrr)")
+@with_appcontext
+def backfill_outbound(od_str):
+    """
+    Přepočítá denní souhrn výdejů (outbound_daily) z historie.
+    Použití: python manage.py backfill-outbound [--od 01.01.2026]
+    """
+    od = datetime.strptime(od_str, "%d.%m.%Y").date() if od_str else None
+    pocet = backfill_rollup(od)
+    db.session.commit()
+    click.secho(f"✅ Denní souhrn výdejů přepočítán ({pocet} řádků).", fg="green")
+
+@click.command("worker")
+@click.option("--concurrency", type=int, default=None,
+              help="Počet souběžných procesů (výchozí PDF_WORKER_CONCURRENCY)")
+@click.option("--poll", default=1.0, help="Interval dotazování fronty v sekundách")
+@click.option("--once", is_flag=True, help="Zpracovat frontu a skončit")
+@with_appcontext
+def worker(concurrency, poll, once):
+    """
+    Zpracovává frontu úloh generování PDF (tabulka pdf_job).
+    Použití: python manage.py worker [--concurrency 2] [--poll 1.0] [--once]
+    """
+    concurrency = concurrency or app.config["PDF_WORKER_CONCURRENCY"]
+    click.secho(f"🛠️ Worker PDF spuštěn ({concurrency} procesů).", fg="green")
+
+    if concurrency <= 1:
+        _pdf_worker_loop(0, poll, once)
+        return
+
+    # každý proces si otevře vlastní spojení do DB (po forku se nesdílí)
+    db.engine.dispose()
+    procesy = [
+        multiprocessing.Process(target=_pdf_worker_loop, args=(i, poll, once))
+        for i in range(concurrency)
+    ]
+    for p in procesy:
+        p.start()
+    try:
+        for p in procesy:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procesy:
+            p.terminate()
+
+def _pdf_worker_loop(index, poll, once):
+    def _hlaseni(job):
+        if job.status == "hotovo":
+            click.echo(
+                f"✅ {job.kind} {job.id[:8]} ({job.filename}): fronta {job.queue_ms} ms,"
+                f" HTML {job.build_ms} ms, PDF {job.render_ms} ms, {job.size_bytes / 1024:.0f} kB"
+            )
+        else:
+            click.secho(f"❌ {job.kind} {job.id[:8]}: {job.error}", fg="red")
+
+    db.engine.dispose()
+    with app.app_context(), app.test_request_context():
+        t0 = time.perf_counter()
+        get_renderer().warm_up()
+        click.echo(f"🔥 Renderer PDF připraven ({(time.perf_counter() - t0) * 1000:.0f} ms).")
+        try:
+            pdf_jobs.work(pdf_jobs.worker_name(index), poll=poll, once=once, on_job=_hlaseni)
+        except KeyboardInterrupt:
+            pass
+
+@click.command("pdf-jobs")
+@click.option("--hodin", default=24, help="Za kolik posledních hodin")
+@with_appcontext
+def pdf_jobs_stats(hodin):
+    """
+    Souhrn časů úloh generování PDF podle typu.
+    Použití: python manage.py pdf-jobs [--hodin 24]
+    """
+    od = datetime.now() - timedelta(hours=hodin)
+    jobs = PdfJob.query.filter(PdfJob.created_at >= od).all()
+    if not jobs:
+        click.secho("ℹ️ Žádné úlohy v daném období.", fg="yellow")
+        return
+
+    stavy = {}
+    for job in jobs:
+        stavy[job.status] = stavy.get(job.status, 0) + 1
+    click.echo("Stav fronty: " + ", ".join(f"{k} {v}" for k, v in sorted(stavy.items())))
+
+    click.echo(f"{'typ':<10} {'počet':>6} {'fronta ms':>10} {'HTML ms':>9} {'PDF ms':>8} {'max PDF':>8}")
+    for kind in sorted({j.kind for j in jobs}):
+        hotove = [j for j in jobs if j.kind == kind and j.status == "hotovo"]
+        if not hotove:
+            continue
+        n = len(hotove)
+        click.echo(
+            f"{kind:<10} {n:>6} {sum(j.queue_ms for j in hotove) / n:>10.0f}"
+            f" {sum(j.build_ms for j in hotove) / n:>9.0f}"
+            f" {sum(j.render_ms for j in hotove) / n:>8.0f}"
+            f" {max(j.render_ms for j in hotove):>8}"
+        )
+
+@click.command("pdf-cache")
+@click.option("--clear", is_flag=True, help="Smazat všechny uložené PDF")
+@with_appcontext
+def pdf_cache_cmd(clear):
+    """
+    Zobrazí obsazení diskové cache PDF (případně ji vyprázdní).
+    Použití: python manage.py pdf-cache [--clear]
+    """
+    if clear:
+        pdf_cache.clear()
+        click.secho("🗑️ Cache PDF vyprázdněna.", fg="green")
+    st = pdf_cache.stats()
+    click.echo(
+        f"Souborů: {st['files']}, {st['bytes'] / 1024 / 1024:.1f} MB"
+        f" z {st['limit_bytes'] / 1024 / 1024:.0f} MB"
+    )
+
+@click.command("check-inventory-queries")
+@click.option("--sizes", default="10,100,500", help="Počty testovacích produktů, čárkou oddělené")
+@with_appcontext
+def check_inventory_queries(sizes):
+    """
+    Ověří, že sestavení inventury (PDF, CSV, obrazovka) má konstantní počet
+    dotazů bez ohledu na velikost katalogu. Při rozdílu skončí s chybou.
+    Vše běží v transakci, která se na konci vrátí.
+    Použití: python manage.py check-inventory-queries [--sizes 10,100,500]
+    """
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    kroky = {
+        "snímek": lambda: load_snapshot("Praha"),
+        "HTML pro PDF": lambda: inventory_html("Praha"),
+        "CSV": lambda: list(inventory_rows("Praha")),
+    }
+    vysledky = {nazev: set() for nazev in kroky}
+
+    event.listen(db.engine, "before_cursor_execute", _count)
+    try:
+        click.echo(f"{'produktů':>9} " + " ".join(f"{nazev:>13}" for nazev in kroky))
+        with app.test_request_context():
+            for n in [int(x) for x in sizes.split(",")]:
+                kategorie = ["saty", "boty", "doplnky", "ostatni"]
+                produkty = [
+                    Product(name=f"__check_{n}_{i}", category=kategorie[i % 4]) for i in range(n)
+                ]
+                db.session.add_all(produkty)
+                db.session.flush()
+                db.session.add_all([
+                    Stock(product_id=p.id, sklad="Praha", size=36 if p.category == "boty" else 0, quantity=1)
+                    for p in produkty
+                ])
+                db.session.flush()
+
+                radek = []
+                for nazev, krok in kroky.items():
+                    statements.clear()
+                    krok()
+                    vysledky[nazev].add(len(statements))
+                    radek.append(f"{len(statements):>6} dotazů")
+                click.echo(f"{n:>9} " + " ".join(f"{r:>13}" for r in radek))
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _count)
+        db.session.rollback()
+
+    rozdilne = [nazev for nazev, pocty in vysledky.items() if len(pocty) > 1]
+    if rozdilne:
+        click.secho(f"❌ Počet dotazů roste s katalogem: {', '.join(rozdilne)}", fg="red")
+        raise SystemExit(1)
+    click.secho("✅ Počet dotazů nezávisí na velikosti katalogu.", fg="green")
+
+@click.command("bench-pdf")
+@click.option("--rows", default="20,200,1000", help="Počty řádků inventury, čárkou oddělené")
+@click.option("--repeat", default=3, help="Počet opakování pro každou velikost")
+@with_appcontext
+def bench_pdf(rows, repeat):
+    """
+    Porovná studený render PDF (styly a fonty pokaždé znovu, jako dřív)
+    s předehřátým rendererem z app/pdf_renderer.py podle počtu stran.
+    Použití: python manage.py bench-pdf [--rows 20,200,1000] [--repeat 3]
+    """
+    from weasyprint import CSS, HTML
+    from weasyprint.text.fonts import FontConfiguration
+    from app.pdf_renderer import BASE_URL, PDF_CSS_DIR, static_url_fetcher
+
+    template = "export_inventory.html"
+    css_file = os.path.join(PDF_CSS_DIR, "export_inventory.css")
+    velikosti = {"saty": list(range(32, 56, 2)), "boty": list(range(36, 43)), "doplnky": [0], "ostatni": [0]}
+
+    def cold(html):
+        font_config = FontConfiguration()
+        return HTML(string=html, base_url=BASE_URL, url_fetcher=static_url_fetcher).write_pdf(
+            stylesheets=[CSS(filename=css_file, font_config=font_config)], font_config=font_config
+        )
+
+    with app.test_request_context():
+        t0 = time.perf_counter()
+        renderer = get_renderer()
+        renderer.warm_up()
+        click.echo(f"Inicializace rendereru: {(time.perf_counter() - t0) * 1000:.0f} ms")
+        click.echo(f"{'řádků':>6} {'stran':>6} {'studený ms':>11} {'teplý ms':>9} {'zrychlení':>10}")
+
+        for n in [int(x) for x in rows.split(",")]:
+            saty = [
+                {"name": f"Šaty {i}", "color": "černá", "back_solution": "zip",
+                 "sizes": {v: i % 3 for v in velikosti["saty"]}}
+                for i in range(n)
+            ]
+            html = render_template(
+                template, sklad="Benchmark", velikosti=velikosti,
+                products_by_category={"saty": saty, "boty": [], "doplnky": [], "ostatni": []}
+            )
+            stran = len(HTML(string=html).render(
+                stylesheets=renderer.stylesheets.get(template), font_config=renderer.font_config
+            ).pages)
+
+            casy = {"cold": [], "warm": []}
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                cold(html)
+                casy["cold"].append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                renderer.render(html, template)
+                casy["warm"].append(time.perf_counter() - t0)
+
+            studeny = min(casy["cold"]) * 1000
+            teply = min(casy["warm"]) * 1000
+            click.echo(f"{n:>6} {stran:>6} {studeny:>11.0f} {teply:>9.0f} {studeny / max(teply, 0.001):>9.2f}x")
+
+@click.command("bench-sqlite-writers")
+@click.option("--writers", default="1,2,4,8", help="Počty souběžných zapisujících, čárkou oddělené")
+@click.option("--ops", default=200, help="Počet zápisů (naskladnění) na jednoho zapisujícího")
+@with_appcontext
+def bench_sqlite_writers(writers, ops):
+    """
+    Propustnost souběžných zápisů do SQLite bez profilu (výchozí rollback
+    journal) a s profilem z app/db_utils.py (WAL, pragmy, opakování při
+    zámku). Každý zápis = řádek History + UPSERT Stock v jedné transakci,
+    jako naskladnit(); souběžně běží jeden čtenář se součtem skladu.
+    Pracuje v dočasném souboru, databázi aplikace nemění.
+    Použití: python manage.py bench-sqlite-writers [--writers 1,2,4,8] [--ops 200]
+    """
+    import random
+    import tempfile
+    import threading
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.dialects import sqlite as sqlite_dialect
+    from sqlalchemy.exc import OperationalError
+    from app.db_utils import install_sqlite_profile, is_busy_error
+
+    retries = app.config["SQLITE_BUSY_RETRIES"]
+    tables = [Product.__table__, Stock.__table__, History.__table__]
+
+    def run(profile, n):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", pool_size=n + 1)
+            if profile:
+                install_sqlite_profile(engine, app.config)
+            db.metadata.create_all(engine, tables=tables)
+            with engine.begin() as conn:
+                conn.execute(insert(Product.__table__), [
+                    {"id": i, "name": f"Bench {i}", "category": "saty"} for i in range(1, 51)
+                ])
+                conn.execute(insert(Stock.__table__), [
+                    {"product_id": i, "sklad": "Praha", "size": v, "quantity": 0}
+                    for i in range(1, 51) for v in range(32, 56, 2)
+                ])
+
+            vysledek = {"ok": 0, "opakovani": 0, "chyby": 0, "cteni": 0}
+            lock = threading.Lock()
+            hotovo = threading.Event()
+
+            def zapis():
+                pid, size = random.randint(1, 50), random.choice(range(32, 56, 2))
+                with engine.begin() as conn:
+                    conn.execute(insert(History.__table__).values(
+                        user="bench", sklad="Praha", product_id=pid, size=size,
+                        change_type="naskladneni", amount=1, timestamp=datetime.now()
+                    ))
+                    stmt = sqlite_dialect.insert(Stock.__table__).values(
+                        product_id=pid, sklad="Praha", size=size, quantity=1
+                    )
+                    conn.execute(stmt.on_conflict_do_update(
+                        index_elements=["product_id", "sklad", "size"],
+                        set_={"quantity": Stock.__table__.c.quantity + 1}
+                    ))
+
+            def zapisujici():
+                for _ in range(ops):
+                    for attempt in range(retries + 1 if profile else 1):
+                        try:
+                            zapis()
+                            with lock:
+                                vysledek["ok"] += 1
+                            break
+                        except OperationalError as e:
+                            if not is_busy_error(e):
+                                raise
+                            if profile and attempt < retries:
+                                with lock:
+                                    vysledek["opakovani"] += 1
+                                time.sleep(0.05 * 2 ** attempt * (1 + random.random()))
+                                continue
+                            with lock:
+                                vysledek["chyby"] += 1
+                            break
+
+            def ctenar():
+                while not hotovo.is_set():
+                    try:
+                        with engine.connect() as conn:
+                            conn.execute(select(func.sum(Stock.__table__.c.quantity))).scalar()
+                        vysledek["cteni"] += 1
+                    except OperationalError:
+                        pass
+
+            vlakna = [threading.Thread(target=zapisujici) for _ in range(n)]
+            cteci = threading.Thread(target=ctenar)
+            t0 = time.perf_counter()
+            cteci.start()
+            for t in vlakna:
+                t.start()
+            for t in vlakna:
+                t.join()
+            trvani = time.perf_counter() - t0
+            hotovo.set()
+            cteci.join()
+            engine.dispose()
+            return vysledek, trvani
+
+    click.echo(f"{'profil':>8} {'zapis.':>6} {'zápisů/s':>9} {'opakování':>10} {'chyby':>6} {'čtení/s':>8}")
+    for n in [int(x) for x in writers.split(",")]:
+        for profile in (False, True):
+            vysledek, trvani = run(profile, n)
+            click.echo(
+                f"{'WAL' if profile else 'výchozí':>8} {n:>6} {vysledek['ok'] / trvani:>9.0f}"
+                f" {vysledek['opakovani']:>10} {vysledek['chyby']:>6} {vysledek['cteni'] / trvani:>8.0f}"
+            )
+
+@click.command("stress-stock")
+@click.option("--threads", default=16, help="Počet souběžných prodavačů")
+@click.option("--stock", "zasoba", default=50, help="Počáteční zásoba testovací položky")
+@click.option("--sklad", default="Praha", help="Sklad testovací položky")
+@click.option("--naive", is_flag=True, help="Stará varianta: přečíst zásobu, pak odepsat")
+@with_appcontext
+def stress_stock(threads, zasoba, sklad, naive):
+    """
+    Zátěžový test odpisu: mnoho vláken současně prodává jednu položku
+    po kusu, dokud nedojde. Správně se prodá přesně --stock kusů a zásoba
+    skončí na nule. Testovací produkt a jeho pohyby se nakonec smažou.
+    Použití: python manage.py stress-stock [--threads 16] [--stock 50] [--naive]
+    """
+    import random
+    import threading
+    from app.db_utils import is_busy_error
+    from app.ledger import InsufficientStock, post_movement
+    from app.models import HistoryFacet
+    from sqlalchemy.exc import OperationalError
+
+    user = "__stress"
+    produkt = Product(name=f"__stress_{int(time.time())}", category="doplnky")
+    db.session.add(produkt)
+    db.session.flush()
+    pid = produkt.id
+    db.session.add(Stock(product_id=pid, sklad=sklad, size=0, quantity=zasoba))
+    db.session.commit()
+
+    vysledek = {"prodano": 0, "odmitnuto": 0, "opakovani": 0}
+    lock = threading.Lock()
+
+    def prodej():
+        if naive:
+            qty = db.session.query(Stock.quantity).filter_by(product_id=pid, sklad=sklad, size=0).scalar()
+            if not qty or qty < 1:
+                raise InsufficientStock(sklad, pid, 0, 1)
+            post_movement(user, sklad, pid, 0, -1, "stress_test")
+        else:
+            post_movement(user, sklad, pid, 0, -1, "stress_test", check_stock=True)
+        db.session.commit()
+
+    def prodavac():
+        with app.app_context():
+            while True:
+                try:
+                    prodej()
+                except InsufficientStock:
+                    db.session.rollback()
+                    with lock:
+                        vysledek["odmitnuto"] += 1
+                    return
+                except OperationalError as e:
+                    db.session.rollback()
+                    if not is_busy_error(e):
+                        raise
+                    with lock:
+                        vysledek["opakovani"] += 1
+                    time.sleep(0.01 * (1 + random.random()))
+                    continue
+                with lock:
+                    vysledek["prodano"] += 1
+
+    vlakna = [threading.Thread(target=prodavac) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for t in vlakna:
+        t.start()
+    for t in vlakna:
+        t.join()
+    trvani = time.perf_counter() - t0
+
+    konec = db.session.query(Stock.quantity).filter_by(product_id=pid, sklad=sklad, size=0).scalar()
+    denik = db.session.query(func.sum(History.amount)).filter_by(product_id=pid).scalar() or 0
+    click.echo(
+        f"Vláken: {threads}, prodáno {vysledek['prodano']} z {zasoba} ks za {trvani:.2f} s"
+        f" ({vysledek['prodano'] / trvani:.0f}/s), opakování po zámku: {vysledek['opakovani']}"
+    )
+    click.echo(f"Konečná zásoba: {konec}, součet v deníku: {denik}")
+
+    History.query.filter_by(product_id=pid).delete()
+    Stock.query.filter_by(product_id=pid).delete()
+    db.session.delete(db.session.get(Product, pid))
+    HistoryFacet.query.filter_by(kind="user", value=user).delete()
+    db.session.commit()
+
+    if vysledek["prodano"] != zasoba or konec != 0 or denik != -zasoba:
+        click.secho("❌ Zásoba nesouhlasí – odpis není atomický.", fg="red")
+        raise SystemExit(1)
+    click.secho("✅ Prodáno přesně tolik, kolik bylo na skladě.", fg="green")
+
+@click.command("purge-drafts")
+@with_appcontext
+def purge_drafts():
+    """
+    Smaže rozpracované košíky a inventury po expiraci (DRAFT_TTL_DAYS).
+    Použití: python manage.py purge-drafts
+    """
+    smazano = purge_expired_drafts()
+    db.session.commit()
+    click.secho(f"🗑️ Smazáno konceptů: {smazano}", fg="green")
+
+@click.command("report-cache")
+@click.option("--clear", is_flag=True, help="Smazat zmrazené součty všech let")
+@click.option("--build", is_flag=True, help="Zmrazit uzavřené roky, které ještě nejsou zmrazené")
+@with_appcontext
+def report_cache_cmd(clear, build):
+    """
+    Vypíše zmrazené součty uzavřených let (prodeje, přesčasy). S --build
+    zmrazí chybějící uzavřené roky (spouštět např. po Novém roce z cronu),
+    s --clear je smaže – přehledy je pak počítají živě (např. po ruční
+    opravě dat), dokud je --build znovu nezmrazí.
+    Použití: python manage.py report-cache [--clear] [--build]
+    """
+    from app.models import ReportCache
+    from app.reports import freeze_closed_years
+
+    if clear:
+        smazano = ReportCache.query.delete()
+        db.session.commit()
+        click.secho(f"🗑️ Smazáno zmrazených let: {smazano}", fg="green")
+    if build:
+        pocet = freeze_closed_years()
+        db.session.commit()
+        click.secho(f"🧊 Zmrazeno let: {pocet}", fg="green")
+    if clear or build:
+        return
+    for zaznam in ReportCache.query.order_by(ReportCache.modul, ReportCache.rok):
+        click.echo(f"{zaznam.modul:<10} {zaznam.rok}  spočteno {zaznam.computed_at:%d.%m.%Y %H:%M}")
+
+@click.command("reindex-products")
+@with_appcontext
+def reindex_products():
+    """
+    Přepočítá vyhledávací text všech produktů a znovu sestaví index
+    vyhledávání (např. po hromadné úpravě katalogu mimo aplikaci).
+    Použití: python manage.py reindex-products
+    """
+    from app.product_search import reindex
+
+    pocet = reindex()
+    db.session.commit()
+    click.secho(f"🔎 Přeindexováno produktů: {pocet}", fg="green")
+
 # --- 3) Sestavení CLI skupiny ---
 def main():
-    # zaregistrujeme náš příkaz
+    # zaregistrujeme naše příkazy
     app.cli.add_command(create_admin)
+    app.cli.add_command(explain_hot_queries)
+    app.cli.add_command(stock_snapshot)
+    app.cli.add_command(bench_transfers)
+    app.cli.add_command(backfill_outbound)
+    app.cli.add_command(worker)
+    app.cli.add_command(pdf_jobs_stats)
+    app.cli.add_command(pdf_cache_cmd)
+    app.cli.add_command(check_inventory_queries)
+    app.cli.add_command(bench_pdf)
+    app.cli.add_command(purge_drafts)
+    app.cli.add_command(bench_sqlite_writers)
+    app.cli.add_command(stress_stock)
+    app.cli.add_command(report_cache_cmd)
+    app.cli.add_command(reindex_products)
     # vytvoříme FlaskGroup, který zpřístupní všechny 'flask db' & 'flask run' příkazy
-    cli = FlaskGroup(create_app=lambda info: app)
+    cli = FlaskGroup(create_app=lambda: app)
     cli()
 
 if __name__ == "__main__":
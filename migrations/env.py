@@ -96,6 +96,17 @@ def run_migrations_online():
 
     connectable = get_engine()
 
+    # index vyhledávání produktů (app/product_search.py) si autogenerate
+    # nemá všímat: FTS5 tabulky na SQLite a GIN index, který je jen na PostgreSQL
+    def include_object(object, name, type_, reflected, compare_to):
+        if type_ == "table" and name.startswith("product_fts"):
+            return False
+        if name == "ix_product_search_trgm" and connectable.dialect.name != "postgresql":
+            return False
+        return True
+
+    conf_args.setdefault("include_object", include_object)
+
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
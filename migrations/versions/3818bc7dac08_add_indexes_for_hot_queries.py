@@ -0,0 +1,57 @@
+"""Add indexes for history, stock and transfer hot queries
+
+Revision ID: 3818bc7dac08
+Revises: 54b97fb3ab7d
+Create Date: 2026-10-18 10:03:17.558120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3818bc7dac08'
+down_revision = '54b97fb3ab7d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('history', schema=None) as batch_op:
+        # stránkování historie od nejnovějších (timestamp DESC, id DESC)
+        batch_op.create_index('ix_history_timestamp_id', ['timestamp', 'id'], unique=False)
+        # filtry uživatel / sklad / produkt + časové okno
+        batch_op.create_index('ix_history_user_timestamp', ['user', 'timestamp'], unique=False)
+        batch_op.create_index('ix_history_sklad_timestamp', ['sklad', 'timestamp'], unique=False)
+        batch_op.create_index('ix_history_product_timestamp', ['product_id', 'timestamp'], unique=False)
+        # pokrývající index pro okno výdejů v distribuce()
+        batch_op.create_index('ix_history_outbound', ['timestamp', 'change_type', 'product_id', 'size', 'sklad', 'amount'], unique=False)
+
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_sklad_product_size', ['sklad', 'product_id', 'size', 'quantity'], unique=False)
+
+    with op.batch_alter_table('transfer', schema=None) as batch_op:
+        batch_op.create_index('ix_transfer_status_target', ['status', 'target_sklad'], unique=False)
+
+    with op.batch_alter_table('transfer_item', schema=None) as batch_op:
+        batch_op.create_index('ix_transfer_item_transfer', ['transfer_id'], unique=False)
+        batch_op.create_index('ix_transfer_item_product', ['product_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transfer_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_transfer_item_product')
+        batch_op.drop_index('ix_transfer_item_transfer')
+
+    with op.batch_alter_table('transfer', schema=None) as batch_op:
+        batch_op.drop_index('ix_transfer_status_target')
+
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_sklad_product_size')
+
+    with op.batch_alter_table('history', schema=None) as batch_op:
+        batch_op.drop_index('ix_history_outbound')
+        batch_op.drop_index('ix_history_product_timestamp')
+        batch_op.drop_index('ix_history_sklad_timestamp')
+        batch_op.drop_index('ix_history_user_timestamp')
+        batch_op.drop_index('ix_history_timestamp_id')
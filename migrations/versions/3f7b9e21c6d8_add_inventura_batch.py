@@ -0,0 +1,38 @@
+"""Add inventura_batch for confirmed stocktakes
+
+Revision ID: 3f7b9e21c6d8
+Revises: a84f16c3d2e9
+Create Date: 2026-10-18 18:42:09.316527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f7b9e21c6d8'
+down_revision = 'a84f16c3d2e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inventura_batch',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sklad', sa.String(length=50), nullable=False),
+    sa.Column('user', sa.String(length=50), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('cells', sa.Integer(), nullable=False),
+    sa.Column('changes', sa.Integer(), nullable=False),
+    sa.Column('delta_sum', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('inventura_batch', schema=None) as batch_op:
+        batch_op.create_index('ix_inventura_batch_sklad_created', ['sklad', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('inventura_batch', schema=None) as batch_op:
+        batch_op.drop_index('ix_inventura_batch_sklad_created')
+
+    op.drop_table('inventura_batch')
@@ -0,0 +1,37 @@
+"""Add stock_snapshot table for ledger snapshots
+
+Revision ID: 42e4fd7f37d8
+Revises: bb612c03b4f7
+Create Date: 2026-10-18 12:48:52.117306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '42e4fd7f37d8'
+down_revision = 'bb612c03b4f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('sklad', sa.String(length=50), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_snapshot_taken_sklad', ['taken_at', 'sklad'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_snapshot_taken_sklad')
+
+    op.drop_table('stock_snapshot')
@@ -0,0 +1,31 @@
+"""Add stock_version table for dashboard stock matrix cache
+
+Revision ID: 54b97fb3ab7d
+Revises: 9141bdbca17c
+Create Date: 2026-10-18 09:12:41.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '54b97fb3ab7d'
+down_revision = '9141bdbca17c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    stock_version = op.create_table('stock_version',
+    sa.Column('sklad', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('sklad')
+    )
+    op.bulk_insert(stock_version, [
+        {'sklad': s, 'version': 0} for s in ['Praha', 'Brno', 'Pardubice', 'Ostrava']
+    ])
+
+
+def downgrade():
+    op.drop_table('stock_version')
@@ -0,0 +1,34 @@
+"""Add transfer_counter with in-transit counts per target warehouse
+
+Revision ID: 5c0e2d9a41f3
+Revises: e3a91c5f7b20
+Create Date: 2026-10-18 16:03:27.519804
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c0e2d9a41f3'
+down_revision = 'e3a91c5f7b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('transfer_counter',
+    sa.Column('target_sklad', sa.String(length=50), nullable=False),
+    sa.Column('in_transit', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('target_sklad')
+    )
+    # naplnění z rozpracovaných přeskladnění
+    op.execute(
+        "INSERT INTO transfer_counter (target_sklad, in_transit) "
+        "SELECT target_sklad, COUNT(*) FROM transfer "
+        "WHERE status = 'v_tranzitu' GROUP BY target_sklad"
+    )
+
+
+def downgrade():
+    op.drop_table('transfer_counter')
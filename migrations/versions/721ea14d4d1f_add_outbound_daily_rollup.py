@@ -0,0 +1,43 @@
+"""Add outbound_daily rollup of outbound quantities per day and SKU
+
+Revision ID: 721ea14d4d1f
+Revises: 42e4fd7f37d8
+Create Date: 2026-10-18 14:37:10.662904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '721ea14d4d1f'
+down_revision = '42e4fd7f37d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbound_daily',
+    sa.Column('den', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('sklad', sa.String(length=50), nullable=False),
+    sa.Column('vydej', sa.Integer(), nullable=False),
+    sa.Column('presun', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('den', 'product_id', 'size', 'sklad')
+    )
+    # naplnění z existující historie (stejné jako manage.py backfill-outbound)
+    op.execute(
+        "INSERT INTO outbound_daily (den, product_id, size, sklad, vydej, presun) "
+        "SELECT date(timestamp), product_id, size, sklad, "
+        "SUM(CASE WHEN lower(change_type) LIKE 'vyskladn%' THEN abs(amount) ELSE 0 END), "
+        "SUM(CASE WHEN lower(change_type) LIKE 'preskladneni_vysklad%' THEN abs(amount) ELSE 0 END) "
+        "FROM history "
+        "WHERE (lower(change_type) LIKE 'vyskladn%' OR lower(change_type) LIKE 'preskladneni_vysklad%') "
+        "AND product_id IS NOT NULL AND size IS NOT NULL AND sklad IS NOT NULL "
+        "GROUP BY date(timestamp), product_id, size, sklad"
+    )
+
+
+def downgrade():
+    op.drop_table('outbound_daily')
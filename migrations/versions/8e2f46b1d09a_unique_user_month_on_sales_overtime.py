@@ -0,0 +1,52 @@
+"""Unique (user, year, month) on sales and overtime
+
+Revision ID: 8e2f46b1d09a
+Revises: c5d81e4a7b36
+Create Date: 2026-10-18 21:14:37.662190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2f46b1d09a'
+down_revision = 'c5d81e4a7b36'
+branch_labels = None
+depends_on = None
+
+
+def _merge_duplicates(table, columns):
+    # duplicity (souběžné zápisy) se sečtou do řádku s nejmenším id
+    sums = ", ".join(
+        f"{col} = (SELECT COALESCE(SUM(t2.{col}), 0) FROM {table} t2 "
+        f"WHERE t2.\"user\" = {table}.\"user\" AND t2.year = {table}.year AND t2.month = {table}.month)"
+        for col in columns
+    )
+    op.execute(
+        f"UPDATE {table} SET {sums} WHERE id IN ("
+        f"SELECT MIN(id) FROM {table} GROUP BY \"user\", year, month HAVING COUNT(*) > 1)"
+    )
+    op.execute(
+        f"DELETE FROM {table} WHERE id NOT IN ("
+        f"SELECT MIN(id) FROM {table} GROUP BY \"user\", year, month)"
+    )
+
+
+def upgrade():
+    _merge_duplicates('sales', ['tries', 'sales'])
+    _merge_duplicates('overtime', ['classic', 'deluxe'])
+
+    with op.batch_alter_table('sales', schema=None) as batch_op:
+        batch_op.create_index('ux_sales_user_year_month', ['user', 'year', 'month'], unique=True)
+
+    with op.batch_alter_table('overtime', schema=None) as batch_op:
+        batch_op.create_index('ux_overtime_user_year_month', ['user', 'year', 'month'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('overtime', schema=None) as batch_op:
+        batch_op.drop_index('ux_overtime_user_year_month')
+
+    with op.batch_alter_table('sales', schema=None) as batch_op:
+        batch_op.drop_index('ux_sales_user_year_month')
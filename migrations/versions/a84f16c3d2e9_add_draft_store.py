@@ -0,0 +1,38 @@
+"""Add draft table for server-side basket and inventura drafts
+
+Revision ID: a84f16c3d2e9
+Revises: 5c0e2d9a41f3
+Create Date: 2026-10-18 16:41:52.730115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a84f16c3d2e9'
+down_revision = '5c0e2d9a41f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('draft',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user', sa.String(length=64), nullable=False),
+    sa.Column('kind', sa.String(length=40), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user', 'kind', name='_draft_user_kind_uc')
+    )
+    with op.batch_alter_table('draft', schema=None) as batch_op:
+        batch_op.create_index('ix_draft_expires', ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('draft', schema=None) as batch_op:
+        batch_op.drop_index('ix_draft_expires')
+
+    op.drop_table('draft')
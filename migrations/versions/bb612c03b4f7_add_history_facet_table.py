@@ -0,0 +1,37 @@
+"""Add history_facet lookup for history filter dropdowns
+
+Revision ID: bb612c03b4f7
+Revises: 3818bc7dac08
+Create Date: 2026-10-18 11:26:05.931442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bb612c03b4f7'
+down_revision = '3818bc7dac08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('history_facet',
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('value', sa.String(length=64), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'value')
+    )
+    # naplnění z existující historie (jednorázově)
+    op.execute(
+        'INSERT INTO history_facet (kind, value) '
+        'SELECT DISTINCT \'user\', "user" FROM history WHERE "user" IS NOT NULL AND "user" <> \'\''
+    )
+    op.execute(
+        'INSERT INTO history_facet (kind, value) '
+        'SELECT DISTINCT \'sklad\', sklad FROM history WHERE sklad IS NOT NULL AND sklad <> \'\''
+    )
+
+
+def downgrade():
+    op.drop_table('history_facet')
@@ -0,0 +1,83 @@
+"""Add product search_text with trigram (PostgreSQL) / FTS5 (SQLite) index
+
+Revision ID: c19a7e5d3b42
+Revises: 8e2f46b1d09a
+Create Date: 2026-10-18 22:03:11.418207
+
+"""
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c19a7e5d3b42'
+down_revision = '8e2f46b1d09a'
+branch_labels = None
+depends_on = None
+
+
+# stejné jako app.models.PRODUCT_FTS_DDL
+FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+    "search_text, content='product', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+    "INSERT INTO product_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF search_text ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO product_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+]
+
+
+def _normalize(value):
+    # stejné jako app.product_search.normalize
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(value.lower().split())
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('search_text', sa.String(length=200), nullable=True))
+
+    conn = op.get_bind()
+    product = sa.table(
+        'product',
+        sa.column('id', sa.Integer), sa.column('name', sa.String),
+        sa.column('color', sa.String), sa.column('back_solution', sa.String),
+        sa.column('search_text', sa.String),
+    )
+    rows = conn.execute(sa.select(product.c.id, product.c.name, product.c.color, product.c.back_solution)).all()
+    for pid, name, color, back_solution in rows:
+        conn.execute(
+            product.update().where(product.c.id == pid).values(
+                search_text=_normalize(" ".join(p for p in (name, color, back_solution) if p))
+            )
+        )
+
+    if conn.dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index(
+            'ix_product_search_trgm', 'product', ['search_text'], unique=False,
+            postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}
+        )
+    elif conn.dialect.name == 'sqlite':
+        for ddl in FTS_DDL:
+            op.execute(ddl)
+        op.execute("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'postgresql':
+        op.drop_index('ix_product_search_trgm', table_name='product')
+    elif conn.dialect.name == 'sqlite':
+        for trigger in ('product_fts_ai', 'product_fts_ad', 'product_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS product_fts")
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('search_text')
@@ -0,0 +1,41 @@
+"""Add report_cache for closed years and year indexes on sales/overtime
+
+Revision ID: c5d81e4a7b36
+Revises: 3f7b9e21c6d8
+Create Date: 2026-10-18 20:05:51.208416
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d81e4a7b36'
+down_revision = '3f7b9e21c6d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_cache',
+    sa.Column('modul', sa.String(length=20), nullable=False),
+    sa.Column('rok', sa.Integer(), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('modul', 'rok')
+    )
+    with op.batch_alter_table('sales', schema=None) as batch_op:
+        batch_op.create_index('ix_sales_year', ['year'], unique=False)
+
+    with op.batch_alter_table('overtime', schema=None) as batch_op:
+        batch_op.create_index('ix_overtime_year', ['year'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('overtime', schema=None) as batch_op:
+        batch_op.drop_index('ix_overtime_year')
+
+    with op.batch_alter_table('sales', schema=None) as batch_op:
+        batch_op.drop_index('ix_sales_year')
+
+    op.drop_table('report_cache')
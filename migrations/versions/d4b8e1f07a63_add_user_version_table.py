@@ -0,0 +1,28 @@
+"""Add user_version table for the per-process user cache
+
+Revision ID: d4b8e1f07a63
+Revises: c19a7e5d3b42
+Create Date: 2026-10-18 23:41:09.553180
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8e1f07a63'
+down_revision = 'c19a7e5d3b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_version',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('user_version')
@@ -0,0 +1,45 @@
+"""Add pdf_job queue table for background PDF generation
+
+Revision ID: e3a91c5f7b20
+Revises: 721ea14d4d1f
+Create Date: 2026-10-18 15:12:44.208317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a91c5f7b20'
+down_revision = '721ea14d4d1f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('pdf_job',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('params', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('created_by', sa.String(length=50), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('worker', sa.String(length=64), nullable=True),
+    sa.Column('filename', sa.String(length=120), nullable=True),
+    sa.Column('size_bytes', sa.Integer(), nullable=True),
+    sa.Column('build_ms', sa.Integer(), nullable=True),
+    sa.Column('render_ms', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('pdf_job', schema=None) as batch_op:
+        batch_op.create_index('ix_pdf_job_status_created', ['status', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pdf_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_pdf_job_status_created')
+
+    op.drop_table('pdf_job')